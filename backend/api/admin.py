@@ -1,6 +1,7 @@
 """
 Endpoints de administración para inicialización del sistema
 """
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from loguru import logger
@@ -8,10 +9,12 @@ import sys
 
 # Importar scripts de inicialización
 sys.path.insert(0, '/app')
+from config import get_settings
 from database import SessionLocal, engine, Base, get_db
 from models import Subvencion, Usuario, Suscripcion, NotificacionEnviada
 from models.catalogo import Region, AreaTematica, Finalidad
 from services.bdns_service import BDNSService
+from services import calendar_publicacion_service, catalogo_service, organo_service, outbox_service
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -40,7 +43,11 @@ async def init_database():
                 "notificaciones_enviadas",
                 "regiones",
                 "areas_tematicas",
-                "finalidades"
+                "finalidades",
+                "organos",
+                "emails_pendientes",
+                "area_tematica_finalidades",
+                "recordatorios"
             ]
         }
         
@@ -154,6 +161,9 @@ async def populate_catalogs():
         db.commit()
         logger.info(f"✓ {areas_count} áreas temáticas cargadas")
         
+        # Regenerar el mapeo finalidad -> área temática
+        catalogo_service.sincronizar_areas_finalidades(db)
+        
         # Contar registros
         total_regiones = db.query(Region).count()
         total_areas = db.query(AreaTematica).count()
@@ -220,49 +230,56 @@ async def test_bdns():
 
 
 @router.post("/sync-subvenciones")
-async def sync_subvenciones_manual():
+async def sync_subvenciones_manual(modo: Optional[str] = None):
     """
     Forzar sincronización manual de subvenciones desde BDNS
-    ⚠️ Esto ejecuta la tarea completa: obtener, guardar, crear eventos y notificar
+    ⚠️ Esto ejecuta la tarea completa: obtener, guardar y notificar
+    (los eventos de Calendar los publica su propio job)
+    
+    modo: "pipeline" (etapas solapadas) o "paginas" (memoria acotada); por defecto SYNC_MODO
     """
-    from tasks.sync_subvenciones import fetch_subvenciones_bdns, guardar_subvenciones, crear_eventos_calendar, enviar_notificaciones
+    from tasks.sync_pipeline import ejecutar_pipeline
+    from tasks.sync_subvenciones import sincronizar_por_paginas
+    
+    modo = modo or get_settings().sync_modo
+    if modo not in ("pipeline", "paginas"):
+        raise HTTPException(status_code=400, detail="modo debe ser 'pipeline' o 'paginas'")
     
     db = SessionLocal()
     
     try:
         logger.info("=" * 80)
-        logger.info("🔄 Iniciando sincronización manual de subvenciones...")
+        logger.info(f"🔄 Iniciando sincronización manual de subvenciones (modo {modo})...")
         logger.info("=" * 80)
         
-        # 1. Obtener subvenciones de BDNS
-        nuevas_subvenciones = await fetch_subvenciones_bdns(db)
-        
-        if not nuevas_subvenciones:
+        if modo == "paginas":
+            resumen = await sincronizar_por_paginas(db)
+            guardadas = resumen.guardadas
+            detalle = resumen.to_dict()
+        else:
+            # Listado, detalles, filtros, guardado y notificaciones en un pipeline por etapas
+            resultado = await ejecutar_pipeline()
+            guardadas = len(resultado.guardadas)
+            detalle = resultado.to_dict()
+        
+        if not guardadas:
             logger.info("ℹ️  No se encontraron nuevas subvenciones")
             return {
                 "status": "success",
-                "message": "No se encontraron nuevas subvenciones"
+                "message": "No se encontraron nuevas subvenciones",
+                "modo": modo,
+                "resumen": detalle
             }
         
-        logger.info(f"✓ {len(nuevas_subvenciones)} nuevas subvenciones obtenidas")
-        
-        # 2. Guardar en base de datos
-        subvenciones_guardadas = guardar_subvenciones(db, nuevas_subvenciones)
-        logger.info(f"✓ {len(subvenciones_guardadas)} subvenciones guardadas en BD")
-        
-        # 3. Crear eventos en Google Calendar
-        crear_eventos_calendar(subvenciones_guardadas)
-        
-        # 4. Enviar notificaciones a usuarios
-        enviar_notificaciones(db, subvenciones_guardadas)
-        
         logger.info("=" * 80)
         logger.info("✅ Sincronización completada exitosamente")
         logger.info("=" * 80)
         
         return {
             "status": "success",
-            "message": f"Sincronización completada: {len(subvenciones_guardadas)} subvenciones procesadas"
+            "message": f"Sincronización completada: {guardadas} subvenciones procesadas",
+            "modo": modo,
+            "resumen": detalle
         }
         
     except Exception as e:
@@ -292,7 +309,9 @@ async def admin_status():
             "notificaciones_enviadas": db.query(NotificacionEnviada).count(),
             "regiones": db.query(Region).count(),
             "areas_tematicas": db.query(AreaTematica).count(),
-            "finalidades": db.query(Finalidad).count()
+            "finalidades": db.query(Finalidad).count(),
+            "emails_pendientes": outbox_service.estadisticas(db),
+            "publicacion_calendar": calendar_publicacion_service.estadisticas(db)
         }
         
         # Determinar si está inicializada
@@ -352,6 +371,75 @@ async def ejecutar_migracion(db: Session = Depends(get_db)):
             
             # Columna para suscripciones
             "ALTER TABLE suscripciones ADD COLUMN IF NOT EXISTS filtros_json JSON;",
+            
+            # Árbol de órganos
+            "CREATE TABLE IF NOT EXISTS organos (id SERIAL PRIMARY KEY, clave VARCHAR(1000) UNIQUE NOT NULL, nombre VARCHAR(300) NOT NULL, nivel INTEGER NOT NULL, padre_id INTEGER REFERENCES organos(id), num_convocatorias INTEGER DEFAULT 0, num_abiertas INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT NOW(), updated_at TIMESTAMP DEFAULT NOW());",
+            "CREATE INDEX IF NOT EXISTS idx_organos_padre ON organos (padre_id);",
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS organo_id INTEGER REFERENCES organos(id);",
+            "CREATE INDEX IF NOT EXISTS idx_subvenciones_organo_id ON subvenciones (organo_id);",
+            
+            # Columnas de búsqueda normalizadas
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+            "CREATE EXTENSION IF NOT EXISTS unaccent;",
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS organo_norm TEXT;",
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS tipo_convocatoria_norm VARCHAR(200);",
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS finalidad_norm VARCHAR(200);",
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS texto_norm TEXT;",
+            r"UPDATE subvenciones SET organo_norm = NULLIF(array_to_string(ARRAY[ NULLIF(trim(regexp_replace(lower(unaccent(organo_nivel1)), '\s+', ' ', 'g')), ''), NULLIF(trim(regexp_replace(lower(unaccent(organo_nivel2)), '\s+', ' ', 'g')), ''), NULLIF(trim(regexp_replace(lower(unaccent(organo_nivel3)), '\s+', ' ', 'g')), ''), NULLIF(trim(regexp_replace(lower(unaccent(organo_convocante)), '\s+', ' ', 'g')), '') ], ' | '), ''), tipo_convocatoria_norm = NULLIF(trim(regexp_replace(lower(unaccent(tipo_convocatoria)), '\s+', ' ', 'g')), ''), finalidad_norm = NULLIF(trim(regexp_replace(lower(unaccent(finalidad_nombre)), '\s+', ' ', 'g')), ''), texto_norm = NULLIF(array_to_string(ARRAY[ NULLIF(trim(regexp_replace(lower(unaccent(titulo)), '\s+', ' ', 'g')), ''), NULLIF(trim(regexp_replace(lower(unaccent(descripcion)), '\s+', ' ', 'g')), '') ], ' | '), '');",
+            "CREATE INDEX IF NOT EXISTS idx_subvenciones_organo_norm ON subvenciones USING gin (organo_norm gin_trgm_ops);",
+            "CREATE INDEX IF NOT EXISTS idx_subvenciones_tipo_convocatoria_norm ON subvenciones USING gin (tipo_convocatoria_norm gin_trgm_ops);",
+            "CREATE INDEX IF NOT EXISTS idx_subvenciones_finalidad_norm ON subvenciones USING gin (finalidad_norm gin_trgm_ops);",
+            "CREATE INDEX IF NOT EXISTS idx_subvenciones_texto_norm ON subvenciones USING gin (texto_norm gin_trgm_ops);",
+            
+            # Unicidad de notificaciones
+            "DELETE FROM notificaciones_enviadas n USING (SELECT id, ROW_NUMBER() OVER (PARTITION BY usuario_id, subvencion_id, tipo ORDER BY enviada DESC NULLS LAST, id) AS fila FROM notificaciones_enviadas) d WHERE n.id = d.id AND d.fila > 1;",
+            "UPDATE notificaciones_enviadas SET error = 'Error al enviar email' WHERE enviada = FALSE AND error IS NULL;",
+            "DO $$ BEGIN ALTER TABLE notificaciones_enviadas ADD CONSTRAINT uq_notificaciones_usuario_subvencion_tipo UNIQUE (usuario_id, subvencion_id, tipo); EXCEPTION WHEN duplicate_table OR duplicate_object THEN NULL; END $$;",
+            
+            # Bandeja de salida de emails
+            "CREATE TABLE IF NOT EXISTS emails_pendientes (id SERIAL PRIMARY KEY, tipo VARCHAR(30), destinatario VARCHAR(255) NOT NULL, asunto TEXT NOT NULL, html TEXT NOT NULL, texto TEXT, estado VARCHAR(20) NOT NULL DEFAULT 'pendiente', intentos INTEGER DEFAULT 0, proximo_intento TIMESTAMP NOT NULL DEFAULT NOW(), error VARCHAR(500), fecha_envio TIMESTAMP, created_at TIMESTAMP DEFAULT NOW());",
+            "CREATE INDEX IF NOT EXISTS idx_emails_pendientes_estado_proximo ON emails_pendientes (estado, proximo_intento);",
+            "ALTER TABLE emails_pendientes ALTER COLUMN asunto TYPE TEXT;",
+            "ALTER TABLE notificaciones_enviadas ADD COLUMN IF NOT EXISTS email_id INTEGER REFERENCES emails_pendientes(id);",
+            "CREATE INDEX IF NOT EXISTS ix_notificaciones_enviadas_email_id ON notificaciones_enviadas (email_id);",
+            
+            # Resúmenes diarios/semanales
+            "ALTER TABLE notificaciones_enviadas ADD COLUMN IF NOT EXISTS programada_para TIMESTAMP;",
+            "CREATE INDEX IF NOT EXISTS ix_notificaciones_enviadas_programada_para ON notificaciones_enviadas (programada_para);",
+            
+            # Asociación área temática <-> finalidad
+            "CREATE TABLE IF NOT EXISTS area_tematica_finalidades (area_id INTEGER NOT NULL REFERENCES areas_tematicas(id) ON DELETE CASCADE, finalidad_id INTEGER NOT NULL, PRIMARY KEY (area_id, finalidad_id));",
+            "CREATE INDEX IF NOT EXISTS ix_area_tematica_finalidades_finalidad_id ON area_tematica_finalidades (finalidad_id);",
+            "INSERT INTO area_tematica_finalidades (area_id, finalidad_id) SELECT DISTINCT a.id, trim(f)::INTEGER FROM areas_tematicas a, regexp_split_to_table(COALESCE(a.finalidades_bdns, ''), ',') AS f WHERE trim(f) ~ '^[0-9]+$' ON CONFLICT DO NOTHING;",
+            
+            # Recordatorios de fecha límite
+            "CREATE TABLE IF NOT EXISTS recordatorios (id SERIAL PRIMARY KEY, usuario_id INTEGER NOT NULL REFERENCES usuarios(id), subvencion_id INTEGER NOT NULL REFERENCES subvenciones(id), dias_antes INTEGER NOT NULL, fecha_programada TIMESTAMP NOT NULL, estado VARCHAR(20) NOT NULL DEFAULT 'pendiente', email_id INTEGER REFERENCES emails_pendientes(id), created_at TIMESTAMP DEFAULT NOW(), CONSTRAINT uq_recordatorios_usuario_subvencion_dias UNIQUE (usuario_id, subvencion_id, dias_antes));",
+            "CREATE INDEX IF NOT EXISTS idx_recordatorios_estado_fecha ON recordatorios (estado, fecha_programada);",
+            "INSERT INTO recordatorios (usuario_id, subvencion_id, dias_antes, fecha_programada, estado) SELECT n.usuario_id, n.subvencion_id, d.dias, (s.fecha_fin_solicitud::DATE - d.dias) + TIME '08:00', 'pendiente' FROM notificaciones_enviadas n JOIN subvenciones s ON s.id = n.subvencion_id CROSS JOIN (VALUES (7), (3), (1)) AS d(dias) WHERE n.tipo = 'email' AND s.activa = TRUE AND (s.fecha_fin_solicitud::DATE - d.dias) + TIME '08:00' > NOW() AT TIME ZONE 'UTC' ON CONFLICT DO NOTHING;",
+            
+            # Reconciliación de Google Calendar
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_hash VARCHAR(64);",
+            
+            # Etapa de publicación en Calendar
+            # Sin DEFAULT al añadirla: la clasificación solo toca las filas anteriores (NULL) y no se repite
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_estado VARCHAR(20);",
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_intentos INTEGER DEFAULT 0;",
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_proximo_intento TIMESTAMP DEFAULT NOW();",
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_error VARCHAR(500);",
+            "UPDATE subvenciones SET calendar_estado = CASE WHEN (calendar_event_id IS NULL AND activa = TRUE AND fecha_fin_solicitud IS NOT NULL) OR (calendar_event_id IS NOT NULL AND calendar_hash IS NULL) OR (calendar_event_id IS NOT NULL AND activa = FALSE) THEN 'pendiente' ELSE 'publicado' END, calendar_intentos = 0, calendar_proximo_intento = NOW() WHERE calendar_estado IS NULL;",
+            "ALTER TABLE subvenciones ALTER COLUMN calendar_estado SET DEFAULT 'pendiente';",
+            "CREATE INDEX IF NOT EXISTS idx_subvenciones_calendar_estado_proximo ON subvenciones (calendar_estado, calendar_proximo_intento);",
+            
+            # Caducidad de las reservas de notificaciones
+            "ALTER TABLE notificaciones_enviadas ADD COLUMN IF NOT EXISTS reservada_en TIMESTAMP;",
+            
+            # Suscripción que programó cada notificación del resumen
+            "ALTER TABLE notificaciones_enviadas ADD COLUMN IF NOT EXISTS suscripcion_id INTEGER REFERENCES suscripciones(id);",
+            
+            # Versión de los feeds .ics (independiente del estado de Calendar)
+            "ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS contenido_actualizado_en TIMESTAMP DEFAULT NOW();",
+            "UPDATE subvenciones SET contenido_actualizado_en = COALESCE(updated_at, created_at, NOW()) WHERE contenido_actualizado_en IS NULL OR contenido_actualizado_en > updated_at;",
+            "CREATE INDEX IF NOT EXISTS ix_subvenciones_contenido_actualizado_en ON subvenciones (contenido_actualizado_en);",
         ]
         
         results = []
@@ -366,6 +454,15 @@ async def ejecutar_migracion(db: Session = Depends(get_db)):
         
         db.commit()
         
+        # Rellenar el árbol de órganos con las subvenciones existentes
+        try:
+            enlazadas = organo_service.reconstruir_arbol(db)
+            results.append({"query": "Árbol de órganos...", "status": f"✓ {enlazadas} subvenciones enlazadas"})
+        except Exception as e:
+            db.rollback()
+            results.append({"query": "Árbol de órganos...", "status": f"✗ {str(e)}"})
+            logger.warning(f"⚠️ Árbol de órganos - {e}")
+        
         logger.success("✅ Migración completada")
         
         return {
@@ -453,4 +550,87 @@ async def actualizar_campos_subvenciones():
             detail=f"Error al actualizar campos: {str(e)}"
         )
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@router.post("/reconciliar-calendar")
+async def reconciliar_calendar():
+    """
+    Sincroniza Google Calendar con la base de datos: crea los eventos que faltan,
+    actualiza los que han cambiado y elimina los de convocatorias retiradas
+    """
+    db = SessionLocal()
+    
+    try:
+        totales = calendar_publicacion_service.reconciliar(db)
+        
+        return {
+            "status": "success",
+            "message": "Calendar reconciliado",
+            **totales
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Error al reconciliar Calendar: {e}")
+        db.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al reconciliar Calendar: {str(e)}"
+        )
+    finally:
+        db.close()
+
+
+@router.get("/scheduler")
+async def estado_scheduler(db: Session = Depends(get_db)):
+    """
+    Líder actual del scheduler (proceso que tiene el advisory lock) y estado de este proceso
+    """
+    from tasks.leader import elector, lider_actual
+    from tasks.scheduler import estado_jobs, scheduler
+    
+    try:
+        return {
+            "status": "success",
+            "eleccion_lider": get_settings().scheduler_eleccion_lider,
+            "lider": lider_actual(db),
+            "este_proceso": {
+                **elector.estado(),
+                "scheduler_activo": scheduler.running,
+                "jobs": estado_jobs()
+            }
+        }
+    except Exception as e:
+        logger.error(f"Error al consultar el scheduler: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al consultar el scheduler: {str(e)}"
+        )
+
+
+@router.post("/reconstruir-arbol-organos")
+async def reconstruir_arbol_organos():
+    """
+    Enlaza las subvenciones existentes con el árbol de órganos y recalcula conteos
+    ⚠️ Ejecutar después de la migración del árbol de órganos
+    """
+    db = SessionLocal()
+    
+    try:
+        enlazadas = organo_service.reconstruir_arbol(db)
+        
+        return {
+            "status": "success",
+            "message": "Árbol de órganos reconstruido",
+            "enlazadas": enlazadas
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Error al reconstruir árbol de órganos: {e}")
+        db.rollback()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al reconstruir árbol de órganos: {str(e)}"
+        )
+    finally:
+        db.close()
@@ -1,27 +1,32 @@
 """
 Endpoints de calendario
 """
-from fastapi import APIRouter
-from services.calendar_service import CalendarService
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from config import get_settings
+from database import get_db, SessionLocal
+from models.suscripcion import Suscripcion
+from services import calendar_service, ical_service
 from loguru import logger
 
 router = APIRouter(prefix="/api/calendar", tags=["calendar"])
 
+MEDIA_TYPE_ICS = "text/calendar"
+
 
 @router.get("/url")
 async def get_calendar_url():
     """
-    Obtener URL pública del calendario de Google
+    Obtener URL pública del calendario de Google (sin autenticación)
     """
     try:
-        calendar_service = CalendarService()
-        calendar_url = calendar_service.get_calendar_url()
-        ical_url = calendar_service.get_ical_url()
-        
         return {
-            "url": calendar_url,
-            "ical_url": ical_url,
-            "calendar_id": calendar_service.calendar_id
+            "url": calendar_service.get_calendar_url(),
+            "ical_url": calendar_service.get_ical_url(),
+            "feed_url": f"{router.prefix}/subvenciones.ics",
+            "calendar_id": get_settings().calendar_id
         }
     except Exception as e:
         logger.error(f"Error al obtener URL del calendario: {e}")
@@ -30,3 +35,63 @@ async def get_calendar_url():
             "ical_url": "#",
             "error": "No se pudo obtener la URL del calendario"
         }
+
+
+def _no_modificado(request: Request, etag: str) -> bool:
+    """Comprobar If-None-Match contra la ETag actual"""
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera:
+        return False
+    etiquetas = {e.strip().removeprefix("W/") for e in cabecera.split(",")}
+    return "*" in etiquetas or etag in etiquetas
+
+
+def _responder_feed(request: Request, clave, version, suscripcion_id: Optional[int], nombre_fichero: str):
+    """Respuesta 304 si el cliente tiene la versión actual; si no, el feed en streaming"""
+    etag = ical_service.etag(clave, version)
+    cabeceras = {"ETag": etag, "Cache-Control": "public, max-age=300"}
+
+    if _no_modificado(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+
+    def generar():
+        # Sesión propia: la de get_db se cierra antes de terminar el streaming
+        db = SessionLocal()
+        try:
+            suscripcion = db.get(Suscripcion, suscripcion_id) if suscripcion_id else None
+            yield from ical_service.feed(db, clave, version, suscripcion)
+        finally:
+            db.close()
+
+    cabeceras["Content-Disposition"] = f'inline; filename="{nombre_fichero}"'
+    return StreamingResponse(generar(), media_type=MEDIA_TYPE_ICS, headers=cabeceras)
+
+
+@router.get("/subvenciones.ics")
+async def feed_subvenciones(request: Request, db: Session = Depends(get_db)):
+    """
+    Feed iCalendar con todas las convocatorias abiertas (y las cerradas recientemente).
+    Admite peticiones condicionales con If-None-Match.
+    """
+    version = ical_service.version_feed(db)
+    return _responder_feed(request, "global", version, None, "subvenciones.ics")
+
+
+@router.get("/suscripciones/{suscripcion_id}.ics")
+async def feed_suscripcion(suscripcion_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+    Feed iCalendar con las convocatorias que cumplen los filtros de una suscripción
+    """
+    suscripcion = db.query(Suscripcion).filter(
+        Suscripcion.id == suscripcion_id,
+        Suscripcion.activa == True
+    ).first()
+
+    if not suscripcion:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Suscripción no encontrada"
+        )
+
+    version = ical_service.version_feed(db, suscripcion)
+    return _responder_feed(request, suscripcion_id, version, suscripcion_id, f"suscripcion-{suscripcion_id}.ics")
@@ -82,6 +82,34 @@ class Subvencion(SubvencionBase):
         from_attributes = True
 
 
+class SubvencionLoteRequest(BaseModel):
+    ids: List[int] = Field(default=[], max_length=500)
+    ids_bdns: List[str] = Field(default=[], max_length=500)
+
+
+class SubvencionLoteItem(BaseModel):
+    id: Optional[int] = None
+    id_bdns: Optional[str] = None
+    encontrada: bool
+    subvencion: Optional[Subvencion] = None
+
+
+class OrganoNodo(BaseModel):
+    id: int
+    clave: str
+    nombre: str
+    nivel: int
+    num_convocatorias: int = 0
+    num_abiertas: int = 0
+    hijos: List["OrganoNodo"] = []
+
+
+class Sugerencia(BaseModel):
+    tipo: str
+    texto: str
+    id: Optional[int] = None
+
+
 class RegionSchema(BaseModel):
     id: int
     codigo: str
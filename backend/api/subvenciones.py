@@ -2,13 +2,15 @@
 Endpoints de subvenciones
 """
 from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, distinct
+from sqlalchemy import distinct, or_
 from typing import List, Optional
-from datetime import datetime
-from database import get_db
+from database import get_db, SessionLocal
 from api import schemas
 from models.subvencion import Subvencion
+from services import autocompletar_service, export_service, organo_service
+from services.filtros_subvenciones import aplicar_filtros
 
 router = APIRouter(prefix="/api/subvenciones", tags=["subvenciones"])
 
@@ -19,6 +21,7 @@ async def listar_subvenciones(
     limit: int = Query(50, ge=1, le=100),
     activa: Optional[bool] = True,
     organo: Optional[str] = None,
+    organo_id: Optional[int] = None,
     tipo_convocatoria: Optional[str] = None,
     instrumento: Optional[str] = None,
     sector: Optional[str] = None,
@@ -30,65 +33,104 @@ async def listar_subvenciones(
     """
     Listar subvenciones con filtros avanzados
     """
-    query = db.query(Subvencion)
+    query = aplicar_filtros(
+        db.query(Subvencion),
+        activa=activa,
+        organo=organo,
+        organo_ids=organo_service.ids_descendientes(db, organo_id) if organo_id else None,
+        tipo_convocatoria=tipo_convocatoria,
+        instrumento=instrumento,
+        sector=sector,
+        finalidad=finalidad,
+        presupuesto_min=presupuesto_min,
+        keywords=keywords
+    )
     
-    if activa:
-        query = query.filter(
-            Subvencion.activa == True,
-            Subvencion.fecha_fin_solicitud != None,
-            Subvencion.fecha_fin_solicitud >= datetime.now()
-        )
+    query = query.order_by(Subvencion.fecha_fin_solicitud.asc())
     
-    if organo:
-        query = query.filter(
-            or_(
-                Subvencion.organo_nivel1.ilike(f"%{organo}%"),
-                Subvencion.organo_nivel2.ilike(f"%{organo}%"),
-                Subvencion.organo_nivel3.ilike(f"%{organo}%"),
-                Subvencion.organo_convocante.ilike(f"%{organo}%")
-            )
+    subvenciones = query.offset(skip).limit(limit).all()
+    return subvenciones
+
+
+@router.get("/exportar")
+async def exportar_subvenciones(
+    formato: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    activa: Optional[bool] = True,
+    organo: Optional[str] = None,
+    organo_id: Optional[int] = None,
+    tipo_convocatoria: Optional[str] = None,
+    instrumento: Optional[str] = None,
+    sector: Optional[str] = None,
+    finalidad: Optional[str] = None,
+    presupuesto_min: Optional[float] = None,
+    keywords: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Exportar todas las subvenciones que cumplen los filtros del listado.
+    La respuesta se genera en streaming con un cursor de servidor.
+    """
+    if formato == "parquet" and not export_service.parquet_disponible():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato parquet no disponible (pyarrow no está instalado)"
         )
     
-    if tipo_convocatoria:
-        query = query.filter(Subvencion.tipo_convocatoria.ilike(f"%{tipo_convocatoria}%"))
-    
-    if instrumento:
-        query = query.filter(Subvencion.instrumentos.astext.ilike(f"%{instrumento}%"))
+    filtros = dict(
+        activa=activa,
+        organo=organo,
+        organo_ids=organo_service.ids_descendientes(db, organo_id) if organo_id else None,
+        tipo_convocatoria=tipo_convocatoria,
+        instrumento=instrumento,
+        sector=sector,
+        finalidad=finalidad,
+        presupuesto_min=presupuesto_min,
+        keywords=keywords
+    )
     
-    if sector:
-        query = query.filter(Subvencion.sectores.astext.ilike(f"%{sector}%"))
-    
-    if finalidad:
-        query = query.filter(Subvencion.finalidad_nombre.ilike(f"%{finalidad}%"))
-    
-    if presupuesto_min:
-        query = query.filter(Subvencion.presupuesto_total >= presupuesto_min)
-    
-    if keywords:
-        keyword_list = [kw.strip() for kw in keywords.split(',') if kw.strip()]
-        if keyword_list:
-            filters = []
-            for keyword in keyword_list:
-                filters.append(Subvencion.titulo.ilike(f"%{keyword}%"))
-                filters.append(Subvencion.descripcion.ilike(f"%{keyword}%"))
-            query = query.filter(or_(*filters))
-    
-    query = query.order_by(Subvencion.fecha_fin_solicitud.asc())
+    def generar():
+        # Sesión propia: la de get_db se cierra antes de terminar el streaming
+        db = SessionLocal()
+        try:
+            query = aplicar_filtros(db.query(Subvencion), **filtros).order_by(
+                Subvencion.fecha_fin_solicitud.asc(),
+                Subvencion.id.asc()
+            )
+            yield from export_service.exportar(query, formato)
+        finally:
+            db.close()
     
-    subvenciones = query.offset(skip).limit(limit).all()
-    return subvenciones
+    media_type, extension = export_service.FORMATOS_EXPORTACION[formato]
+    return StreamingResponse(
+        generar(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="subvenciones.{extension}"'}
+    )
+
+
+@router.get("/autocompletar", response_model=List[schemas.Sugerencia])
+async def autocompletar(
+    q: str = Query(..., min_length=1, max_length=100),
+    tipo: Optional[str] = Query(None, pattern="^(organo|titulo|finalidad)$"),
+    limite: int = Query(10, ge=1, le=50)
+):
+    """
+    Sugerencias de órganos, títulos y finalidades por prefijo (sin tildes ni mayúsculas).
+    Para órganos, el id es el nodo del árbol (usable como organo_id en el listado).
+    """
+    return autocompletar_service.autocompletar(q, tipo=tipo, limite=limite)
 
 
 @router.get("/valores/organos", response_model=List[str])
 async def listar_valores_organos(db: Session = Depends(get_db)):
     """Obtener lista única de órganos convocantes (nivel 1, 2, 3 y el más específico)"""
-    organos_nivel1 = [o[0] for o in db.query(distinct(Subvencion.organo_nivel1)).filter(Subvencion.organo_nivel1 != None, Subvencion.organo_nivel1 != '').all()]
-    organos_nivel2 = [o[0] for o in db.query(distinct(Subvencion.organo_nivel2)).filter(Subvencion.organo_nivel2 != None, Subvencion.organo_nivel2 != '').all()]
-    organos_nivel3 = [o[0] for o in db.query(distinct(Subvencion.organo_nivel3)).filter(Subvencion.organo_nivel3 != None, Subvencion.organo_nivel3 != '').all()]
-    organos_especificos = [o[0] for o in db.query(distinct(Subvencion.organo_convocante)).filter(Subvencion.organo_convocante != None, Subvencion.organo_convocante != '').all()]
-    
-    all_organos = sorted(list(set(organos_nivel1 + organos_nivel2 + organos_nivel3 + organos_especificos)))
-    return all_organos
+    return organo_service.nombres_organos(db)
+
+
+@router.get("/valores/organos/arbol", response_model=List[schemas.OrganoNodo])
+async def obtener_arbol_organos(db: Session = Depends(get_db)):
+    """Árbol de órganos convocantes (nivel 1 → 2 → 3) con convocatorias abiertas"""
+    return organo_service.obtener_arbol(db)["raices"]
 
 
 @router.get("/valores/tipos-convocatoria", response_model=List[str])
@@ -133,6 +175,61 @@ async def listar_valores_finalidades(db: Session = Depends(get_db)):
     return [f[0] for f in finalidades if f[0]]
 
 
+@router.post("/lote", response_model=List[schemas.SubvencionLoteItem])
+async def obtener_subvenciones_lote(
+    lote: schemas.SubvencionLoteRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Obtener varias subvenciones por id y/o id_bdns en una sola consulta.
+    Devuelve un elemento por clave pedida, en el mismo orden (primero ids,
+    después ids_bdns), marcando las que no existen.
+    """
+    condiciones = []
+    if lote.ids:
+        condiciones.append(Subvencion.id.in_(set(lote.ids)))
+    if lote.ids_bdns:
+        condiciones.append(Subvencion.id_bdns.in_(set(lote.ids_bdns)))
+    
+    encontradas = db.query(Subvencion).filter(or_(*condiciones)).all() if condiciones else []
+    por_id = {s.id: s for s in encontradas}
+    por_id_bdns = {s.id_bdns: s for s in encontradas}
+    
+    resultado = []
+    for subvencion_id in lote.ids:
+        subvencion = por_id.get(subvencion_id)
+        resultado.append(schemas.SubvencionLoteItem(
+            id=subvencion_id,
+            id_bdns=subvencion.id_bdns if subvencion else None,
+            encontrada=subvencion is not None,
+            subvencion=subvencion
+        ))
+    for id_bdns in lote.ids_bdns:
+        subvencion = por_id_bdns.get(id_bdns)
+        resultado.append(schemas.SubvencionLoteItem(
+            id=subvencion.id if subvencion else None,
+            id_bdns=id_bdns,
+            encontrada=subvencion is not None,
+            subvencion=subvencion
+        ))
+    
+    return resultado
+
+
+@router.get("/bdns/{id_bdns}", response_model=schemas.Subvencion)
+async def obtener_subvencion_por_id_bdns(id_bdns: str, db: Session = Depends(get_db)):
+    """Obtener detalle de una subvención por su número de convocatoria en BDNS"""
+    subvencion = db.query(Subvencion).filter(Subvencion.id_bdns == id_bdns).first()
+    
+    if not subvencion:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Subvención no encontrada"
+        )
+    
+    return subvencion
+
+
 @router.get("/{subvencion_id}", response_model=schemas.Subvencion)
 async def obtener_subvencion(subvencion_id: int, db: Session = Depends(get_db)):
     """Obtener detalle de una subvención"""
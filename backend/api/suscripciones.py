@@ -10,7 +10,8 @@ from api import schemas
 from models.usuario import Usuario
 from models.suscripcion import Suscripcion
 from services.email_service import EmailService
-from services.calendar_service import CalendarService
+from services import outbox_service
+from services.calendar_service import get_calendar_url
 from loguru import logger
 
 router = APIRouter(prefix="/api/suscripcion", tags=["suscripciones"])
@@ -38,16 +39,15 @@ async def crear_suscripcion(
             db.add(usuario)
             db.flush()
             
-            # Enviar email de confirmación
+            # Encolar email de confirmación (se guarda en la misma transacción que la suscripción)
             email_service = EmailService()
-            calendar_service = CalendarService()
             
-            email_service.send_confirmacion_suscripcion(
+            outbox_service.encolar(db, [email_service.build_confirmacion_suscripcion(
                 to_email=usuario.email,
                 nombre_usuario=usuario.nombre,
                 token_confirmacion=token_confirmacion,
-                calendar_url=calendar_service.get_calendar_url()
-            )
+                calendar_url=get_calendar_url()
+            )], tipo="confirmacion")
         
         # Verificar si ya tiene suscripción activa
         suscripcion_existente = db.query(Suscripcion).filter(
@@ -78,12 +78,10 @@ async def crear_suscripcion(
         
         logger.info(f"✓ Nueva suscripción creada para {usuario.email}")
         
-        calendar_service = CalendarService()
-        
         return schemas.SuscripcionResponse(
             message="Suscripción creada exitosamente. Revisa tu email para confirmar.",
             suscripcion_id=nueva_suscripcion.id,
-            calendar_url=calendar_service.get_calendar_url(),
+            calendar_url=get_calendar_url(),
             success=True
         )
         
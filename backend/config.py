@@ -3,6 +3,7 @@ Configuración de la aplicación
 """
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import List
 
 
 class Settings(BaseSettings):
@@ -17,6 +18,19 @@ class Settings(BaseSettings):
     # Google Calendar
     google_service_account_file: str = "./credentials/service-account.json"
     calendar_id: str = ""
+    calendar_tamano_lote: int = 50  # Operaciones por petición batch (máx. 50)
+    calendar_max_intentos: int = 4  # Intentos por operación ante errores transitorios
+    calendar_backoff_segundos: float = 1.0  # Espera base entre reintentos (exponencial)
+    
+    # Etapa de publicación en Calendar
+    calendar_workers: int = 2  # Peticiones batch simultáneas por ejecución
+    calendar_intervalo_segundos: int = 60
+    calendar_tamano_reclamo: int = 200  # Subvenciones reclamadas por iteración
+    calendar_publicacion_max_intentos: int = 5  # Después queda en estado "error"
+    calendar_reintento_segundos: int = 300  # Espera base entre ejecuciones fallidas (exponencial)
+    calendar_reconciliacion_hora: int = 3  # Hora UTC de la reconciliación completa diaria
+    ical_dias_pasados: int = 30  # Convocatorias cerradas que siguen en los feeds .ics
+    ical_cache_feeds: int = 256  # Feeds .ics cacheados en memoria por proceso
     
     # Email
     email_from: str = "noreply@example.com"
@@ -24,6 +38,40 @@ class Settings(BaseSettings):
     smtp_port: int = 587
     smtp_user: str = ""
     smtp_password: str = ""
+    smtp_starttls: bool = True
+    smtp_max_mensajes_por_conexion: int = 100  # Renovar la conexión tras N mensajes
+    email_transporte: str = "smtp"  # smtp, maildir, memoria, nulo
+    email_maildir: str = "./logs/maildir"  # Destino del transporte maildir
+    
+    # Bandeja de salida de emails
+    outbox_workers: int = 4  # Conexiones SMTP simultáneas por ejecución
+    outbox_max_por_segundo: float = 5.0  # Límite de envío del proveedor SMTP (0 = sin límite)
+    outbox_intervalo_segundos: int = 30
+    outbox_tamano_lote: int = 200
+    outbox_max_intentos: int = 5
+    outbox_backoff_segundos: int = 60  # Espera base antes de reintentar (se duplica en cada fallo)
+    notificaciones_reserva_minutos: int = 30  # Reserva sin email encolado que se da por abandonada
+    
+    # Sincronización con BDNS
+    sync_modo: str = "pipeline"  # pipeline (etapas solapadas) o paginas (memoria acotada)
+    sync_concurrencia_listado: int = 2  # Páginas del listado pedidas a la vez
+    sync_concurrencia_detalles: int = 8  # Detalles de convocatoria pedidos a la vez
+    sync_concurrencia_notificacion: int = 1  # Lotes guardados notificándose a la vez
+    sync_tamano_cola: int = 200  # Capacidad de las colas entre etapas
+    sync_tamano_lote_guardado: int = 50  # Subvenciones por commit
+    sync_espera_lote_segundos: float = 2.0  # Guardar un lote incompleto tras esta espera
+    
+    # Emparejamiento: pares suscripción × subvención a partir de los que se usa NumPy
+    matching_vectorizado_umbral: int = 200_000
+    
+    # Resúmenes (frecuencia_email diaria/semanal), hora UTC
+    digest_hora: int = 8
+    digest_dia_semana: int = 0  # 0 = lunes
+    
+    # Recordatorios de fecha límite, hora UTC
+    recordatorios_dias: List[int] = [7, 3, 1]
+    recordatorios_hora: int = 8
+    recordatorios_tamano_lote: int = 500
     
     # Application
     app_host: str = "0.0.0.0"
@@ -34,6 +82,8 @@ class Settings(BaseSettings):
     scheduler_enabled: bool = True
     scheduler_hour: int = 8
     scheduler_minute: int = 0
+    scheduler_eleccion_lider: bool = True  # Solo una réplica ejecuta los jobs (advisory lock)
+    scheduler_lider_intervalo_segundos: int = 15  # Reintento / comprobación del liderazgo
     
     # Logging
     log_level: str = "INFO"
@@ -9,6 +9,7 @@ import sys
 
 from config import get_settings
 from api import suscripciones, subvenciones, catalogos, admin, calendar
+from services import autocompletar_service
 from tasks.scheduler import start_scheduler, stop_scheduler
 
 settings = get_settings()
@@ -40,6 +41,9 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"No se pudieron configurar credenciales automáticas: {e}")
     
+    # Índice de autocompletado (en segundo plano: no retrasa el arranque)
+    autocompletar_service.refrescar_en_segundo_plano()
+    
     # Iniciar scheduler si está habilitado
     if settings.scheduler_enabled:
         start_scheduler()
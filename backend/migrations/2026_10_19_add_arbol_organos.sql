@@ -0,0 +1,28 @@
+-- Migración: 2026_10_19_add_arbol_organos.sql
+-- Árbol materializado de órganos convocantes (nivel1 → nivel2 → nivel3)
+
+CREATE TABLE IF NOT EXISTS organos (
+    id SERIAL PRIMARY KEY,
+    clave VARCHAR(1000) UNIQUE NOT NULL,
+    nombre VARCHAR(300) NOT NULL,
+    nivel INTEGER NOT NULL,
+    padre_id INTEGER REFERENCES organos(id),
+    num_convocatorias INTEGER DEFAULT 0,
+    num_abiertas INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_organos_padre ON organos (padre_id);
+
+-- Nodo más específico de cada subvención
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS organo_id INTEGER REFERENCES organos(id);
+CREATE INDEX IF NOT EXISTS idx_subvenciones_organo_id ON subvenciones (organo_id);
+
+-- Comentarios
+COMMENT ON TABLE organos IS 'Árbol de órganos convocantes con conteos de convocatorias';
+COMMENT ON COLUMN organos.clave IS 'Ruta normalizada del nodo (nivel1/nivel2/nivel3)';
+COMMENT ON COLUMN subvenciones.organo_id IS 'Nodo más específico del árbol de órganos';
+
+-- POST /admin/ejecutar-migracion rellena el árbol con las subvenciones existentes al terminar.
+-- Si se aplica este fichero a mano: POST /admin/reconstruir-arbol-organos
@@ -0,0 +1,17 @@
+-- Migración: 2026_10_19_add_area_tematica_finalidades.sql
+-- Asociación indexada área temática <-> finalidad BDNS (desde finalidades_bdns)
+
+CREATE TABLE IF NOT EXISTS area_tematica_finalidades (
+    area_id INTEGER NOT NULL REFERENCES areas_tematicas(id) ON DELETE CASCADE,
+    finalidad_id INTEGER NOT NULL,
+    PRIMARY KEY (area_id, finalidad_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_area_tematica_finalidades_finalidad_id ON area_tematica_finalidades (finalidad_id);
+
+-- Rellenar desde la lista separada por comas
+INSERT INTO area_tematica_finalidades (area_id, finalidad_id)
+SELECT DISTINCT a.id, trim(f)::INTEGER
+FROM areas_tematicas a, regexp_split_to_table(COALESCE(a.finalidades_bdns, ''), ',') AS f
+WHERE trim(f) ~ '^[0-9]+$'
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,6 @@
+-- Migración: 2026_10_19_add_calendar_hash.sql
+-- Hash del evento publicado en Google Calendar para reconciliar solo los cambios
+
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_hash VARCHAR(64);
+
+-- Los eventos existentes no tienen hash: la primera reconciliación los actualiza una vez
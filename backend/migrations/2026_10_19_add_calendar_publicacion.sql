@@ -0,0 +1,29 @@
+-- Migración: 2026_10_19_add_calendar_publicacion.sql
+-- Cola de publicación en Google Calendar (etapa separada de la sincronización)
+
+-- Sin DEFAULT al añadirla: las filas existentes quedan a NULL hasta clasificarlas
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_estado VARCHAR(20);
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_intentos INTEGER DEFAULT 0;
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_proximo_intento TIMESTAMP DEFAULT NOW();
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS calendar_error VARCHAR(500);
+
+-- Pendientes: publicables sin evento, eventos sin hash (anteriores a la reconciliación)
+-- y eventos de convocatorias retiradas; el resto ya está al día.
+-- Solo las filas sin clasificar: al repetir la migración no se pisan las
+-- pendientes legítimas (cambios de contenido encolados desde entonces)
+UPDATE subvenciones
+SET calendar_estado = CASE
+        WHEN (calendar_event_id IS NULL AND activa = TRUE AND fecha_fin_solicitud IS NOT NULL)
+          OR (calendar_event_id IS NOT NULL AND calendar_hash IS NULL)
+          OR (calendar_event_id IS NOT NULL AND activa = FALSE)
+        THEN 'pendiente'
+        ELSE 'publicado'
+    END,
+    calendar_intentos = 0,
+    calendar_proximo_intento = NOW()
+WHERE calendar_estado IS NULL;
+
+ALTER TABLE subvenciones ALTER COLUMN calendar_estado SET DEFAULT 'pendiente';
+
+-- Consulta "próximas publicaciones en Calendar"
+CREATE INDEX IF NOT EXISTS idx_subvenciones_calendar_estado_proximo ON subvenciones (calendar_estado, calendar_proximo_intento);
@@ -0,0 +1,35 @@
+-- Migración: 2026_10_19_add_columnas_busqueda.sql
+-- Columnas de búsqueda normalizadas (minúsculas, sin tildes) con índices trigram
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS organo_norm TEXT;
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS tipo_convocatoria_norm VARCHAR(200);
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS finalidad_norm VARCHAR(200);
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS texto_norm TEXT;
+
+-- Rellenar filas existentes (la aplicación las mantiene al insertar/actualizar)
+UPDATE subvenciones SET
+    organo_norm = NULLIF(array_to_string(ARRAY[
+        NULLIF(trim(regexp_replace(lower(unaccent(organo_nivel1)), '\s+', ' ', 'g')), ''),
+        NULLIF(trim(regexp_replace(lower(unaccent(organo_nivel2)), '\s+', ' ', 'g')), ''),
+        NULLIF(trim(regexp_replace(lower(unaccent(organo_nivel3)), '\s+', ' ', 'g')), ''),
+        NULLIF(trim(regexp_replace(lower(unaccent(organo_convocante)), '\s+', ' ', 'g')), '')
+    ], ' | '), ''),
+    tipo_convocatoria_norm = NULLIF(trim(regexp_replace(lower(unaccent(tipo_convocatoria)), '\s+', ' ', 'g')), ''),
+    finalidad_norm = NULLIF(trim(regexp_replace(lower(unaccent(finalidad_nombre)), '\s+', ' ', 'g')), ''),
+    texto_norm = NULLIF(array_to_string(ARRAY[
+        NULLIF(trim(regexp_replace(lower(unaccent(titulo)), '\s+', ' ', 'g')), ''),
+        NULLIF(trim(regexp_replace(lower(unaccent(descripcion)), '\s+', ' ', 'g')), '')
+    ], ' | '), '');
+
+-- Índices trigram para LIKE '%texto%'
+CREATE INDEX IF NOT EXISTS idx_subvenciones_organo_norm ON subvenciones USING gin (organo_norm gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_subvenciones_tipo_convocatoria_norm ON subvenciones USING gin (tipo_convocatoria_norm gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_subvenciones_finalidad_norm ON subvenciones USING gin (finalidad_norm gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_subvenciones_texto_norm ON subvenciones USING gin (texto_norm gin_trgm_ops);
+
+-- Comentarios
+COMMENT ON COLUMN subvenciones.organo_norm IS 'Niveles del órgano normalizados (minúsculas, sin tildes)';
+COMMENT ON COLUMN subvenciones.texto_norm IS 'Título y descripción normalizados (minúsculas, sin tildes)';
@@ -0,0 +1,13 @@
+-- Migración: 2026_10_19_add_contenido_actualizado.sql
+-- Fecha de último cambio del contenido de los feeds .ics (versión y ETag de los feeds)
+
+ALTER TABLE subvenciones ADD COLUMN IF NOT EXISTS contenido_actualizado_en TIMESTAMP DEFAULT NOW();
+
+-- Filas existentes: la mejor aproximación es su updated_at
+UPDATE subvenciones
+SET contenido_actualizado_en = COALESCE(updated_at, created_at, NOW())
+WHERE contenido_actualizado_en IS NULL OR contenido_actualizado_en > updated_at;
+
+CREATE INDEX IF NOT EXISTS ix_subvenciones_contenido_actualizado_en ON subvenciones (contenido_actualizado_en);
+
+COMMENT ON COLUMN subvenciones.contenido_actualizado_en IS 'Último cambio de los campos de los feeds .ics (no cambia con el estado de Calendar)';
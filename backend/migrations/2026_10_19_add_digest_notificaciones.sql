@@ -0,0 +1,5 @@
+-- Migración: 2026_10_19_add_digest_notificaciones.sql
+-- Notificaciones aplazadas al resumen diario/semanal del usuario
+
+ALTER TABLE notificaciones_enviadas ADD COLUMN IF NOT EXISTS programada_para TIMESTAMP;
+CREATE INDEX IF NOT EXISTS ix_notificaciones_enviadas_programada_para ON notificaciones_enviadas (programada_para);
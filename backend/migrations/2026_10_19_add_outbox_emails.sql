@@ -0,0 +1,26 @@
+-- Migración: 2026_10_19_add_outbox_emails.sql
+-- Bandeja de salida de emails: los productores encolan y los workers envían
+
+CREATE TABLE IF NOT EXISTS emails_pendientes (
+    id SERIAL PRIMARY KEY,
+    tipo VARCHAR(30),
+    destinatario VARCHAR(255) NOT NULL,
+    asunto TEXT NOT NULL,
+    html TEXT NOT NULL,
+    texto TEXT,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER DEFAULT 0,
+    proximo_intento TIMESTAMP NOT NULL DEFAULT NOW(),
+    error VARCHAR(500),
+    fecha_envio TIMESTAMP,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_emails_pendientes_estado_proximo ON emails_pendientes (estado, proximo_intento);
+
+-- Tablas creadas con asunto VARCHAR(500): el título de la subvención ya puede ocupar 500
+ALTER TABLE emails_pendientes ALTER COLUMN asunto TYPE TEXT;
+
+-- Notificación -> email que la entrega
+ALTER TABLE notificaciones_enviadas ADD COLUMN IF NOT EXISTS email_id INTEGER REFERENCES emails_pendientes(id);
+CREATE INDEX IF NOT EXISTS ix_notificaciones_enviadas_email_id ON notificaciones_enviadas (email_id);
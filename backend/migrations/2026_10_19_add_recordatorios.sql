@@ -0,0 +1,28 @@
+-- Migración: 2026_10_19_add_recordatorios.sql
+-- Recordatorios de fecha límite (7, 3 y 1 días antes) programados en BD
+
+CREATE TABLE IF NOT EXISTS recordatorios (
+    id SERIAL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios(id),
+    subvencion_id INTEGER NOT NULL REFERENCES subvenciones(id),
+    dias_antes INTEGER NOT NULL,
+    fecha_programada TIMESTAMP NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    email_id INTEGER REFERENCES emails_pendientes(id),
+    created_at TIMESTAMP DEFAULT NOW(),
+    CONSTRAINT uq_recordatorios_usuario_subvencion_dias UNIQUE (usuario_id, subvencion_id, dias_antes)
+);
+
+-- Consulta "próximos recordatorios vencidos"
+CREATE INDEX IF NOT EXISTS idx_recordatorios_estado_fecha ON recordatorios (estado, fecha_programada);
+
+-- Programar los recordatorios de las notificaciones ya existentes
+INSERT INTO recordatorios (usuario_id, subvencion_id, dias_antes, fecha_programada, estado)
+SELECT n.usuario_id, n.subvencion_id, d.dias, (s.fecha_fin_solicitud::DATE - d.dias) + TIME '08:00', 'pendiente'
+FROM notificaciones_enviadas n
+JOIN subvenciones s ON s.id = n.subvencion_id
+CROSS JOIN (VALUES (7), (3), (1)) AS d(dias)
+WHERE n.tipo = 'email'
+  AND s.activa = TRUE
+  AND (s.fecha_fin_solicitud::DATE - d.dias) + TIME '08:00' > NOW() AT TIME ZONE 'UTC'
+ON CONFLICT DO NOTHING;
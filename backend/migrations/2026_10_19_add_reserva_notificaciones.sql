@@ -0,0 +1,7 @@
+-- Migración: 2026_10_19_add_reserva_notificaciones.sql
+-- Momento de la reserva de cada notificación, para recuperar las abandonadas
+
+ALTER TABLE notificaciones_enviadas ADD COLUMN IF NOT EXISTS reservada_en TIMESTAMP;
+
+-- Las reservas existentes sin email ni entrega programada quedan con
+-- reservada_en NULL y se tratan como caducadas en la próxima sincronización
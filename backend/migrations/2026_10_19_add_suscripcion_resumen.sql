@@ -0,0 +1,7 @@
+-- Migración: 2026_10_19_add_suscripcion_resumen.sql
+-- Suscripción que programó cada notificación aplazada al resumen
+
+ALTER TABLE notificaciones_enviadas ADD COLUMN IF NOT EXISTS suscripcion_id INTEGER REFERENCES suscripciones(id);
+
+-- Las notificaciones ya programadas quedan con suscripcion_id NULL: el resumen
+-- usa la suscripción de resumen más frecuente del usuario
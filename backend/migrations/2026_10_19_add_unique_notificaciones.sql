@@ -0,0 +1,20 @@
+-- Migración: 2026_10_19_add_unique_notificaciones.sql
+-- Un único registro de notificación por (usuario, subvención, tipo)
+
+-- Eliminar duplicados conservando el envío correcto (o el más antiguo)
+DELETE FROM notificaciones_enviadas n
+USING (
+    SELECT id, ROW_NUMBER() OVER (
+        PARTITION BY usuario_id, subvencion_id, tipo
+        ORDER BY enviada DESC NULLS LAST, id
+    ) AS fila
+    FROM notificaciones_enviadas
+) d
+WHERE n.id = d.id AND d.fila > 1;
+
+-- Los fallos antiguos no guardaban el error: marcarlos para que se reintenten
+UPDATE notificaciones_enviadas SET error = 'Error al enviar email'
+WHERE enviada = FALSE AND error IS NULL;
+
+ALTER TABLE notificaciones_enviadas
+ADD CONSTRAINT uq_notificaciones_usuario_subvencion_tipo UNIQUE (usuario_id, subvencion_id, tipo);
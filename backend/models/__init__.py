@@ -5,7 +5,10 @@ from models.subvencion import Subvencion
 from models.usuario import Usuario
 from models.suscripcion import Suscripcion
 from models.notificacion_enviada import NotificacionEnviada
-from models.catalogo import Region, AreaTematica, Finalidad
+from models.catalogo import Region, AreaTematica, AreaTematicaFinalidad, Finalidad
+from models.organo import Organo
+from models.email_pendiente import EmailPendiente
+from models.recordatorio import Recordatorio
 
 __all__ = [
     "Subvencion",
@@ -14,5 +17,9 @@ __all__ = [
     "NotificacionEnviada",
     "Region",
     "AreaTematica",
+    "AreaTematicaFinalidad",
     "Finalidad",
+    "Organo",
+    "EmailPendiente",
+    "Recordatorio",
 ]
@@ -1,7 +1,7 @@
 """
 Modelos de Catálogos
 """
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
 from datetime import datetime
 from database import Base
 
@@ -38,6 +38,17 @@ class AreaTematica(Base):
         return f"<AreaTematica {self.nombre}>"
 
 
+class AreaTematicaFinalidad(Base):
+    """Asociación área temática <-> finalidad BDNS (derivada de finalidades_bdns)"""
+    __tablename__ = "area_tematica_finalidades"
+    
+    area_id = Column(Integer, ForeignKey("areas_tematicas.id", ondelete="CASCADE"), primary_key=True)
+    finalidad_id = Column(Integer, primary_key=True, index=True)
+    
+    def __repr__(self):
+        return f"<AreaTematicaFinalidad {self.area_id} -> {self.finalidad_id}>"
+
+
 class Finalidad(Base):
     """Catálogo de finalidades de BDNS"""
     __tablename__ = "finalidades"
@@ -0,0 +1,36 @@
+"""
+Modelo de Email Pendiente (bandeja de salida)
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from datetime import datetime
+from database import Base
+
+
+class EmailPendiente(Base):
+    """Email encolado para envío asíncrono por los workers de la bandeja de salida"""
+    __tablename__ = "emails_pendientes"
+    __table_args__ = (
+        Index("idx_emails_pendientes_estado_proximo", "estado", "proximo_intento"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Mensaje
+    tipo = Column(String(30))  # nueva_subvencion, confirmacion...
+    destinatario = Column(String(255), nullable=False)
+    asunto = Column(Text, nullable=False)  # Incluye el título de la subvención (sin límite)
+    html = Column(Text, nullable=False)
+    texto = Column(Text)
+    
+    # Estado: pendiente, enviando, enviado, error
+    estado = Column(String(20), default="pendiente", nullable=False)
+    intentos = Column(Integer, default=0)
+    proximo_intento = Column(DateTime, default=datetime.utcnow, nullable=False)
+    error = Column(String(500))
+    fecha_envio = Column(DateTime)
+    
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<EmailPendiente {self.id} {self.estado}>"
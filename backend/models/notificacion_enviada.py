@@ -1,7 +1,7 @@
 """
 Modelo de Notificación Enviada
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, UniqueConstraint
 from datetime import datetime
 from database import Base
 
@@ -9,6 +9,9 @@ from database import Base
 class NotificacionEnviada(Base):
     """Registro de notificaciones enviadas para evitar duplicados"""
     __tablename__ = "notificaciones_enviadas"
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "subvencion_id", "tipo", name="uq_notificaciones_usuario_subvencion_tipo"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -23,6 +26,16 @@ class NotificacionEnviada(Base):
     fecha_envio = Column(DateTime)
     error = Column(String(500))
     
+    # Email de la bandeja de salida que entrega esta notificación
+    email_id = Column(Integer, ForeignKey("emails_pendientes.id"), index=True)
+    
+    # Entrega agrupada en el resumen diario/semanal (null = inmediata)
+    programada_para = Column(DateTime, index=True)
+    suscripcion_id = Column(Integer, ForeignKey("suscripciones.id"))  # Suscripción que pidió el resumen
+    
+    # Momento de la reserva: si caduca sin email ni entrega programada, se puede volver a reservar
+    reservada_en = Column(DateTime)
+    
     # Metadata
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -0,0 +1,28 @@
+"""
+Modelo de Órgano convocante (árbol materializado)
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from database import Base
+
+
+class Organo(Base):
+    """Nodo del árbol de órganos convocantes (nivel1 → nivel2 → nivel3)"""
+    __tablename__ = "organos"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    clave = Column(String(1000), unique=True, index=True, nullable=False)  # Ruta normalizada nivel1/nivel2/nivel3
+    nombre = Column(String(300), nullable=False)
+    nivel = Column(Integer, nullable=False)  # 1, 2 o 3
+    padre_id = Column(Integer, ForeignKey("organos.id"), index=True)
+    
+    # Conteos mantenidos en la ingesta (incluyen descendientes)
+    num_convocatorias = Column(Integer, default=0)
+    num_abiertas = Column(Integer, default=0)
+    
+    # Fechas
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<Organo {self.clave}>"
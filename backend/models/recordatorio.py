@@ -0,0 +1,34 @@
+"""
+Modelo de Recordatorio de plazo
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, UniqueConstraint
+from datetime import datetime
+from database import Base
+
+
+class Recordatorio(Base):
+    """Recordatorio de fecha límite programado para un usuario y una subvención"""
+    __tablename__ = "recordatorios"
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "subvencion_id", "dias_antes", name="uq_recordatorios_usuario_subvencion_dias"),
+        Index("idx_recordatorios_estado_fecha", "estado", "fecha_programada"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    subvencion_id = Column(Integer, ForeignKey("subvenciones.id"), nullable=False)
+    
+    # Programación
+    dias_antes = Column(Integer, nullable=False)  # 7, 3, 1
+    fecha_programada = Column(DateTime, nullable=False)
+    
+    # Estado: pendiente, encolado, descartado
+    estado = Column(String(20), default="pendiente", nullable=False)
+    email_id = Column(Integer, ForeignKey("emails_pendientes.id"))
+    
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<Recordatorio {self.id} - {self.dias_antes} días>"
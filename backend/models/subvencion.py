@@ -1,14 +1,29 @@
 """
 Modelo de Subvención
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Numeric, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Numeric, Boolean, JSON, ForeignKey, Index, event, inspect
 from datetime import datetime
 from database import Base
+from utils.texto import normalizar_texto
+
+
+# Campos que aparecen en el evento de Calendar: si cambian, hay que volver a publicarlo
+CAMPOS_EVENTO_CALENDAR = (
+    "titulo", "descripcion", "fecha_inicio_solicitud", "fecha_fin_solicitud", "url_bdns",
+    "presupuesto_total", "region_nombre", "organo_convocante", "activa",
+)
+
+# Campos que determinan los feeds .ics: los del evento más los de los filtros de suscripción
+CAMPOS_FEED_ICAL = CAMPOS_EVENTO_CALENDAR + ("id_bdns", "region_id", "finalidad_id")
 
 
 class Subvencion(Base):
     """Modelo de subvención de BDNS"""
     __tablename__ = "subvenciones"
+    __table_args__ = (
+        # Consulta "próximas publicaciones en Calendar"
+        Index("idx_subvenciones_calendar_estado_proximo", "calendar_estado", "calendar_proximo_intento"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     id_bdns = Column(String(50), unique=True, index=True, nullable=False)
@@ -32,6 +47,7 @@ class Subvencion(Base):
     organo_nivel2 = Column(String(300))  # Ej: CONSEJERÍA DE...
     organo_nivel3 = Column(String(300))  # Ej: DIRECCIÓN GENERAL DE...
     organo_convocante = Column(String(300))  # El más específico disponible
+    organo_id = Column(Integer, ForeignKey("organos.id"), index=True)  # Nodo más específico del árbol de órganos
     tipo_administracion = Column(String(10))
     
     # Tipo de convocatoria y ayuda
@@ -57,9 +73,62 @@ class Subvencion(Base):
     activa = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Solo cambia con los campos de los feeds .ics (no con el estado de publicación en Calendar)
+    contenido_actualizado_en = Column(DateTime, default=datetime.utcnow, index=True)
     
     # ID del evento en Google Calendar
     calendar_event_id = Column(String(200))
+    calendar_hash = Column(String(64))  # Hash del evento publicado (detecta cambios)
+    
+    # Publicación en Calendar (etapa independiente de la sincronización)
+    calendar_estado = Column(String(20), default="pendiente")  # pendiente, publicando, publicado, error
+    calendar_intentos = Column(Integer, default=0)
+    calendar_proximo_intento = Column(DateTime, default=datetime.utcnow)
+    calendar_error = Column(String(500))
+    
+    # Columnas de búsqueda normalizadas (minúsculas y sin tildes), calculadas al guardar
+    organo_norm = Column(Text)  # Todos los niveles del órgano
+    tipo_convocatoria_norm = Column(String(200))
+    finalidad_norm = Column(String(200))
+    texto_norm = Column(Text)  # Título y descripción
+    
+    def actualizar_campos_busqueda(self):
+        """Recalcular las columnas de búsqueda normalizadas"""
+        organos = [
+            normalizar_texto(o) for o in (
+                self.organo_nivel1, self.organo_nivel2, self.organo_nivel3, self.organo_convocante
+            ) if o
+        ]
+        self.organo_norm = " | ".join(organos) or None
+        self.tipo_convocatoria_norm = normalizar_texto(self.tipo_convocatoria) or None
+        self.finalidad_norm = normalizar_texto(self.finalidad_nombre) or None
+        self.texto_norm = " | ".join(
+            t for t in (normalizar_texto(self.titulo), normalizar_texto(self.descripcion)) if t
+        ) or None
     
     def __repr__(self):
         return f"<Subvencion {self.id_bdns}: {self.titulo[:50]}>"
+
+
+@event.listens_for(Subvencion, "before_insert")
+@event.listens_for(Subvencion, "before_update")
+def _actualizar_campos_busqueda(mapper, connection, target):
+    target.actualizar_campos_busqueda()
+
+
+@event.listens_for(Subvencion, "before_update")
+def _marcar_publicacion_calendar(mapper, connection, target):
+    """Volver a encolar la publicación si cambia algún campo del evento"""
+    estado = inspect(target)
+    if any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_EVENTO_CALENDAR):
+        target.calendar_estado = "pendiente"
+        target.calendar_intentos = 0
+        target.calendar_proximo_intento = datetime.utcnow()
+
+
+@event.listens_for(Subvencion, "before_update")
+def _marcar_contenido_actualizado(mapper, connection, target):
+    """Fecha de último cambio del contenido de los feeds .ics"""
+    estado = inspect(target)
+    if any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_FEED_ICAL):
+        target.contenido_actualizado_en = datetime.utcnow()
@@ -0,0 +1,137 @@
+"""
+Benchmark de publicación de eventos en Google Calendar
+
+Publica subvenciones sintéticas contra el sustituto en memoria de la API
+(services/calendar_local.py) con la latencia y la tasa de errores de
+cuota indicadas, y compara:
+- una petición por evento (create_event),
+- peticiones batch (ejecutar_lote),
+- peticiones batch repartidas entre CALENDAR_WORKERS hilos (la etapa
+  procesar_calendar) para cada número de hilos de --workers.
+
+Comprueba además que cada método deja exactamente un evento por subvención.
+"""
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings
+from services import calendar_publicacion_service
+from services.calendar_local import CalendarLocal
+from services.calendar_service import CalendarService, OperacionCalendar, evento_subvencion
+
+settings = get_settings()
+
+
+def generar_subvenciones(n: int, rng: random.Random):
+    hoy = datetime.now()
+    return [
+        SimpleNamespace(
+            id=i,
+            id_bdns=str(800000 + i),
+            titulo=f"Convocatoria de ayudas a la investigación {i}",
+            descripcion="Subvención sintética para medir la publicación en Calendar. " * 4,
+            fecha_inicio_solicitud=hoy,
+            fecha_fin_solicitud=hoy + timedelta(days=rng.randint(5, 90)),
+            url_bdns=f"https://www.infosubvenciones.es/bdnstrans/GE/es/convocatoria/{800000 + i}",
+            presupuesto_total=Decimal(rng.randint(1, 500) * 10000),
+            region_nombre="ES70 - CANARIAS",
+            organo_convocante="Órgano de pruebas",
+        )
+        for i in range(n)
+    ]
+
+
+def crear_api(args) -> CalendarLocal:
+    return CalendarLocal(
+        latencia=args.latencia,
+        latencia_por_operacion=args.latencia_operacion,
+        tasa_errores_cuota=args.errores_cuota,
+        semilla=args.semilla
+    )
+
+
+def publicar_secuencial(calendar: CalendarService, subvenciones):
+    for s in subvenciones:
+        evento = evento_subvencion(s)
+        for intento in range(settings.calendar_max_intentos):
+            try:
+                calendar.service.events().insert(calendarId=calendar.calendar_id, body=evento).execute()
+                break
+            except Exception:
+                time.sleep(settings.calendar_backoff_segundos * 2 ** intento)
+
+
+def publicar_lote(calendar: CalendarService, subvenciones):
+    calendar.ejecutar_lote([
+        OperacionCalendar(s.id, "insert", body=evento_subvencion(s)) for s in subvenciones
+    ])
+
+
+def publicar_en_paralelo(calendar: CalendarService, subvenciones):
+    calendar_publicacion_service._ejecutar_en_paralelo(calendar, [
+        OperacionCalendar(s.id, "insert", body=evento_subvencion(s)) for s in subvenciones
+    ])
+
+
+def medir(nombre, funcion, args, subvenciones):
+    api = crear_api(args)
+    calendar = CalendarService(service=api)
+    
+    inicio = time.perf_counter()
+    funcion(calendar, subvenciones)
+    duracion = time.perf_counter() - inicio
+    
+    publicados = len(api.eventos(calendar.calendar_id))
+    print(
+        f"  {nombre:<26} {duracion:7.2f} s  {publicados / duracion:8.1f} eventos/s  "
+        f"{api.peticiones_http:>5} peticiones HTTP  {api.errores_cuota:>4} errores de cuota"
+    )
+    return publicados
+
+
+def _enteros(valor: str):
+    return [int(v) for v in valor.split(",") if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de publicación en Google Calendar")
+    parser.add_argument("--subvenciones", type=int, default=500)
+    parser.add_argument("--latencia", type=float, default=0.05, help="Segundos por petición HTTP")
+    parser.add_argument("--latencia-operacion", type=float, default=0.001, help="Segundos por operación")
+    parser.add_argument("--errores-cuota", type=float, default=0.01, help="Probabilidad de 403 rateLimitExceeded")
+    parser.add_argument("--workers", type=_enteros, default=[1, 2, 4], help="Hilos de la etapa, separados por comas")
+    parser.add_argument("--backoff", type=float, default=0.05, help="Espera base entre reintentos")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--sin-secuencial", action="store_true", help="Omitir el método de una petición por evento")
+    args = parser.parse_args()
+
+    settings.calendar_backoff_segundos = args.backoff
+    settings.calendar_max_intentos = max(settings.calendar_max_intentos, 8)
+    subvenciones = generar_subvenciones(args.subvenciones, random.Random(args.semilla))
+    
+    print(
+        f"{args.subvenciones} eventos, latencia {args.latencia * 1000:.0f} ms/petición, "
+        f"{args.errores_cuota:.1%} errores de cuota"
+    )
+    
+    resultados = {}
+    if not args.sin_secuencial:
+        resultados["secuencial"] = medir("una petición por evento", publicar_secuencial, args, subvenciones)
+    resultados["lote"] = medir("batch", publicar_lote, args, subvenciones)
+    for workers in args.workers:
+        settings.calendar_workers = workers
+        resultados[f"paralelo-{workers}"] = medir(f"batch con {workers} hilos", publicar_en_paralelo, args, subvenciones)
+    
+    incompletos = {nombre: n for nombre, n in resultados.items() if n != args.subvenciones}
+    if incompletos:
+        print(f"✗ Eventos publicados distintos de {args.subvenciones}: {incompletos}")
+        sys.exit(1)
+    print("✓ Todos los métodos publican un evento por subvención")
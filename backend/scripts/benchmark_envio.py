@@ -0,0 +1,160 @@
+"""
+Benchmark del envío de notificaciones (mensajes por segundo)
+
+Crea usuarios, suscripciones y subvenciones sintéticos, ejecuta
+enviar_notificaciones (emparejamiento, reserva y encolado) y vacía la
+bandeja de salida con procesar_outbox para cada combinación de tamaño de
+lote (OUTBOX_TAMANO_LOTE) y conexiones simultáneas (OUTBOX_WORKERS).
+
+Por defecto envía por SMTP a un servidor local de pruebas arrancado en
+el propio proceso (scripts/servidor_smtp_local.py); --transporte permite
+medir maildir, memoria o nulo. Usar una base de datos de pruebas:
+procesar_outbox también envía cualquier email pendiente que haya.
+"""
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings
+from database import SessionLocal
+from models.email_pendiente import EmailPendiente
+from models.notificacion_enviada import NotificacionEnviada
+from models.recordatorio import Recordatorio
+from models.subvencion import Subvencion
+from models.suscripcion import Suscripcion
+from models.usuario import Usuario
+from services import email_transport, outbox_service
+from tasks.sync_subvenciones import enviar_notificaciones
+from servidor_smtp_local import iniciar_en_segundo_plano
+
+settings = get_settings()
+
+DOMINIO = "benchmark.local"
+
+
+def crear_datos(db, usuarios: int, subvenciones: int):
+    """Usuarios confirmados con una suscripción inmediata sin filtros"""
+    nuevos = [
+        Usuario(email=f"bench-{i}@{DOMINIO}", nombre=f"Usuario {i}", confirmado=True, activo=True)
+        for i in range(usuarios)
+    ]
+    db.add_all(nuevos)
+    db.flush()
+    db.add_all([
+        Suscripcion(usuario_id=u.id, frecuencia_email="inmediata")
+        for u in nuevos
+    ])
+    db.add_all([
+        Subvencion(
+            id_bdns=f"bench-{i}",
+            titulo=f"Convocatoria de benchmark {i}",
+            descripcion="Subvención sintética para medir el envío de notificaciones. " * 5,
+            organo_convocante="Órgano de pruebas",
+            presupuesto_total=100000,
+            url_bdns="https://www.infosubvenciones.es/"
+        )
+        for i in range(subvenciones)
+    ])
+    db.commit()
+    return db.query(Subvencion).filter(Subvencion.id_bdns.like("bench-%")).all()
+
+
+def limpiar_envios(db):
+    """Borrar notificaciones, emails y recordatorios del benchmark"""
+    usuario_ids = db.query(Usuario.id).filter(Usuario.email.like(f"%@{DOMINIO}"))
+    db.query(NotificacionEnviada).filter(NotificacionEnviada.usuario_id.in_(usuario_ids)).delete(synchronize_session=False)
+    db.query(Recordatorio).filter(Recordatorio.usuario_id.in_(usuario_ids)).delete(synchronize_session=False)
+    db.query(EmailPendiente).filter(EmailPendiente.destinatario.like(f"%@{DOMINIO}")).delete(synchronize_session=False)
+    db.commit()
+
+
+def limpiar_datos(db):
+    limpiar_envios(db)
+    usuario_ids = db.query(Usuario.id).filter(Usuario.email.like(f"%@{DOMINIO}"))
+    db.query(Suscripcion).filter(Suscripcion.usuario_id.in_(usuario_ids)).delete(synchronize_session=False)
+    db.query(Usuario).filter(Usuario.email.like(f"%@{DOMINIO}")).delete(synchronize_session=False)
+    db.query(Subvencion).filter(Subvencion.id_bdns.like("bench-%")).delete(synchronize_session=False)
+    db.commit()
+
+
+def configurar_transporte(nombre: str, latencia: float):
+    """Apuntar el transporte del proceso al destino elegido"""
+    servidor = None
+    if nombre == "smtp":
+        servidor = iniciar_en_segundo_plano(latencia=latencia)
+        settings.smtp_host, settings.smtp_port = servidor.server_address
+        settings.smtp_user = ""
+        settings.smtp_starttls = False
+    elif nombre == "maildir":
+        settings.email_maildir = tempfile.mkdtemp(prefix="benchmark-maildir-")
+    
+    settings.email_transporte = nombre
+    email_transport.get_transporte.cache_clear()
+    return servidor
+
+
+def medir(db, subvenciones, tamano_lote: int, workers: int):
+    limpiar_envios(db)
+    settings.outbox_tamano_lote = tamano_lote
+    settings.outbox_workers = workers
+    
+    inicio = time.perf_counter()
+    enviar_notificaciones(db, subvenciones)
+    encolado = time.perf_counter() - inicio
+    
+    inicio = time.perf_counter()
+    resultado = outbox_service.procesar_outbox()
+    envio = time.perf_counter() - inicio
+    
+    enviados = resultado["enviados"]
+    total = encolado + envio
+    print(
+        f"  lote {tamano_lote:>5}  conexiones {workers:>2}  "
+        f"{enviados:>6} emails  encolar {encolado:6.2f} s  enviar {envio:6.2f} s  "
+        f"{enviados / total if total else 0:8.1f} emails/s"
+    )
+    return resultado
+
+
+def _enteros(valor: str):
+    return [int(v) for v in valor.split(",") if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del envío de notificaciones")
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--subvenciones", type=int, default=2)
+    parser.add_argument("--lotes", type=_enteros, default=[50, 200, 1000], help="Tamaños de lote, separados por comas")
+    parser.add_argument("--conexiones", type=_enteros, default=[1, 4, 8], help="Conexiones simultáneas, separadas por comas")
+    parser.add_argument("--transporte", choices=email_transport.TRANSPORTES, default="smtp")
+    parser.add_argument("--latencia", type=float, default=0.002, help="Segundos por mensaje en el SMTP local")
+    parser.add_argument("--tasa", type=float, default=0, help="Límite de emails/s del proveedor (0 = sin límite)")
+    args = parser.parse_args()
+
+    settings.outbox_max_por_segundo = args.tasa
+    servidor = configurar_transporte(args.transporte, args.latencia)
+    
+    db = SessionLocal()
+    try:
+        limpiar_datos(db)
+        subvenciones = crear_datos(db, args.usuarios, args.subvenciones)
+        print(
+            f"{args.usuarios} usuarios × {args.subvenciones} subvenciones, transporte {args.transporte}"
+            + (f" (latencia {args.latencia * 1000:.0f} ms)" if servidor else "")
+        )
+        
+        for tamano_lote in args.lotes:
+            for workers in args.conexiones:
+                resultado = medir(db, subvenciones, tamano_lote, workers)
+                if resultado["fallidos"]:
+                    print(f"✗ {resultado['fallidos']} emails fallidos")
+                    sys.exit(1)
+    finally:
+        limpiar_datos(db)
+        db.close()
+        if servidor:
+            servidor.shutdown()
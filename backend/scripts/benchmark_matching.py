@@ -0,0 +1,151 @@
+"""
+Benchmark del emparejamiento suscripciones × subvenciones
+
+Compara el bucle anidado con coincide_con_filtros frente al índice
+invertido de suscripciones y a la matriz vectorizada (NumPy), con datos
+sintéticos (incluido el filtro de área temática), y verifica que los tres
+producen exactamente los mismos pares.
+
+Con --semillas N repite la comprobación con N conjuntos aleatorios
+pequeños (prueba de propiedades) antes de medir.
+"""
+import sys
+import time
+import random
+import argparse
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tasks.sync_subvenciones import coincide_con_filtros
+from services.matching_service import IndiceSuscripciones, MapaAreas
+from services.matching_vectorizado import MatrizSuscripciones
+
+REGIONES = list(range(1, 60))
+FINALIDADES = list(range(1, 25))
+AREAS = list(range(1, 7))  # El área 6 no tiene finalidades asociadas
+
+
+def generar_mapa_areas(rng: random.Random) -> MapaAreas:
+    return MapaAreas(
+        (area_id, finalidad_id)
+        for finalidad_id in FINALIDADES
+        for area_id in rng.sample(AREAS[:-1], rng.randint(0, 2))
+    )
+
+
+def generar_suscripciones(n: int, rng: random.Random):
+    suscripciones = []
+    for i in range(n):
+        minimo = rng.choice([None, 0, Decimal(rng.randint(1, 50) * 10000)])
+        maximo = rng.choice([None, 0, Decimal(rng.randint(50, 500) * 10000)])
+        suscripciones.append(SimpleNamespace(
+            id=i,
+            regiones=rng.sample(REGIONES, rng.randint(1, 3)) if rng.random() < 0.8 else rng.choice([None, []]),
+            areas_tematicas=rng.sample(AREAS, rng.randint(1, 2)) if rng.random() < 0.4 else None,
+            presupuesto_min=minimo,
+            presupuesto_max=maximo,
+            tipos_beneficiario=None,
+        ))
+    return suscripciones
+
+
+def generar_subvenciones(n: int, rng: random.Random):
+    return [
+        SimpleNamespace(
+            id=i,
+            region_id=rng.choice(REGIONES + [None]),
+            finalidad_id=rng.choice(FINALIDADES + [None]),
+            presupuesto_total=rng.choice([
+                None,
+                Decimal(rng.randint(0, 600) * 10000),
+                Decimal(rng.randint(0, 6000000)) / 100
+            ]),
+        )
+        for i in range(n)
+    ]
+
+
+def pares_bucle(suscripciones, subvenciones, mapa_areas):
+    return {
+        (sub.id, susc.id)
+        for susc in suscripciones
+        for sub in subvenciones
+        if coincide_con_filtros(sub, susc, mapa_areas)
+    }
+
+
+def pares_indice(suscripciones, subvenciones, mapa_areas):
+    indice = IndiceSuscripciones(suscripciones, mapa_areas)
+    return {
+        (sub.id, susc.id)
+        for sub in subvenciones
+        for susc in indice.coincidentes(sub)
+    }
+
+
+def pares_vectorizado(suscripciones, subvenciones, mapa_areas):
+    matriz = MatrizSuscripciones(suscripciones, mapa_areas)
+    return {
+        (sub.id, susc.id)
+        for sub, coincidentes in matriz.emparejar(subvenciones)
+        for susc in coincidentes
+    }
+
+
+def comprobar_propiedad(semillas: int) -> bool:
+    """Los tres métodos dan los mismos pares en conjuntos aleatorios pequeños"""
+    for semilla in range(semillas):
+        rng = random.Random(semilla)
+        suscripciones = generar_suscripciones(rng.randint(0, 80), rng)
+        subvenciones = generar_subvenciones(rng.randint(0, 40), rng)
+        mapa_areas = generar_mapa_areas(rng) if rng.random() < 0.8 else MapaAreas()
+
+        esperado = pares_bucle(suscripciones, subvenciones, mapa_areas)
+        if pares_indice(suscripciones, subvenciones, mapa_areas) != esperado:
+            print(f"✗ Semilla {semilla}: el índice invertido difiere")
+            return False
+        if pares_vectorizado(suscripciones, subvenciones, mapa_areas) != esperado:
+            print(f"✗ Semilla {semilla}: la matriz vectorizada difiere")
+            return False
+
+    print(f"✓ {semillas} conjuntos aleatorios: mismos pares en los tres métodos")
+    return True
+
+
+def medir(nombre, funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    duracion = time.perf_counter() - inicio
+    print(f"  {nombre:<18} {duracion * 1000:9.1f} ms  ({len(resultado)} pares)")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de emparejamiento de suscripciones")
+    parser.add_argument("--suscripciones", type=int, default=5000)
+    parser.add_argument("--subvenciones", type=int, default=500)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--semillas", type=int, default=200, help="Conjuntos aleatorios de la prueba de propiedades")
+    args = parser.parse_args()
+
+    if args.semillas and not comprobar_propiedad(args.semillas):
+        sys.exit(1)
+
+    rng = random.Random(args.semilla)
+    suscripciones = generar_suscripciones(args.suscripciones, rng)
+    subvenciones = generar_subvenciones(args.subvenciones, rng)
+    mapa_areas = generar_mapa_areas(rng)
+
+    print(f"{args.suscripciones} suscripciones × {args.subvenciones} subvenciones")
+    esperado = medir("bucle anidado", pares_bucle, suscripciones, subvenciones, mapa_areas)
+    indice = medir("índice invertido", pares_indice, suscripciones, subvenciones, mapa_areas)
+    vectorizado = medir("matriz NumPy", pares_vectorizado, suscripciones, subvenciones, mapa_areas)
+
+    for nombre, obtenido in (("índice invertido", indice), ("matriz NumPy", vectorizado)):
+        if esperado != obtenido:
+            print(f"✗ {nombre}: {len(esperado ^ obtenido)} pares difieren")
+            sys.exit(1)
+    print("✓ Mismos pares en los tres métodos")
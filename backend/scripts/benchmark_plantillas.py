@@ -0,0 +1,94 @@
+"""
+Benchmark del renderizado de emails para un envío masivo
+
+Compara el enfoque anterior (compilar la plantilla completa con
+jinja2.Template para cada destinatario) frente al entorno Jinja
+precompilado con el bloque de la subvención renderizado una sola vez,
+y verifica que ambos producen el mismo HTML.
+"""
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from jinja2 import Template
+from services.email_service import DIRECTORIO_PLANTILLAS, EmailService
+
+CALENDAR_URL = "https://calendar.google.com/calendar/embed?src=benchmark"
+
+SUBVENCION = {
+    "titulo": "Ayudas para proyectos de investigación e innovación",
+    "descripcion": "Convocatoria de ayudas para proyectos de I+D en centros públicos de investigación.",
+    "organo_convocante": "CONSEJERÍA DE UNIVERSIDADES, CIENCIA E INNOVACIÓN",
+    "region_nombre": "CANARIAS",
+    "presupuesto_total": Decimal("1250000.00"),
+    "fecha_fin_solicitud": datetime.now() + timedelta(days=30),
+    "url_bdns": "https://www.infosubvenciones.es/bdnstrans/GE/es/convocatorias/123456"
+}
+
+
+def destinatarios(n: int):
+    return [(f"usuario{i}@example.com", f"Usuario {i}", f"{CALENDAR_URL}?unsubscribe={i}") for i in range(n)]
+
+
+def render_sin_cache(usuarios):
+    """Una plantilla completa compilada por destinatario (comportamiento anterior)"""
+    fuente = (DIRECTORIO_PLANTILLAS / "nueva_subvencion.html").read_text(encoding="utf-8").replace(
+        "{{ bloque_subvencion }}",
+        (DIRECTORIO_PLANTILLAS / "subvencion.html").read_text(encoding="utf-8").rstrip("\n")
+    )
+    return [
+        Template(fuente).render(
+            nombre_usuario=nombre,
+            subvencion=SUBVENCION,
+            calendar_url=CALENDAR_URL,
+            unsubscribe_url=baja
+        )
+        for _, nombre, baja in usuarios
+    ]
+
+
+def render_con_fragmento(usuarios):
+    """Entorno precompilado y bloque de la subvención compartido"""
+    email_service = EmailService()
+    fragmento = email_service.render_fragmento_subvencion(SUBVENCION, CALENDAR_URL)
+    return [
+        email_service.build_nueva_subvencion(
+            to_email=email,
+            nombre_usuario=nombre,
+            subvencion=SUBVENCION,
+            calendar_url=CALENDAR_URL,
+            unsubscribe_url=baja,
+            fragmento=fragmento
+        ).html_content
+        for email, nombre, baja in usuarios
+    ]
+
+
+def medir(nombre, funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    duracion = time.perf_counter() - inicio
+    print(f"  {nombre:<24} {duracion * 1000:9.1f} ms  ({duracion / len(resultado) * 1e6:7.1f} µs/email)")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de renderizado de emails")
+    parser.add_argument("--destinatarios", type=int, default=1000)
+    args = parser.parse_args()
+
+    usuarios = destinatarios(args.destinatarios)
+
+    print(f"{args.destinatarios} destinatarios de una subvención")
+    esperado = medir("Template por email", render_sin_cache, usuarios)
+    obtenido = medir("entorno + fragmento", render_con_fragmento, usuarios)
+
+    if esperado != obtenido:
+        print("✗ El HTML generado difiere entre ambos métodos")
+        sys.exit(1)
+    print("✓ Mismo HTML en ambos métodos")
@@ -0,0 +1,143 @@
+"""
+Benchmark de memoria de la sincronización con BDNS
+
+Sincroniza contra un BDNS sintético (listado paginado y detalles con un
+JSON de tamaño configurable, con latencia simulada) y mide el pico de RSS
+de la ejecución (utils.memoria.MedidorRSS) de cada modo para cada número
+de páginas de --paginas.
+
+Cada medición se hace en un subproceso nuevo para que una ejecución no
+herede la memoria que dejó la anterior. En modo "paginas" el pico debe
+quedar plano aunque crezca el número de páginas.
+
+Las subvenciones sintéticas (id_bdns "bsync-*") se borran al terminar.
+Necesita la base de datos configurada en DATABASE_URL.
+"""
+import sys
+import json
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database import SessionLocal
+from models.subvencion import Subvencion
+from services.bdns_service import BDNSService
+
+PREFIJO = "bsync-"
+
+
+class BDNSSintetico(BDNSService):
+    """BDNS en memoria: genera las páginas y los detalles bajo demanda"""
+
+    def __init__(self, paginas: int, kb_detalle: int, latencia: float):
+        super().__init__()
+        self.total = paginas * 100
+        self.relleno = "x" * (kb_detalle * 1024)
+        self.latencia = latencia
+
+    async def get_convocatorias(self, page: int = 0, page_size: int = 50, **filtros):
+        await asyncio.sleep(self.latencia)
+        inicio = page * page_size
+        return {
+            "convocatorias": [
+                {
+                    "numeroConvocatoria": f"{PREFIJO}{i}",
+                    "descripcion": f"Convocatoria sintética de I+D {i}",
+                    "finalidad": {"id": 17, "nombre": "Investigación"},
+                }
+                for i in range(inicio, min(self.total, inicio + page_size))
+            ],
+            "totalElementos": self.total,
+        }
+
+    async def get_convocatoria_detalle(self, id_bdns: str):
+        await asyncio.sleep(self.latencia)
+        return {
+            "descripcion": f"Detalle de {id_bdns}",
+            "fechaFinSolicitud": "2026-12-31",
+            "organo": {"nivel1": "CANARIAS", "nivel2": "CONSEJERÍA DE CIENCIA E INNOVACIÓN"},
+            "regiones": [{"descripcion": "ES70 - CANARIAS"}],
+            # Carga del JSON que no se guarda (documentos, textos largos...)
+            "documentos": [{"nombre": "anexo.pdf", "contenido": self.relleno}],
+        }
+
+
+def limpiar():
+    db = SessionLocal()
+    try:
+        borradas = db.query(Subvencion).filter(Subvencion.id_bdns.like(f"{PREFIJO}%")).delete(synchronize_session=False)
+        db.commit()
+        return borradas
+    finally:
+        db.close()
+
+
+def medir(modo: str, paginas: int, args) -> dict:
+    """Una sincronización en este proceso (se invoca desde un subproceso)"""
+    from tasks.sync_pipeline import PipelineSync
+    from tasks.sync_subvenciones import sincronizar_por_paginas
+
+    bdns = BDNSSintetico(paginas, args.kb_detalle, args.latencia)
+    limpiar()
+
+    if modo == "paginas":
+        db = SessionLocal()
+        try:
+            resumen = asyncio.run(sincronizar_por_paginas(db, bdns, notificar=args.notificar))
+        finally:
+            db.close()
+        resultado = {"guardadas": resumen.guardadas, "segundos": resumen.segundos,
+                     "rss_inicio_mb": resumen.rss_inicio_mb, "rss_pico_mb": resumen.rss_pico_mb}
+    else:
+        pipeline = asyncio.run(PipelineSync(bdns, notificar=args.notificar).ejecutar())
+        resultado = {"guardadas": len(pipeline.guardadas), "segundos": pipeline.segundos,
+                     "rss_inicio_mb": pipeline.rss_inicio_mb, "rss_pico_mb": pipeline.rss_pico_mb}
+
+    limpiar()
+    return resultado
+
+
+def _lista(valor: str, tipo=str):
+    return [tipo(v) for v in valor.split(",") if v]
+
+
+def main(args):
+    print(f"Detalle de ~{args.kb_detalle} KB por convocatoria, latencia {args.latencia * 1000:.0f} ms\n")
+    print(f"{'modo':<10} {'páginas':>8} {'guardadas':>10} {'seg':>8} {'RSS inicio':>11} {'RSS pico':>9} {'aumento':>8}")
+
+    for modo in args.modos:
+        for paginas in args.paginas:
+            comando = [
+                sys.executable, __file__, "--una", modo, "--paginas", str(paginas),
+                "--kb-detalle", str(args.kb_detalle), "--latencia", str(args.latencia),
+            ]
+            if args.notificar:
+                comando.append("--notificar")
+            salida = subprocess.run(comando, capture_output=True, text=True, check=True).stdout
+            r = json.loads(salida.strip().splitlines()[-1])
+            print(
+                f"{modo:<10} {paginas:>8} {r['guardadas']:>10} {r['segundos']:>8.2f} "
+                f"{r['rss_inicio_mb']:>9.1f}MB {r['rss_pico_mb']:>7.1f}MB "
+                f"{r['rss_pico_mb'] - r['rss_inicio_mb']:>6.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de memoria de la sincronización con BDNS")
+    parser.add_argument("--paginas", type=lambda v: _lista(v, int), default=[2, 8, 32], help="Páginas de 100, separadas por comas")
+    parser.add_argument("--modos", type=_lista, default=["paginas", "pipeline"], help="paginas y/o pipeline")
+    parser.add_argument("--kb-detalle", type=int, default=64, help="Tamaño aproximado del JSON de cada detalle")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos por petición a BDNS")
+    parser.add_argument("--notificar", action="store_true", help="Emparejar y encolar emails (por defecto no)")
+    parser.add_argument("--una", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.una:
+        from loguru import logger
+        logger.remove()
+        print(json.dumps(medir(args.una, args.paginas[0], args)))
+    else:
+        main(args)
@@ -0,0 +1,73 @@
+"""
+Script para exportar subvenciones a CSV, NDJSON o Parquet
+"""
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database import SessionLocal
+from models.subvencion import Subvencion
+from services import export_service, organo_service
+from services.filtros_subvenciones import aplicar_filtros
+from loguru import logger
+
+
+def exportar_subvenciones(salida: str, formato: str, **filtros):
+    """Exportar subvenciones filtradas a un fichero (memoria constante)"""
+    db = SessionLocal()
+
+    try:
+        organo_id = filtros.pop("organo_id", None)
+        if organo_id:
+            filtros["organo_ids"] = organo_service.ids_descendientes(db, organo_id)
+
+        query = aplicar_filtros(db.query(Subvencion), **filtros).order_by(
+            Subvencion.fecha_fin_solicitud.asc(),
+            Subvencion.id.asc()
+        )
+
+        total_bytes = 0
+        with open(salida, "wb") as f:
+            for bloque in export_service.exportar(query, formato):
+                f.write(bloque)
+                total_bytes += len(bloque)
+
+        logger.success(f"✓ Exportación completada: {salida} ({total_bytes / 1024:.1f} KB)")
+
+    except Exception as e:
+        logger.error(f"Error al exportar subvenciones: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exportar subvenciones")
+    parser.add_argument("salida", help="Fichero de salida")
+    parser.add_argument("--formato", choices=list(export_service.FORMATOS_EXPORTACION), default="csv")
+    parser.add_argument("--todas", action="store_true", help="Incluir convocatorias cerradas")
+    parser.add_argument("--organo")
+    parser.add_argument("--organo-id", type=int, help="Nodo del árbol de órganos (incluye descendientes)")
+    parser.add_argument("--tipo-convocatoria")
+    parser.add_argument("--instrumento")
+    parser.add_argument("--sector")
+    parser.add_argument("--finalidad")
+    parser.add_argument("--presupuesto-min", type=float)
+    parser.add_argument("--keywords")
+    args = parser.parse_args()
+
+    exportar_subvenciones(
+        args.salida,
+        args.formato,
+        activa=not args.todas,
+        organo=args.organo,
+        organo_id=args.organo_id,
+        tipo_convocatoria=args.tipo_convocatoria,
+        instrumento=args.instrumento,
+        sector=args.sector,
+        finalidad=args.finalidad,
+        presupuesto_min=args.presupuesto_min,
+        keywords=args.keywords
+    )
@@ -10,6 +10,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from database import SessionLocal
 from models.catalogo import Region, Finalidad, AreaTematica
 from services.bdns_service import BDNSService
+from services import catalogo_service
 from loguru import logger
 
 
@@ -90,6 +91,9 @@ async def populate_catalogs():
         db.commit()
         logger.success(f"✓ {len(areas)} áreas temáticas creadas")
         
+        # 4. Mapeo finalidad -> área temática para los filtros de suscripción
+        catalogo_service.sincronizar_areas_finalidades(db)
+        
         logger.success("✓ Catálogos poblados exitosamente")
         
     except Exception as e:
@@ -0,0 +1,125 @@
+"""
+Servidor SMTP local de pruebas
+
+Sustituto mínimo de un proveedor SMTP (sin TLS ni autenticación) para
+medir el envío sin mandar emails reales. Acepta todos los mensajes, los
+cuenta y opcionalmente los guarda en un directorio Maildir. Con --latencia
+simula el tiempo de respuesta del proveedor por mensaje.
+
+Uso con el backend:
+    python scripts/servidor_smtp_local.py --puerto 2525
+    SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_STARTTLS=false SMTP_USER= ...
+"""
+import sys
+import time
+import mailbox
+import argparse
+import threading
+import socketserver
+from pathlib import Path
+from typing import Optional
+
+
+class ManejadorSMTP(socketserver.StreamRequestHandler):
+    """Sesión SMTP: HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP y QUIT"""
+    
+    def _responder(self, linea: str):
+        self.wfile.write(f"{linea}\r\n".encode("ascii"))
+    
+    def _leer_datos(self) -> bytes:
+        lineas = []
+        while True:
+            linea = self.rfile.readline()
+            if not linea or linea in (b".\r\n", b".\n"):
+                break
+            if linea.startswith(b".."):
+                linea = linea[1:]
+            lineas.append(linea)
+        return b"".join(lineas)
+    
+    def handle(self):
+        servidor: ServidorSMTPLocal = self.server
+        self._responder("220 localhost SMTP local de pruebas")
+        
+        while True:
+            linea = self.rfile.readline()
+            if not linea:
+                break
+            verbo = linea.decode("utf-8", "replace").strip()[:4].upper()
+            
+            if verbo == "EHLO":
+                self._responder("250-localhost")
+                self._responder("250-8BITMIME")
+                self._responder("250 SIZE 52428800")
+            elif verbo == "HELO":
+                self._responder("250 localhost")
+            elif verbo in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self._responder("250 OK")
+            elif verbo == "DATA":
+                self._responder("354 Fin de datos con <CRLF>.<CRLF>")
+                servidor.recibir(self._leer_datos())
+                self._responder("250 OK")
+            elif verbo == "QUIT":
+                self._responder("221 Adios")
+                break
+            else:
+                self._responder("502 Comando no implementado")
+
+
+class ServidorSMTPLocal(socketserver.ThreadingTCPServer):
+    """Servidor SMTP con un hilo por conexión"""
+    
+    allow_reuse_address = True
+    daemon_threads = True
+    
+    def __init__(self, direccion, latencia: float = 0.0, maildir: Optional[str] = None):
+        super().__init__(direccion, ManejadorSMTP)
+        self.latencia = latencia
+        self.buzon = None
+        if maildir:
+            for subdirectorio in ("tmp", "new", "cur"):
+                (Path(maildir) / subdirectorio).mkdir(parents=True, exist_ok=True)
+            self.buzon = mailbox.Maildir(maildir, create=False)
+        self.recibidos = 0
+        self._lock = threading.Lock()
+    
+    def recibir(self, datos: bytes):
+        if self.latencia:
+            time.sleep(self.latencia)
+        with self._lock:
+            self.recibidos += 1
+            if self.buzon is not None:
+                self.buzon.add(datos)
+
+
+def iniciar_en_segundo_plano(host: str = "127.0.0.1", puerto: int = 0,
+                             latencia: float = 0.0, maildir: Optional[str] = None) -> ServidorSMTPLocal:
+    """
+    Arrancar el servidor en un hilo (puerto 0 = puerto libre)
+    
+    Returns:
+        Servidor en marcha (server_address tiene el puerto real)
+    """
+    servidor = ServidorSMTPLocal((host, puerto), latencia, maildir)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor SMTP local de pruebas")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=2525)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos de espera por mensaje")
+    parser.add_argument("--maildir", default=None, help="Guardar los mensajes en este Maildir")
+    args = parser.parse_args()
+
+    servidor = ServidorSMTPLocal((args.host, args.puerto), args.latencia, args.maildir)
+    print(f"📮 SMTP local escuchando en {args.host}:{args.puerto} (Ctrl+C para parar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        print(f"✓ {servidor.recibidos} mensajes recibidos")
+        sys.exit(0)
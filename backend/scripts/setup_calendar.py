@@ -6,14 +6,14 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from services.calendar_service import CalendarService
+from services.calendar_service import get_calendar_service, get_calendar_url, get_ical_url
 from loguru import logger
 
 
 def setup_calendar():
     """Crear calendario compartido para subvenciones"""
     try:
-        calendar_service = CalendarService()
+        calendar_service = get_calendar_service()
         
         # Crear calendario
         calendar_name = "Subvenciones de Investigación ULL"
@@ -30,8 +30,8 @@ def setup_calendar():
         
         logger.success(f"✓ Calendario creado exitosamente")
         logger.info(f"  ID del calendario: {calendar_id}")
-        logger.info(f"  URL pública: {calendar_service.get_calendar_url()}")
-        logger.info(f"  URL iCal: {calendar_service.get_ical_url()}")
+        logger.info(f"  URL pública: {get_calendar_url(calendar_id)}")
+        logger.info(f"  URL iCal: {get_ical_url(calendar_id)}")
         logger.info("")
         logger.info("Añade este ID al archivo .env:")
         logger.info(f"  CALENDAR_ID={calendar_id}")
@@ -0,0 +1,216 @@
+"""
+Servicio de autocompletado con índice de prefijos en memoria
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from sqlalchemy import distinct, func
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models.organo import Organo
+from models.subvencion import Subvencion
+from utils.texto import normalizar_texto
+
+TIPOS_SUGERENCIA = ("organo", "titulo", "finalidad")
+
+# Longitud máxima de cada clave indexada (las consultas más largas se recortan)
+LONGITUD_CLAVE = 60
+
+# Segundos entre comprobaciones de versión de los datos
+INTERVALO_COMPROBACION = 60
+
+
+class IndicePrefijos:
+    """
+    Índice de prefijos sin tildes ni mayúsculas.
+
+    Cada texto se indexa por cada palabra en la que empieza, de modo que
+    "investig" encuentra "Ayudas a la INVESTIGACIÓN". Las claves se guardan
+    en una lista ordenada y la búsqueda es un bisect más un recorrido
+    acotado por el número de resultados pedido.
+    """
+
+    def __init__(self, entradas: Iterable[Tuple[str, Optional[int]]]):
+        self.sugerencias: List[Tuple[str, Optional[int]]] = []
+        claves: List[Tuple[str, int]] = []
+        vistas = set()
+
+        for texto, ref_id in entradas:
+            if not texto or (texto, ref_id) in vistas:
+                continue
+            vistas.add((texto, ref_id))
+            indice = len(self.sugerencias)
+            self.sugerencias.append((texto, ref_id))
+
+            normalizado = normalizar_texto(texto)
+            inicio = 0
+            for palabra in normalizado.split(" "):
+                claves.append((normalizado[inicio:inicio + LONGITUD_CLAVE], indice))
+                inicio += len(palabra) + 1
+
+        claves.sort()
+        self._claves = [c for c, _ in claves]
+        self._indices = [i for _, i in claves]
+
+    def __len__(self) -> int:
+        return len(self.sugerencias)
+
+    def buscar(self, prefijo: str, limite: int) -> List[Tuple[str, Optional[int]]]:
+        """
+        Buscar textos con alguna palabra que empiece por el prefijo
+
+        Args:
+            prefijo: Texto ya normalizado
+            limite: Número máximo de resultados
+
+        Returns:
+            Lista de (texto, id de referencia)
+        """
+        prefijo = prefijo[:LONGITUD_CLAVE]
+        resultados = []
+        vistos = set()
+        i = bisect_left(self._claves, prefijo)
+
+        while i < len(self._claves) and len(resultados) < limite:
+            if not self._claves[i].startswith(prefijo):
+                break
+            indice = self._indices[i]
+            if indice not in vistos:
+                vistos.add(indice)
+                resultados.append(self.sugerencias[indice])
+            i += 1
+
+        return resultados
+
+
+_indices: Dict[str, IndicePrefijos] = {}
+_version = None
+_ultima_comprobacion = float("-inf")
+_refrescando = False
+# _lock protege el intercambio del índice; _lock_reconstruccion evita dos
+# reconstrucciones a la vez (la del sync y la de fondo)
+_lock = threading.Lock()
+_lock_reconstruccion = threading.Lock()
+
+
+def _version_datos(db: Session):
+    return tuple(db.query(func.max(Subvencion.updated_at), func.count(Subvencion.id)).one())
+
+
+def reconstruir_indice(db: Session):
+    """
+    Construir los índices de autocompletado desde la BD (tras cada sincronización)
+    
+    El índice nuevo se construye aparte y se intercambia bajo _lock: las
+    búsquedas siguen usando el anterior mientras tanto.
+    """
+    global _indices, _version, _ultima_comprobacion
+
+    with _lock_reconstruccion:
+        inicio = time.perf_counter()
+        version = _version_datos(db)
+
+        organos = db.query(Organo.nombre, Organo.id).all()
+        titulos = db.query(Subvencion.titulo, Subvencion.id).filter(Subvencion.activa == True).all()
+        finalidades = db.query(distinct(Subvencion.finalidad_nombre)).filter(
+            Subvencion.finalidad_nombre != None,
+            Subvencion.finalidad_nombre != ''
+        ).all()
+
+        indices = {
+            "organo": IndicePrefijos((nombre, organo_id) for nombre, organo_id in organos),
+            "titulo": IndicePrefijos((titulo, subvencion_id) for titulo, subvencion_id in titulos),
+            "finalidad": IndicePrefijos((f[0], None) for f in finalidades),
+        }
+
+        with _lock:
+            _indices = indices
+            _version = version
+            _ultima_comprobacion = time.monotonic()
+
+    logger.info(
+        f"✓ Índice de autocompletado reconstruido "
+        f"({', '.join(f'{t}: {len(i)}' for t, i in indices.items())}) "
+        f"en {(time.perf_counter() - inicio) * 1000:.0f} ms"
+    )
+
+
+def _refrescar():
+    """Reconstruir el índice si no existe o si otra réplica ha sincronizado datos nuevos"""
+    global _refrescando
+
+    db = SessionLocal()
+    try:
+        if not _indices or _version_datos(db) != _version:
+            reconstruir_indice(db)
+    except Exception as e:
+        logger.error(f"Error al reconstruir el índice de autocompletado: {e}")
+    finally:
+        db.close()
+        with _lock:
+            _refrescando = False
+
+
+def refrescar_en_segundo_plano() -> bool:
+    """
+    Comprobar la versión de los datos (y reconstruir) en un hilo de fondo
+    
+    Returns:
+        False si ya hay una comprobación en marcha
+    """
+    global _refrescando, _ultima_comprobacion
+
+    with _lock:
+        if _refrescando:
+            return False
+        _refrescando = True
+        _ultima_comprobacion = time.monotonic()
+
+    threading.Thread(target=_refrescar, name="autocompletar-indice", daemon=True).start()
+    return True
+
+
+def autocompletar(
+    texto: str,
+    tipo: Optional[str] = None,
+    limite: int = 10
+) -> List[Dict[str, Any]]:
+    """
+    Obtener sugerencias de autocompletado
+
+    No accede a la BD: cada INTERVALO_COMPROBACION segundos lanza la
+    comprobación de versión en segundo plano y, mientras tanto, responde
+    con el índice actual (vacío hasta la primera construcción).
+
+    Args:
+        texto: Texto escrito por el usuario
+        tipo: organo, titulo o finalidad (None = todos)
+        limite: Número máximo de sugerencias
+
+    Returns:
+        Lista de sugerencias {tipo, texto, id}
+    """
+    if time.monotonic() - _ultima_comprobacion >= INTERVALO_COMPROBACION:
+        refrescar_en_segundo_plano()
+
+    prefijo = normalizar_texto(texto)
+    if not prefijo:
+        return []
+
+    indices = _indices
+    tipos = [tipo] if tipo else list(TIPOS_SUGERENCIA)
+    sugerencias = []
+
+    for t in tipos:
+        restantes = limite - len(sugerencias)
+        if restantes <= 0:
+            break
+        indice = indices.get(t)
+        if indice is None:
+            continue
+        for texto_sugerencia, ref_id in indice.buscar(prefijo, restantes):
+            sugerencias.append({"tipo": t, "texto": texto_sugerencia, "id": ref_id})
+
+    return sugerencias
@@ -0,0 +1,70 @@
+"""
+Cache en memoria de valores derivados de la base de datos
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class CacheVersionada:
+    """
+    Cache en memoria invalidada por versión.
+
+    Cada entrada guarda la versión de los datos con la que se calculó
+    (por ejemplo, la fecha de última modificación de la tabla). Si la
+    versión actual coincide se devuelve el valor cacheado; si no, se
+    recalcula. Así todas las réplicas ven los cambios de la última
+    sincronización sin coordinarse entre sí.
+    """
+
+    def __init__(self, max_entradas: int = 128):
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: Hashable, version: Any, construir: Callable[[], Any]) -> Any:
+        """
+        Obtener un valor cacheado o calcularlo
+
+        Args:
+            clave: Clave de la entrada
+            version: Versión actual de los datos
+            construir: Función que calcula el valor si no está en cache
+
+        Returns:
+            Valor cacheado o recién calculado
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == version:
+                self._entradas.move_to_end(clave)
+                return entrada[1]
+
+        valor = construir()
+        self.guardar(clave, version, valor)
+        return valor
+
+    def consultar(self, clave: Hashable, version: Any) -> Any:
+        """Obtener un valor cacheado sin calcularlo (None si no existe o caducó)"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == version:
+                self._entradas.move_to_end(clave)
+                return entrada[1]
+        return None
+
+    def guardar(self, clave: Hashable, version: Any, valor: Any):
+        """Guardar un valor en cache"""
+        with self._lock:
+            self._entradas[clave] = (version, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, clave: Hashable = None):
+        """Invalidar una entrada o toda la cache"""
+        with self._lock:
+            if clave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(clave, None)
@@ -0,0 +1,245 @@
+"""
+Sustituto en memoria de la API de Google Calendar (pruebas y benchmarks)
+
+Imita el recurso que devuelve googleapiclient.discovery.build para las
+llamadas que usa CalendarService: events (insert, get, update, patch,
+delete), calendars.insert, acl.insert y new_batch_http_request. Simula la
+latencia de red por petición HTTP y errores de cuota, que se devuelven
+como HttpError igual que la API real.
+
+Uso:
+    CalendarService(service=CalendarLocal(latencia=0.05, tasa_errores_cuota=0.02))
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+import httplib2
+from googleapiclient.errors import HttpError
+
+# Límite de peticiones por batch de Calendar
+MAX_PETICIONES_POR_LOTE = 50
+
+
+def _error(estado: int, motivo: str, mensaje: str) -> HttpError:
+    contenido = json.dumps({
+        "error": {"code": estado, "message": mensaje, "errors": [{"reason": motivo, "message": mensaje}]}
+    }).encode("utf-8")
+    return HttpError(httplib2.Response({"status": estado}), contenido)
+
+
+class _Peticion:
+    """Petición sin ejecutar (equivalente a googleapiclient.http.HttpRequest)"""
+    
+    def __init__(self, api: "CalendarLocal", metodo: str, operacion: Callable[[], Any]):
+        self.api = api
+        self.metodo = metodo
+        self.operacion = operacion
+    
+    def execute(self):
+        self.api._viaje()
+        return self.api._ejecutar(self)
+
+
+class _Lote:
+    """Petición batch (equivalente a googleapiclient.http.BatchHttpRequest)"""
+    
+    def __init__(self, api: "CalendarLocal", callback: Optional[Callable] = None):
+        self.api = api
+        self.callback = callback
+        self._peticiones: List[tuple] = []
+    
+    def add(self, request: _Peticion, callback: Optional[Callable] = None, request_id: Optional[str] = None):
+        if len(self._peticiones) >= MAX_PETICIONES_POR_LOTE:
+            raise ValueError(f"Un batch admite como máximo {MAX_PETICIONES_POR_LOTE} peticiones")
+        request_id = request_id if request_id is not None else str(len(self._peticiones) + 1)
+        self._peticiones.append((request_id, request, callback))
+    
+    def execute(self):
+        # Una sola petición HTTP para todo el lote
+        self.api._viaje()
+        for request_id, peticion, callback in self._peticiones:
+            respuesta, excepcion = None, None
+            try:
+                respuesta = self.api._ejecutar(peticion)
+            except HttpError as e:
+                excepcion = e
+            for funcion in (callback, self.callback):
+                if funcion is not None:
+                    funcion(request_id, respuesta, excepcion)
+
+
+class _Eventos:
+    def __init__(self, api: "CalendarLocal"):
+        self.api = api
+    
+    def insert(self, calendarId: str, body: Dict[str, Any]):
+        return _Peticion(self.api, "events.insert", lambda: self.api._insertar(calendarId, body))
+    
+    def get(self, calendarId: str, eventId: str):
+        return _Peticion(self.api, "events.get", lambda: dict(self.api._evento(calendarId, eventId)))
+    
+    def update(self, calendarId: str, eventId: str, body: Dict[str, Any]):
+        return _Peticion(self.api, "events.update", lambda: self.api._modificar(calendarId, eventId, body, True))
+    
+    def patch(self, calendarId: str, eventId: str, body: Dict[str, Any]):
+        return _Peticion(self.api, "events.patch", lambda: self.api._modificar(calendarId, eventId, body, False))
+    
+    def delete(self, calendarId: str, eventId: str):
+        return _Peticion(self.api, "events.delete", lambda: self.api._borrar(calendarId, eventId))
+
+
+class _Calendarios:
+    def __init__(self, api: "CalendarLocal"):
+        self.api = api
+    
+    def insert(self, body: Dict[str, Any]):
+        return _Peticion(self.api, "calendars.insert", lambda: self.api._crear_calendario(body))
+
+
+class _Acl:
+    def __init__(self, api: "CalendarLocal"):
+        self.api = api
+    
+    def insert(self, calendarId: str, body: Dict[str, Any]):
+        return _Peticion(self.api, "acl.insert", lambda: self.api._insertar_regla(calendarId, body))
+
+
+class CalendarLocal:
+    """
+    API de Calendar en memoria y segura entre hilos
+    
+    Args:
+        latencia: Segundos de cada petición HTTP (un batch cuenta como una)
+        latencia_por_operacion: Segundos adicionales por operación ejecutada
+        tasa_errores_cuota: Probabilidad de que una operación falle con 403 rateLimitExceeded
+        max_por_segundo: Operaciones por segundo admitidas; el exceso falla con 403 (0 = sin límite)
+        semilla: Semilla de los errores aleatorios (reproducibles)
+    """
+    
+    def __init__(
+        self,
+        latencia: float = 0.0,
+        latencia_por_operacion: float = 0.0,
+        tasa_errores_cuota: float = 0.0,
+        max_por_segundo: float = 0.0,
+        semilla: Optional[int] = None
+    ):
+        self.latencia = latencia
+        self.latencia_por_operacion = latencia_por_operacion
+        self.tasa_errores_cuota = tasa_errores_cuota
+        self.max_por_segundo = max_por_segundo
+        
+        self.calendarios: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.reglas: Dict[str, List[Dict[str, Any]]] = {}
+        self.borrados: set = set()
+        self.peticiones_http = 0
+        self.operaciones: Counter = Counter()
+        self.errores_cuota = 0
+        
+        self._aleatorio = random.Random(semilla)
+        self._lock = threading.Lock()
+        self._ventana = (0, 0)  # (segundo, operaciones en ese segundo)
+    
+    # Interfaz de googleapiclient
+    
+    def events(self) -> _Eventos:
+        return _Eventos(self)
+    
+    def calendars(self) -> _Calendarios:
+        return _Calendarios(self)
+    
+    def acl(self) -> _Acl:
+        return _Acl(self)
+    
+    def new_batch_http_request(self, callback: Optional[Callable] = None) -> _Lote:
+        return _Lote(self, callback)
+    
+    # Consulta del estado (pruebas)
+    
+    def eventos(self, calendar_id: str) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self.calendarios.get(calendar_id, {}))
+    
+    # Simulación
+    
+    def _viaje(self):
+        with self._lock:
+            self.peticiones_http += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+    
+    def _cuota_superada(self) -> bool:
+        if self.tasa_errores_cuota and self._aleatorio.random() < self.tasa_errores_cuota:
+            return True
+        if self.max_por_segundo > 0:
+            segundo = int(time.monotonic())
+            actual, usadas = self._ventana
+            usadas = usadas + 1 if actual == segundo else 1
+            self._ventana = (segundo, usadas)
+            return usadas > self.max_por_segundo
+        return False
+    
+    def _ejecutar(self, peticion: _Peticion):
+        if self.latencia_por_operacion:
+            time.sleep(self.latencia_por_operacion)
+        with self._lock:
+            self.operaciones[peticion.metodo] += 1
+            if self._cuota_superada():
+                self.errores_cuota += 1
+                raise _error(403, "rateLimitExceeded", "Rate Limit Exceeded")
+            return peticion.operacion()
+    
+    def _eventos_de(self, calendar_id: str) -> Dict[str, Dict[str, Any]]:
+        return self.calendarios.setdefault(calendar_id, {})
+    
+    def _evento(self, calendar_id: str, event_id: str) -> Dict[str, Any]:
+        evento = self._eventos_de(calendar_id).get(event_id)
+        if evento is None:
+            if (calendar_id, event_id) in self.borrados:
+                raise _error(410, "deleted", "Resource has been deleted")
+            raise _error(404, "notFound", "Not Found")
+        return evento
+    
+    def _insertar(self, calendar_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        if not body or "start" not in body or "end" not in body:
+            raise _error(400, "required", "Missing start or end time")
+        # Como en Google, el cliente puede fijar el id; si ya existe (o se borró) es un 409
+        event_id = body.get("id") or uuid.uuid4().hex
+        if event_id in self._eventos_de(calendar_id) or (calendar_id, event_id) in self.borrados:
+            raise _error(409, "duplicate", "The requested identifier already exists.")
+        evento = dict(body, id=event_id, status="confirmed")
+        self._eventos_de(calendar_id)[evento["id"]] = evento
+        return dict(evento)
+    
+    def _modificar(self, calendar_id: str, event_id: str, body: Dict[str, Any], completo: bool) -> Dict[str, Any]:
+        if completo and (calendar_id, event_id) in self.borrados:
+            # Un update sobre un evento cancelado lo restaura
+            self.borrados.discard((calendar_id, event_id))
+            self._eventos_de(calendar_id)[event_id] = {}
+        actual = self._evento(calendar_id, event_id)
+        evento = dict(body) if completo else dict(actual, **body)
+        evento.update(id=event_id, status="confirmed")
+        self._eventos_de(calendar_id)[event_id] = evento
+        return dict(evento)
+    
+    def _borrar(self, calendar_id: str, event_id: str) -> str:
+        self._evento(calendar_id, event_id)
+        del self._eventos_de(calendar_id)[event_id]
+        self.borrados.add((calendar_id, event_id))
+        return ""
+    
+    def _crear_calendario(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        calendar_id = f"{uuid.uuid4().hex}@group.calendar.google.com"
+        self.calendarios[calendar_id] = {}
+        return dict(body, id=calendar_id)
+    
+    def _insertar_regla(self, calendar_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        if calendar_id not in self.calendarios:
+            raise _error(404, "notFound", "Not Found")
+        regla = dict(body, id=f"{body['scope']['type']}:{body['scope'].get('value', '')}")
+        self.reglas.setdefault(calendar_id, []).append(regla)
+        return regla
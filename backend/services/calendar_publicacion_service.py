@@ -0,0 +1,337 @@
+"""
+Servicio de publicación en Google Calendar (cola propia y reconciliación idempotente)
+"""
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from config import get_settings
+from database import SessionLocal
+from models.subvencion import Subvencion
+from services.calendar_service import (
+    CalendarService,
+    OperacionCalendar,
+    evento_subvencion,
+    get_calendar_service,
+    id_evento,
+)
+from tasks.leader import sigue_siendo_lider
+
+settings = get_settings()
+
+# Subvenciones revisadas por página (y operaciones enviadas a Calendar por confirmación)
+TAMANO_PAGINA = 500
+
+# Tiempo que un worker retiene las subvenciones reclamadas; si muere, otro las retoma al expirar
+DURACION_RESERVA = timedelta(minutes=10)
+
+# Espera máxima entre reintentos
+BACKOFF_MAXIMO = timedelta(hours=6)
+
+
+def hash_evento(evento: Dict[str, Any]) -> str:
+    """Hash estable del cuerpo de un evento"""
+    contenido = json.dumps(evento, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def debe_publicarse(subvencion: Subvencion) -> bool:
+    """Solo las convocatorias activas con fecha de cierre tienen evento"""
+    return bool(subvencion.activa and subvencion.fecha_fin_solicitud)
+
+
+def operacion_pendiente(subvencion: Subvencion) -> Optional[OperacionCalendar]:
+    """
+    Operación necesaria para que Calendar refleje la subvención (None = al día)
+    
+    - Sin evento y publicable: insert con ID determinista (idempotente)
+    - Con evento y publicable, si el hash del evento renderizado cambió: patch
+    - Con evento y ya no publicable (retirada o sin fecha): delete
+    """
+    if not debe_publicarse(subvencion):
+        if subvencion.calendar_event_id:
+            return OperacionCalendar(subvencion.id, "delete", event_id=subvencion.calendar_event_id)
+        return None
+    
+    evento = evento_subvencion(subvencion)
+    if not subvencion.calendar_event_id:
+        return OperacionCalendar(subvencion.id, "insert", event_id=id_evento(subvencion.id_bdns), body=evento)
+    if hash_evento(evento) != subvencion.calendar_hash:
+        return OperacionCalendar(subvencion.id, "patch", event_id=subvencion.calendar_event_id, body=evento)
+    return None
+
+
+def _backoff(intentos: int) -> timedelta:
+    return min(BACKOFF_MAXIMO, timedelta(seconds=settings.calendar_reintento_segundos * 2 ** (intentos - 1)))
+
+
+def _marcar_publicada(subvencion: Subvencion):
+    subvencion.calendar_estado = "publicado"
+    subvencion.calendar_intentos = 0
+    subvencion.calendar_error = None
+
+
+def _releer(db: Session, ids: List[int]) -> Dict[int, Subvencion]:
+    """
+    Volver a leer (y bloquear) las subvenciones antes de guardar el resultado
+
+    Mientras se llamaba a Calendar alguien pudo editar la subvención; con
+    populate_existing las instancias de la sesión reflejan la fila actual.
+    """
+    filas = db.query(Subvencion).filter(Subvencion.id.in_(ids)).with_for_update().populate_existing().all()
+    return {s.id: s for s in filas}
+
+
+def _confirmar(subvencion: Subvencion, ahora: datetime):
+    """
+    Marcar como publicada solo si lo publicado coincide con la fila actual;
+    si cambió durante la llamada a Calendar, queda pendiente para otra pasada.
+    """
+    if operacion_pendiente(subvencion) is None:
+        _marcar_publicada(subvencion)
+    else:
+        subvencion.calendar_estado = "pendiente"
+        subvencion.calendar_intentos = 0
+        subvencion.calendar_proximo_intento = ahora
+
+
+def aplicar_resultados(db: Session, operaciones: List[OperacionCalendar], resultados) -> Dict[str, int]:
+    """
+    Guardar en las subvenciones el resultado de las operaciones
+    
+    Relee las filas con bloqueo para no pisar ediciones concurrentes: se
+    guarda el event_id y el hash de lo que realmente se envió, y solo se
+    marca "publicado" si la subvención actual sigue renderizando lo mismo.
+    Los fallos se reprograman con espera exponencial; tras
+    CALENDAR_PUBLICACION_MAX_INTENTOS quedan en estado "error".
+    
+    Returns:
+        Contadores por tipo de operación correcta y fallidos
+    """
+    por_id = _releer(db, [op.clave for op in operaciones])
+    contadores = {"insert": 0, "patch": 0, "delete": 0, "fallidos": 0}
+    ahora = datetime.utcnow()
+    
+    for operacion in operaciones:
+        subvencion = por_id.get(operacion.clave)
+        if subvencion is None:  # Borrada mientras tanto
+            continue
+        resultado = resultados.get(operacion.clave)
+        
+        if resultado is not None and resultado.ok:
+            contadores[operacion.tipo] += 1
+            if operacion.tipo == "delete":
+                subvencion.calendar_event_id = None
+                subvencion.calendar_hash = None
+            else:
+                subvencion.calendar_event_id = resultado.event_id
+                subvencion.calendar_hash = hash_evento(operacion.body)
+            _confirmar(subvencion, ahora)
+            continue
+        
+        contadores["fallidos"] += 1
+        error = resultado.error if resultado is not None else "sin respuesta"
+        logger.error(f"Error en Calendar ({operacion.tipo}) para {subvencion.id_bdns}: {error}")
+        
+        subvencion.calendar_intentos = (subvencion.calendar_intentos or 0) + 1
+        subvencion.calendar_error = (error or "")[:500]
+        
+        # El evento se borró fuera de la aplicación: se vuelve a crear en el siguiente intento
+        if operacion.tipo == "patch" and resultado is not None and resultado.estado in (404, 410):
+            subvencion.calendar_event_id = None
+            subvencion.calendar_hash = None
+        
+        if subvencion.calendar_intentos >= settings.calendar_publicacion_max_intentos:
+            subvencion.calendar_estado = "error"
+        else:
+            subvencion.calendar_estado = "pendiente"
+            subvencion.calendar_proximo_intento = ahora + _backoff(subvencion.calendar_intentos)
+    
+    return contadores
+
+
+def reconciliar(
+    db: Session,
+    calendar: Optional[CalendarService] = None,
+    tamano_pagina: int = TAMANO_PAGINA
+) -> Dict[str, int]:
+    """
+    Reconciliar los eventos de Calendar con la base de datos
+    
+    Recorre por páginas (keyset sobre id) las subvenciones publicables o
+    con evento, compara el hash del evento renderizado con el guardado y
+    envía en peticiones batch solo los insert, patch y delete necesarios.
+    Si nada ha cambiado no se hace ninguna llamada a Calendar (ni siquiera
+    se construye el cliente). Es la pasada completa de comprobación; en
+    el día a día publica la cola (procesar_calendar).
+    
+    Args:
+        db: Sesión de BD
+        calendar: Cliente de Calendar (por defecto el compartido del proceso)
+        tamano_pagina: Subvenciones por página
+        
+    Returns:
+        Estadísticas {revisadas, creados, actualizados, eliminados, fallidos}
+    """
+    totales = {"revisadas": 0, "creados": 0, "actualizados": 0, "eliminados": 0, "fallidos": 0}
+    ultimo_id = 0
+    
+    while sigue_siendo_lider():
+        pagina = db.query(Subvencion).filter(
+            Subvencion.id > ultimo_id,
+            or_(
+                and_(Subvencion.activa == True, Subvencion.fecha_fin_solicitud != None),
+                Subvencion.calendar_event_id != None
+            )
+        ).order_by(Subvencion.id).limit(tamano_pagina).all()
+        
+        if not pagina:
+            break
+        ultimo_id = pagina[-1].id
+        totales["revisadas"] += len(pagina)
+        
+        operaciones = [op for op in map(operacion_pendiente, pagina) if op is not None]
+        if operaciones:
+            calendar = calendar or get_calendar_service()
+            resultados = _ejecutar_en_paralelo(calendar, operaciones)
+            contadores = aplicar_resultados(db, operaciones, resultados)
+            db.commit()
+            
+            totales["creados"] += contadores["insert"]
+            totales["actualizados"] += contadores["patch"]
+            totales["eliminados"] += contadores["delete"]
+            totales["fallidos"] += contadores["fallidos"]
+    
+    cambios = totales["creados"] + totales["actualizados"] + totales["eliminados"]
+    if cambios or totales["fallidos"]:
+        logger.info(
+            f"📅 Calendar reconciliado: {totales['creados']} creados, {totales['actualizados']} actualizados, "
+            f"{totales['eliminados']} eliminados, {totales['fallidos']} fallidos"
+        )
+    else:
+        logger.info(f"📅 Calendar al día ({totales['revisadas']} subvenciones revisadas, sin llamadas)")
+    
+    return totales
+
+
+def reconciliar_calendar() -> Dict[str, int]:
+    """Job nocturno: pasada completa de reconciliación con su propia sesión"""
+    db = SessionLocal()
+    try:
+        return reconciliar(db)
+    except Exception as e:
+        logger.error(f"Error al reconciliar Calendar: {e}")
+        db.rollback()
+        return {}
+    finally:
+        db.close()
+
+
+def _reclamar(db: Session, limite: int) -> List[Subvencion]:
+    """
+    Reclamar subvenciones pendientes de publicar sin bloquear a otros workers
+    
+    La sesión debe tener expire_on_commit=False: las instancias devueltas
+    conservan los valores leídos y no se recargan una a una tras el commit.
+    """
+    ahora = datetime.utcnow()
+    
+    subvenciones = db.query(Subvencion).filter(
+        Subvencion.calendar_estado.in_(["pendiente", "publicando"]),
+        Subvencion.calendar_proximo_intento <= ahora
+    ).order_by(
+        Subvencion.calendar_proximo_intento
+    ).limit(limite).with_for_update(skip_locked=True).populate_existing().all()
+    
+    for subvencion in subvenciones:
+        subvencion.calendar_estado = "publicando"
+        subvencion.calendar_proximo_intento = ahora + DURACION_RESERVA
+    
+    db.commit()
+    return subvenciones
+
+
+def _ejecutar_en_paralelo(calendar: CalendarService, operaciones: List[OperacionCalendar]) -> Dict:
+    """Repartir las operaciones en peticiones batch enviadas por CALENDAR_WORKERS hilos"""
+    tamano = max(1, settings.calendar_tamano_lote)
+    grupos = [operaciones[i:i + tamano] for i in range(0, len(operaciones), tamano)]
+    
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(settings.calendar_workers, len(grupos)))) as executor:
+        for parcial in executor.map(calendar.ejecutar_lote, grupos):
+            resultados.update(parcial)
+    return resultados
+
+
+def procesar_calendar(max_lotes: Optional[int] = None, calendar: Optional[CalendarService] = None) -> Dict[str, int]:
+    """
+    Publicar en Calendar las subvenciones pendientes
+    
+    Etapa independiente de la sincronización: las subvenciones nuevas o
+    con cambios en los campos del evento quedan en estado "pendiente" y
+    este job las reclama con SELECT ... FOR UPDATE SKIP LOCKED, envía las
+    operaciones en peticiones batch con CALENDAR_WORKERS hilos y reprograma
+    los fallos con espera exponencial.
+    
+    Args:
+        max_lotes: Número máximo de lotes a procesar (None = hasta vaciar)
+        calendar: Cliente de Calendar (por defecto el compartido del proceso)
+        
+    Returns:
+        Estadísticas {procesadas, publicadas, fallidas}
+    """
+    db = SessionLocal(expire_on_commit=False)
+    procesadas = fallidas = lotes = 0
+    
+    try:
+        while (max_lotes is None or lotes < max_lotes) and sigue_siendo_lider():
+            subvenciones = _reclamar(db, settings.calendar_tamano_reclamo)
+            if not subvenciones:
+                break
+            
+            operaciones = []
+            al_dia = []
+            for subvencion in subvenciones:
+                operacion = operacion_pendiente(subvencion)
+                if operacion is None:
+                    al_dia.append(subvencion.id)
+                else:
+                    operaciones.append(operacion)
+            
+            if operaciones:
+                calendar = calendar or get_calendar_service()
+                resultados = _ejecutar_en_paralelo(calendar, operaciones)
+                fallidas += aplicar_resultados(db, operaciones, resultados)["fallidos"]
+            
+            if al_dia:
+                ahora = datetime.utcnow()
+                for subvencion in _releer(db, al_dia).values():
+                    _confirmar(subvencion, ahora)
+            
+            db.commit()
+            db.expunge_all()
+            procesadas += len(subvenciones)
+            lotes += 1
+        
+        if procesadas:
+            logger.info(f"📅 Calendar: {procesadas - fallidas}/{procesadas} subvenciones publicadas")
+        
+    except Exception as e:
+        logger.error(f"Error al publicar en Calendar: {e}")
+        db.rollback()
+    finally:
+        db.close()
+    
+    return {"procesadas": procesadas, "publicadas": procesadas - fallidas, "fallidas": fallidas}
+
+
+def estadisticas(db: Session) -> Dict[str, int]:
+    """Número de subvenciones por estado de publicación en Calendar"""
+    return dict(
+        db.query(Subvencion.calendar_estado, func.count(Subvencion.id))
+        .group_by(Subvencion.calendar_estado).all()
+    )
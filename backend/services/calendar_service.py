@@ -4,53 +4,237 @@ Servicio de integración con Google Calendar
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Hashable, List, Optional
 from loguru import logger
 from config import get_settings
 import os
 import json
+import time
+import base64
+import threading
+from functools import lru_cache
 from pathlib import Path
 
 settings = get_settings()
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# Límite de Google para peticiones agrupadas en Calendar
+MAX_OPERACIONES_POR_LOTE = 50
+
+# Errores transitorios que se reintentan dentro de un lote
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+MOTIVOS_CUOTA = (b"rateLimitExceeded", b"userRateLimitExceeded", b"quotaExceeded")
+
+
+@dataclass
+class OperacionCalendar:
+    """Operación sobre un evento dentro de un lote (insert, update, patch o delete)"""
+    clave: Hashable  # Identifica el resultado (p. ej. id de la subvención)
+    tipo: str
+    event_id: Optional[str] = None
+    body: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class ResultadoCalendar:
+    """Resultado de una operación de un lote"""
+    clave: Hashable
+    ok: bool
+    event_id: Optional[str] = None
+    error: Optional[str] = None
+    estado: Optional[int] = None  # Código HTTP del error, si lo hay
+
+
+def es_reintentable(error: Exception) -> bool:
+    """Errores de cuota o del servidor que merece la pena reintentar"""
+    if not isinstance(error, HttpError):
+        return False
+    estado = error.resp.status
+    if estado in ESTADOS_REINTENTABLES:
+        return True
+    return estado == 403 and any(motivo in (error.content or b"") for motivo in MOTIVOS_CUOTA)
+
+
+def es_idempotente(operacion: OperacionCalendar) -> bool:
+    """
+    Repetir la operación no duplica nada: todo salvo un insert sin ID propio
+    (Google asignaría otro ID y el evento quedaría dos veces)
+    """
+    return operacion.tipo != "insert" or bool(operacion.event_id)
+
+
+def debe_reintentarse(operacion: OperacionCalendar, error: Exception) -> bool:
+    """
+    Timeouts, conexiones cortadas y errores 5xx pueden llegar después de que
+    el servidor aplicara la petición: solo se repiten si es idempotente. Los
+    errores de cuota (429/403) se rechazan antes de aplicar nada.
+    """
+    if isinstance(error, HttpError):
+        if not es_reintentable(error):
+            return False
+        return es_idempotente(operacion) or error.resp.status in (403, 429)
+    return es_idempotente(operacion)
+
+
+def construir_evento(
+    titulo: str,
+    descripcion: str,
+    fecha_inicio: Optional[datetime],
+    fecha_fin: datetime,
+    url_bdns: str,
+    presupuesto: Optional[float] = None,
+    region: Optional[str] = None,
+    organo: Optional[str] = None
+) -> Dict[str, Any]:
+    """Cuerpo del evento de Calendar para una subvención"""
+    # Construir descripción enriquecida
+    description_parts = [descripcion or ""]
+    
+    if organo:
+        description_parts.append(f"\n\n📋 Órgano convocante: {organo}")
+    
+    if region:
+        description_parts.append(f"\n🌍 Región: {region}")
+    
+    if presupuesto:
+        description_parts.append(f"\n💰 Presupuesto: {presupuesto:,.2f} €")
+    
+    description_parts.append(f"\n\n🔗 Más información: {url_bdns}")
+    description_parts.append(f"\n\n⚠️ IMPORTANTE: Fecha límite de solicitud")
+    
+    full_description = "".join(description_parts)
+    
+    return {
+        'summary': f"🔔 {titulo}",
+        'description': full_description,
+        'start': {
+            'date': fecha_inicio.strftime('%Y-%m-%d') if fecha_inicio else fecha_fin.strftime('%Y-%m-%d'),
+            'timeZone': 'Europe/Madrid',
+        },
+        'end': {
+            'date': fecha_fin.strftime('%Y-%m-%d'),
+            'timeZone': 'Europe/Madrid',
+        },
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'email', 'minutes': 7 * 24 * 60},  # 7 días antes
+                {'method': 'popup', 'minutes': 7 * 24 * 60},
+                {'method': 'email', 'minutes': 3 * 24 * 60},  # 3 días antes
+                {'method': 'popup', 'minutes': 3 * 24 * 60},
+                {'method': 'email', 'minutes': 1 * 24 * 60},  # 1 día antes
+                {'method': 'popup', 'minutes': 1 * 24 * 60},
+            ],
+        },
+        'colorId': '9',  # Azul para subvenciones
+    }
+
+
+def evento_subvencion(subvencion) -> Dict[str, Any]:
+    """Cuerpo del evento de Calendar a partir de una Subvencion (requiere fecha_fin_solicitud)"""
+    return construir_evento(
+        titulo=subvencion.titulo,
+        descripcion=subvencion.descripcion or "",
+        fecha_inicio=subvencion.fecha_inicio_solicitud or subvencion.fecha_fin_solicitud,
+        fecha_fin=subvencion.fecha_fin_solicitud,
+        url_bdns=subvencion.url_bdns,
+        presupuesto=float(subvencion.presupuesto_total) if subvencion.presupuesto_total else None,
+        region=subvencion.region_nombre,
+        organo=subvencion.organo_convocante
+    )
+
+
+def id_evento(id_bdns: str) -> str:
+    """
+    ID de evento determinista para una subvención
+
+    Google acepta IDs propios en base32hex (a-v y 0-9, de 5 a 1024
+    caracteres). Con un ID fijo, repetir la creación de un evento no lo
+    duplica: la API responde 409.
+    """
+    return base64.b32hexencode(f"subv{id_bdns}".encode("utf-8")).decode("ascii").lower().rstrip("=")
+
+
+@lru_cache()
+def _credenciales():
+    """Credenciales de la cuenta de servicio (se cargan una vez por proceso)"""
+    try:
+        # Intentar primero desde variable de entorno (Railway/Cloud)
+        credentials_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
+        
+        if credentials_json:
+            logger.info("Usando credenciales desde variable de entorno GOOGLE_CREDENTIALS_JSON")
+            credentials_info = json.loads(credentials_json)
+            return service_account.Credentials.from_service_account_info(
+                credentials_info,
+                scopes=SCOPES
+            )
+        
+        # Fallback: usar archivo local
+        logger.info(f"Usando credenciales desde archivo: {settings.google_service_account_file}")
+        return service_account.Credentials.from_service_account_file(
+            settings.google_service_account_file,
+            scopes=SCOPES
+        )
+    except Exception as e:
+        logger.error(f"Error al autenticar con Google Calendar: {e}")
+        raise
+
+
+def get_calendar_url(calendar_id: Optional[str] = None) -> str:
+    """
+    Obtener URL pública del calendario (sin red ni autenticación)
+    
+    Returns:
+        URL para suscribirse al calendario
+    """
+    return f"https://calendar.google.com/calendar/embed?src={calendar_id or settings.calendar_id}"
+
+
+def get_ical_url(calendar_id: Optional[str] = None) -> str:
+    """
+    Obtener URL iCal para suscripción (sin red ni autenticación)
+    
+    Returns:
+        URL iCal
+    """
+    return f"https://calendar.google.com/calendar/ical/{calendar_id or settings.calendar_id}/public/basic.ics"
+
 
 class CalendarService:
     """Cliente para Google Calendar API"""
     
-    def __init__(self):
+    def __init__(self, service=None):
         self.calendar_id = settings.calendar_id
-        self.service = None
-        self._authenticate()
+        self._service = service
+        self._local = threading.local()
     
-    def _authenticate(self):
-        """Autenticar con cuenta de servicio"""
-        try:
-            # Intentar primero desde variable de entorno (Railway/Cloud)
-            credentials_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
-            
-            if credentials_json:
-                logger.info("Usando credenciales desde variable de entorno GOOGLE_CREDENTIALS_JSON")
-                credentials_info = json.loads(credentials_json)
-                credentials = service_account.Credentials.from_service_account_info(
-                    credentials_info,
-                    scopes=SCOPES
-                )
-            else:
-                # Fallback: usar archivo local
-                logger.info(f"Usando credenciales desde archivo: {settings.google_service_account_file}")
-                credentials = service_account.Credentials.from_service_account_file(
-                    settings.google_service_account_file,
-                    scopes=SCOPES
-                )
-            
-            self.service = build('calendar', 'v3', credentials=credentials)
-            logger.info("✓ Autenticación con Google Calendar exitosa")
-        except Exception as e:
-            logger.error(f"Error al autenticar con Google Calendar: {e}")
-            raise
+    @property
+    def service(self):
+        """
+        Cliente de la API, construido al primer uso
+        
+        Usa las credenciales cacheadas y el documento de descubrimiento
+        incluido en googleapiclient (sin petición de red). Se crea uno por
+        hilo porque httplib2 no es seguro entre hilos.
+        """
+        if self._service is not None:
+            return self._service
+        
+        servicio = getattr(self._local, "servicio", None)
+        if servicio is None:
+            servicio = build(
+                'calendar', 'v3',
+                credentials=_credenciales(),
+                static_discovery=True,
+                cache_discovery=False
+            )
+            self._local.servicio = servicio
+            logger.info("✓ Cliente de Google Calendar listo")
+        return servicio
     
     def create_calendar(self, name: str, description: str) -> str:
         """
@@ -116,48 +300,9 @@ class CalendarService:
         Returns:
             ID del evento creado
         """
-        # Construir descripción enriquecida
-        description_parts = [descripcion or ""]
-        
-        if organo:
-            description_parts.append(f"\n\n📋 Órgano convocante: {organo}")
-        
-        if region:
-            description_parts.append(f"\n🌍 Región: {region}")
-        
-        if presupuesto:
-            description_parts.append(f"\n💰 Presupuesto: {presupuesto:,.2f} €")
-        
-        description_parts.append(f"\n\n🔗 Más información: {url_bdns}")
-        description_parts.append(f"\n\n⚠️ IMPORTANTE: Fecha límite de solicitud")
-        
-        full_description = "".join(description_parts)
-        
-        # Crear evento
-        event = {
-            'summary': f"🔔 {titulo}",
-            'description': full_description,
-            'start': {
-                'date': fecha_inicio.strftime('%Y-%m-%d') if fecha_inicio else fecha_fin.strftime('%Y-%m-%d'),
-                'timeZone': 'Europe/Madrid',
-            },
-            'end': {
-                'date': fecha_fin.strftime('%Y-%m-%d'),
-                'timeZone': 'Europe/Madrid',
-            },
-            'reminders': {
-                'useDefault': False,
-                'overrides': [
-                    {'method': 'email', 'minutes': 7 * 24 * 60},  # 7 días antes
-                    {'method': 'popup', 'minutes': 7 * 24 * 60},
-                    {'method': 'email', 'minutes': 3 * 24 * 60},  # 3 días antes
-                    {'method': 'popup', 'minutes': 3 * 24 * 60},
-                    {'method': 'email', 'minutes': 1 * 24 * 60},  # 1 día antes
-                    {'method': 'popup', 'minutes': 1 * 24 * 60},
-                ],
-            },
-            'colorId': '9',  # Azul para subvenciones
-        }
+        event = construir_evento(
+            titulo, descripcion, fecha_inicio, fecha_fin, url_bdns, presupuesto, region, organo
+        )
         
         try:
             created_event = self.service.events().insert(
@@ -173,9 +318,130 @@ class CalendarService:
             logger.error(f"Error al crear evento: {error}")
             raise
     
+    def _peticion(self, operacion: OperacionCalendar):
+        """Petición HTTP (sin ejecutar) de una operación"""
+        events = self.service.events()
+        if operacion.tipo == "insert":
+            body = dict(operacion.body, id=operacion.event_id) if operacion.event_id else operacion.body
+            return events.insert(calendarId=self.calendar_id, body=body)
+        if operacion.tipo == "update":
+            return events.update(calendarId=self.calendar_id, eventId=operacion.event_id, body=operacion.body)
+        if operacion.tipo == "patch":
+            return events.patch(calendarId=self.calendar_id, eventId=operacion.event_id, body=operacion.body)
+        if operacion.tipo == "delete":
+            return events.delete(calendarId=self.calendar_id, eventId=operacion.event_id)
+        raise ValueError(f"Operación de Calendar desconocida: {operacion.tipo}")
+    
+    def _ejecutar_grupo(self, operaciones: List[OperacionCalendar]) -> Dict[Hashable, Any]:
+        """
+        Enviar un grupo de operaciones en una sola petición batch
+        
+        Returns:
+            Diccionario clave -> respuesta o excepción de cada operación
+        """
+        respuestas: Dict[Hashable, Any] = {}
+        
+        def callback(request_id, response, exception):
+            respuestas[operaciones[int(request_id)].clave] = exception if exception is not None else response
+        
+        batch = self.service.new_batch_http_request(callback=callback)
+        for i, operacion in enumerate(operaciones):
+            batch.add(self._peticion(operacion), request_id=str(i))
+        
+        try:
+            batch.execute()
+        except Exception as e:
+            # Fallo de la petición completa: todas las operaciones sin respuesta lo heredan
+            for operacion in operaciones:
+                respuestas.setdefault(operacion.clave, e)
+        
+        return respuestas
+    
+    def ejecutar_lote(self, operaciones: List[OperacionCalendar]) -> Dict[Hashable, ResultadoCalendar]:
+        """
+        Ejecutar operaciones sobre eventos agrupadas en peticiones batch
+        
+        Envía grupos de hasta CALENDAR_TAMANO_LOTE operaciones (máximo 50)
+        y reintenta con espera exponencial las que fallan por cuota y, si
+        repetirlas es seguro (ver es_idempotente), las que fallan por error
+        del servidor o de red. Borrar un evento que ya no existe cuenta como
+        éxito. Un insert con ID propio que recibe 409 (el evento ya se creó
+        en un intento anterior, o se borró y quedó cancelado) se repite como
+        update del mismo ID, que deja el contenido al día y lo restaura.
+        
+        Args:
+            operaciones: Operaciones con clave única
+            
+        Returns:
+            Diccionario clave -> ResultadoCalendar
+        """
+        tamano = max(1, min(settings.calendar_tamano_lote, MAX_OPERACIONES_POR_LOTE))
+        resultados: Dict[Hashable, ResultadoCalendar] = {}
+        pendientes = list(operaciones)
+        intento = 0
+        
+        while pendientes:
+            intento += 1
+            reintentar = []
+            convertidas = []
+            
+            for i in range(0, len(pendientes), tamano):
+                grupo = pendientes[i:i + tamano]
+                respuestas = self._ejecutar_grupo(grupo)
+                
+                for operacion in grupo:
+                    respuesta = respuestas.get(operacion.clave)
+                    
+                    if not isinstance(respuesta, Exception):
+                        event_id = (respuesta or {}).get('id', operacion.event_id)
+                        resultados[operacion.clave] = ResultadoCalendar(operacion.clave, True, event_id)
+                    elif (operacion.tipo == "delete" and isinstance(respuesta, HttpError)
+                          and respuesta.resp.status in (404, 410)):
+                        resultados[operacion.clave] = ResultadoCalendar(operacion.clave, True, operacion.event_id)
+                    elif (operacion.tipo == "insert" and operacion.event_id and isinstance(respuesta, HttpError)
+                          and respuesta.resp.status == 409):
+                        convertidas.append(OperacionCalendar(
+                            operacion.clave, "update", operacion.event_id,
+                            dict(operacion.body, status="confirmed")
+                        ))
+                    elif intento < settings.calendar_max_intentos and debe_reintentarse(operacion, respuesta):
+                        reintentar.append(operacion)
+                    else:
+                        resultados[operacion.clave] = ResultadoCalendar(
+                            operacion.clave, False, operacion.event_id, str(respuesta)[:500],
+                            respuesta.resp.status if isinstance(respuesta, HttpError) else None
+                        )
+            
+            if reintentar:
+                espera = settings.calendar_backoff_segundos * 2 ** (intento - 1)
+                logger.warning(f"⏳ Calendar: reintentando {len(reintentar)} operaciones en {espera:.1f}s")
+                time.sleep(espera)
+            pendientes = reintentar + convertidas
+        
+        fallidas = sum(1 for r in resultados.values() if not r.ok)
+        if fallidas:
+            logger.error(f"Calendar: {fallidas}/{len(operaciones)} operaciones fallidas")
+        return resultados
+    
+    def crear_eventos(self, subvenciones: List[Any]) -> Dict[int, ResultadoCalendar]:
+        """
+        Crear en lote los eventos de subvenciones con fecha de fin
+        
+        Args:
+            subvenciones: Subvenciones a publicar
+            
+        Returns:
+            Diccionario id de subvención -> ResultadoCalendar
+        """
+        return self.ejecutar_lote([
+            OperacionCalendar(clave=s.id, tipo="insert", event_id=id_evento(s.id_bdns), body=evento_subvencion(s))
+            for s in subvenciones
+            if s.fecha_fin_solicitud
+        ])
+    
     def update_event(self, event_id: str, updates: Dict[str, Any]) -> bool:
         """
-        Actualizar evento existente
+        Actualizar evento existente (PATCH: solo los campos indicados, sin GET previo)
         
         Args:
             event_id: ID del evento
@@ -185,17 +451,10 @@ class CalendarService:
             True si se actualizó correctamente
         """
         try:
-            event = self.service.events().get(
-                calendarId=self.calendar_id,
-                eventId=event_id
-            ).execute()
-            
-            event.update(updates)
-            
-            self.service.events().update(
+            self.service.events().patch(
                 calendarId=self.calendar_id,
                 eventId=event_id,
-                body=event
+                body=updates
             ).execute()
             
             logger.info(f"✓ Evento actualizado: {event_id}")
@@ -229,19 +488,15 @@ class CalendarService:
             return False
     
     def get_calendar_url(self) -> str:
-        """
-        Obtener URL pública del calendario
-        
-        Returns:
-            URL para suscribirse al calendario
-        """
-        return f"https://calendar.google.com/calendar/embed?src={self.calendar_id}"
+        """URL pública del calendario configurado"""
+        return get_calendar_url(self.calendar_id)
     
     def get_ical_url(self) -> str:
-        """
-        Obtener URL iCal para suscripción
-        
-        Returns:
-            URL iCal
-        """
-        return f"https://calendar.google.com/calendar/ical/{self.calendar_id}/public/basic.ics"
+        """URL iCal del calendario configurado"""
+        return get_ical_url(self.calendar_id)
+
+
+@lru_cache()
+def get_calendar_service() -> CalendarService:
+    """Cliente de Calendar compartido por todo el proceso (se autentica al primer uso)"""
+    return CalendarService()
@@ -0,0 +1,45 @@
+"""
+Servicio de catálogos (mapeo de finalidades BDNS a áreas temáticas)
+"""
+from typing import List, Optional
+from loguru import logger
+from sqlalchemy.orm import Session
+from models.catalogo import AreaTematica, AreaTematicaFinalidad
+from services.matching_service import MapaAreas
+
+
+def parsear_finalidades(finalidades_bdns: Optional[str]) -> List[int]:
+    """Convertir "11, 12,13" en [11, 12, 13] ignorando valores no numéricos"""
+    ids = []
+    for valor in (finalidades_bdns or "").split(","):
+        valor = valor.strip()
+        if valor.isdigit() and int(valor) not in ids:
+            ids.append(int(valor))
+    return ids
+
+
+def sincronizar_areas_finalidades(db: Session) -> int:
+    """
+    Regenerar la tabla de asociación desde AreaTematica.finalidades_bdns
+    
+    Returns:
+        Número de asociaciones creadas
+    """
+    db.query(AreaTematicaFinalidad).delete(synchronize_session=False)
+    
+    asociaciones = [
+        AreaTematicaFinalidad(area_id=area.id, finalidad_id=finalidad_id)
+        for area in db.query(AreaTematica).all()
+        for finalidad_id in parsear_finalidades(area.finalidades_bdns)
+    ]
+    db.add_all(asociaciones)
+    db.commit()
+    
+    logger.info(f"✓ {len(asociaciones)} asociaciones área temática - finalidad")
+    return len(asociaciones)
+
+
+def cargar_mapa_areas(db: Session) -> MapaAreas:
+    """Cargar en memoria el mapeo finalidad -> áreas temáticas (una vez por sincronización)"""
+    filas = db.query(AreaTematicaFinalidad.area_id, AreaTematicaFinalidad.finalidad_id).all()
+    return MapaAreas(filas)
@@ -0,0 +1,195 @@
+"""
+Servicio de resúmenes periódicos (frecuencia_email diaria/semanal)
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from config import get_settings
+from database import SessionLocal
+from models.notificacion_enviada import NotificacionEnviada
+from models.subvencion import Subvencion
+from models.suscripcion import Suscripcion
+from models.usuario import Usuario
+from services import notification_service, outbox_service
+from services.calendar_service import get_calendar_url
+from services.email_service import EmailService
+
+settings = get_settings()
+
+# Si un usuario tiene varias suscripciones que coinciden, manda la más frecuente (menor prioridad)
+PRIORIDAD_FRECUENCIA = {"inmediata": 0, "diaria": 1, "semanal": 2}
+
+
+def prioridad(suscripcion: Any) -> int:
+    """Orden de la frecuencia de una suscripción (menor = más inmediata)"""
+    return PRIORIDAD_FRECUENCIA.get(suscripcion.frecuencia_email or "inmediata", 0)
+
+
+def proxima_entrega(frecuencia: Optional[str], ahora: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Momento (UTC) del próximo resumen para una frecuencia
+    
+    Args:
+        frecuencia: inmediata, diaria o semanal
+        ahora: Momento de referencia (por defecto ahora)
+        
+    Returns:
+        Fecha de entrega, o None si la notificación es inmediata
+    """
+    if frecuencia not in ("diaria", "semanal"):
+        return None
+    
+    ahora = ahora or datetime.utcnow()
+    entrega = ahora.replace(hour=settings.digest_hora, minute=0, second=0, microsecond=0)
+    
+    if frecuencia == "semanal":
+        entrega += timedelta(days=(settings.digest_dia_semana - entrega.weekday()) % 7)
+    
+    if entrega <= ahora:
+        entrega += timedelta(days=7 if frecuencia == "semanal" else 1)
+    
+    return entrega
+
+
+def suscripcion_resumen(activas: List[Any], suscripcion_id: Optional[int] = None) -> Any:
+    """
+    Suscripción con la que se envía un resumen (periodo y enlace de baja)
+    
+    La que lo programó si sigue activa; si no (o en notificaciones anteriores
+    a guardar el origen), la de resumen más frecuente del usuario, igual que
+    en enviar_notificaciones gana la prioridad más baja.
+    """
+    for suscripcion in activas:
+        if suscripcion.id == suscripcion_id:
+            return suscripcion
+    con_resumen = [s for s in activas if prioridad(s) > 0]
+    return min(con_resumen or activas, key=prioridad)
+
+
+def datos_subvencion(subvencion: Subvencion) -> Dict[str, Any]:
+    """Datos de una subvención para las plantillas de email"""
+    return {
+        "titulo": subvencion.titulo,
+        "descripcion": subvencion.descripcion,
+        "organo_convocante": subvencion.organo_convocante,
+        "region_nombre": subvencion.region_nombre,
+        "presupuesto_total": subvencion.presupuesto_total,
+        "fecha_fin_solicitud": subvencion.fecha_fin_solicitud,
+        "url_bdns": subvencion.url_bdns
+    }
+
+
+def procesar_digests() -> Dict[str, int]:
+    """
+    Encolar un único email por usuario y suscripción con todas sus notificaciones vencidas
+    
+    Returns:
+        Estadísticas {usuarios, notificaciones, descartadas}
+    """
+    db = SessionLocal()
+    ahora = datetime.utcnow()
+    
+    try:
+        filas = db.query(
+            NotificacionEnviada.id,
+            NotificacionEnviada.usuario_id,
+            NotificacionEnviada.suscripcion_id,
+            Subvencion
+        ).join(
+            Subvencion, Subvencion.id == NotificacionEnviada.subvencion_id
+        ).filter(
+            NotificacionEnviada.tipo == "email",
+            NotificacionEnviada.programada_para <= ahora,
+            NotificacionEnviada.enviada == False,
+            NotificacionEnviada.email_id == None,
+            NotificacionEnviada.error == None
+        ).order_by(
+            NotificacionEnviada.usuario_id,
+            Subvencion.fecha_fin_solicitud.asc()
+        ).all()
+        
+        if not filas:
+            return {"usuarios": 0, "notificaciones": 0, "descartadas": 0}
+        
+        usuario_ids = list({usuario_id for _, usuario_id, _, _ in filas})
+        # Mismos requisitos que cargar_destinatarios: confirmado y activo
+        usuarios = {u.id: u for u in db.query(Usuario).filter(
+            Usuario.id.in_(usuario_ids),
+            Usuario.confirmado == True,
+            Usuario.activo == True
+        ).all()}
+        suscripciones = defaultdict(list)
+        for suscripcion in db.query(Suscripcion).filter(
+            Suscripcion.usuario_id.in_(usuario_ids),
+            Suscripcion.activa == True,
+            Suscripcion.notificar_email == True
+        ).order_by(Suscripcion.id).all():
+            suscripciones[suscripcion.usuario_id].append(suscripcion)
+        
+        # Un resumen por (usuario, suscripción que lo pidió): una suscripción
+        # diaria y otra semanal del mismo usuario reciben cada una el suyo
+        pendientes = defaultdict(list)
+        descartadas = []
+        for notificacion_id, usuario_id, suscripcion_id, subvencion in filas:
+            usuario = usuarios.get(usuario_id)
+            activas = suscripciones.get(usuario_id)
+            
+            # El usuario se ha dado de baja o se ha desactivado desde que se programó el resumen
+            if not usuario or not activas:
+                descartadas.append(notificacion_id)
+                continue
+            
+            suscripcion = suscripcion_resumen(activas, suscripcion_id)
+            pendientes[(usuario, suscripcion)].append((notificacion_id, subvencion))
+        
+        email_service = EmailService()
+        calendar_url = get_calendar_url()
+        
+        mensajes = []
+        grupos = []
+        fragmentos = {}  # Bloque renderizado de cada subvención, compartido entre usuarios
+        
+        for (usuario, suscripcion), notificaciones in pendientes.items():
+            ids = [n for n, _ in notificaciones]
+            
+            for _, subvencion in notificaciones:
+                if subvencion.id not in fragmentos:
+                    fragmentos[subvencion.id] = email_service.render_fragmento_resumen(datos_subvencion(subvencion))
+            
+            mensajes.append(email_service.build_digest(
+                to_email=usuario.email,
+                nombre_usuario=usuario.nombre,
+                subvenciones=[datos_subvencion(s) for _, s in notificaciones],
+                fragmentos=[fragmentos[s.id] for _, s in notificaciones],
+                frecuencia=suscripcion.frecuencia_email,
+                calendar_url=calendar_url,
+                unsubscribe_url=f"{calendar_url}?unsubscribe={suscripcion.id}"
+            ))
+            grupos.append(ids)
+        
+        # Una fila de la bandeja por usuario; todas sus notificaciones apuntan a ella
+        email_ids = outbox_service.encolar(db, mensajes, tipo="digest")
+        notification_service.vincular_emails(db, {
+            notificacion_id: email_id
+            for ids, email_id in zip(grupos, email_ids)
+            for notificacion_id in ids
+        })
+        
+        if descartadas:
+            notification_service.registrar_resultados(db, [
+                {"id": n, "enviada": False, "fecha_envio": None, "error": "Suscripción desactivada"}
+                for n in descartadas
+            ])
+        
+        notificaciones = sum(len(ids) for ids in grupos)
+        logger.success(f"✓ {len(grupos)} resúmenes encolados ({notificaciones} subvenciones)")
+        usuarios = len({usuario.id for usuario, _ in pendientes})
+        return {"usuarios": usuarios, "notificaciones": notificaciones, "descartadas": len(descartadas)}
+        
+    except Exception as e:
+        logger.error(f"Error al procesar resúmenes: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -2,26 +2,114 @@
 Servicio de notificaciones por email
 """
 import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List, Optional
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional
 from datetime import datetime
-from jinja2 import Template
+from jinja2 import Environment, FileSystemLoader, Template
 from loguru import logger
 from config import get_settings
+from services.email_transport import TransporteEmail, get_transporte
 
 settings = get_settings()
 
+DIRECTORIO_PLANTILLAS = Path(__file__).resolve().parent.parent / "templates" / "email"
+
+# Errores tras los que se reabre la conexión y se reintenta el mensaje
+ERRORES_CONEXION = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+
+
+@dataclass
+class MensajeEmail:
+    """Email listo para enviar"""
+    to_email: str
+    subject: str
+    html_content: str
+    text_content: Optional[str] = None
+
+
+@dataclass
+class ResultadoEnvio:
+    """Resultado del envío de un mensaje"""
+    to_email: str
+    enviado: bool
+    error: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class FragmentoSubvencion:
+    """Parte de un email común a todos los destinatarios de una subvención"""
+    html: str
+    texto: str
+
+
+@lru_cache()
+def get_entorno_plantillas() -> Environment:
+    """Entorno Jinja compartido: cada plantilla se compila una vez por proceso"""
+    return Environment(
+        loader=FileSystemLoader(str(DIRECTORIO_PLANTILLAS)),
+        auto_reload=False
+    )
+
+
+def _plantilla(nombre: str) -> Template:
+    return get_entorno_plantillas().get_template(nombre)
+
+
+def _texto_plazo(dias: int) -> str:
+    if dias <= 0:
+        return "Cierra hoy"
+    if dias == 1:
+        return "Cierra mañana"
+    return f"Cierra en {dias} días"
+
 
 class EmailService:
     """Servicio para envío de emails"""
     
-    def __init__(self):
-        self.smtp_host = settings.smtp_host
-        self.smtp_port = settings.smtp_port
-        self.smtp_user = settings.smtp_user
-        self.smtp_password = settings.smtp_password
+    def __init__(self, transporte: Optional[TransporteEmail] = None):
+        self.transporte = transporte or get_transporte()
         self.email_from = settings.email_from
+        self.max_mensajes_por_conexion = settings.smtp_max_mensajes_por_conexion
+    
+    def _construir_mensaje(self, mensaje: MensajeEmail) -> MIMEMultipart:
+        """Construir mensaje MIME (texto plano opcional + HTML)"""
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = mensaje.subject
+        msg['From'] = self.email_from
+        msg['To'] = mensaje.to_email
+        
+        # Añadir versión texto plano
+        if mensaje.text_content:
+            part1 = MIMEText(mensaje.text_content, 'plain', 'utf-8')
+            msg.attach(part1)
+        
+        # Añadir versión HTML
+        part2 = MIMEText(mensaje.html_content, 'html', 'utf-8')
+        msg.attach(part2)
+        
+        return msg
+    
+    def _conectar(self):
+        """Abrir conexión con el transporte configurado (SMTP autenticado por defecto)"""
+        return self.transporte.conectar()
+    
+    @staticmethod
+    def _cerrar(server):
+        """Cerrar conexión ignorando errores"""
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
     
     def send_email(
         self,
@@ -43,24 +131,10 @@ class EmailService:
             True si se envió correctamente
         """
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.email_from
-            msg['To'] = to_email
-            
-            # Añadir versión texto plano
-            if text_content:
-                part1 = MIMEText(text_content, 'plain', 'utf-8')
-                msg.attach(part1)
-            
-            # Añadir versión HTML
-            part2 = MIMEText(html_content, 'html', 'utf-8')
-            msg.attach(part2)
+            msg = self._construir_mensaje(MensajeEmail(to_email, subject, html_content, text_content))
             
             # Conectar y enviar
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_user, self.smtp_password)
+            with self._conectar() as server:
                 server.send_message(msg)
             
             logger.info(f"✓ Email enviado a {to_email}: {subject}")
@@ -70,6 +144,119 @@ class EmailService:
             logger.error(f"Error al enviar email a {to_email}: {e}")
             return False
     
+    def send_batch(
+        self,
+        mensajes: List[MensajeEmail],
+        conexiones: int = 1,
+        antes_de_enviar: Optional[Callable[[], None]] = None
+    ) -> List[ResultadoEnvio]:
+        """
+        Enviar varios emails reutilizando conexiones SMTP autenticadas
+        
+        Los mensajes se reparten entre `conexiones` conexiones abiertas en
+        paralelo. Cada conexión se renueva al llegar al límite de mensajes
+        por conexión y se reabre (reintentando el mensaje una vez) si el
+        servidor la cierra o falla.
+        
+        Args:
+            mensajes: Mensajes a enviar
+            conexiones: Número de conexiones simultáneas
+            antes_de_enviar: Función llamada antes de cada envío (p. ej. límite de tasa)
+            
+        Returns:
+            Resultado de cada mensaje, en el mismo orden
+        """
+        if not mensajes:
+            return []
+        
+        resultados: List[Optional[ResultadoEnvio]] = [None] * len(mensajes)
+        conexiones = max(1, min(conexiones, len(mensajes)))
+        grupos = [list(range(i, len(mensajes), conexiones)) for i in range(conexiones)]
+        
+        if conexiones == 1:
+            self._enviar_por_conexion(mensajes, grupos[0], resultados, antes_de_enviar)
+        else:
+            with ThreadPoolExecutor(max_workers=conexiones) as executor:
+                for grupo in grupos:
+                    executor.submit(self._enviar_por_conexion, mensajes, grupo, resultados, antes_de_enviar)
+        
+        enviados = sum(1 for r in resultados if r.enviado)
+        logger.info(f"✓ Lote de emails: {enviados}/{len(mensajes)} enviados ({conexiones} conexiones)")
+        return resultados
+    
+    def _enviar_por_conexion(
+        self,
+        mensajes: List[MensajeEmail],
+        indices: List[int],
+        resultados: List[Optional[ResultadoEnvio]],
+        antes_de_enviar: Optional[Callable[[], None]] = None
+    ):
+        """Enviar un grupo de mensajes por una misma conexión"""
+        server = None
+        enviados_conexion = 0
+        
+        try:
+            for i in indices:
+                mensaje = mensajes[i]
+                
+                try:
+                    msg = self._construir_mensaje(mensaje)
+                except Exception as e:
+                    resultados[i] = ResultadoEnvio(mensaje.to_email, False, str(e))
+                    continue
+                
+                for intento in range(2):
+                    try:
+                        if server is not None and enviados_conexion >= self.max_mensajes_por_conexion:
+                            self._cerrar(server)
+                            server = None
+                        if server is None:
+                            server = self._conectar()
+                            enviados_conexion = 0
+                        
+                        if antes_de_enviar:
+                            antes_de_enviar()
+                        server.send_message(msg)
+                        enviados_conexion += 1
+                        resultados[i] = ResultadoEnvio(mensaje.to_email, True)
+                        break
+                        
+                    except ERRORES_CONEXION as e:
+                        # Conexión perdida: reabrir y reintentar una vez
+                        self._cerrar(server)
+                        server = None
+                        resultados[i] = ResultadoEnvio(mensaje.to_email, False, str(e))
+                        if intento == 0:
+                            logger.warning(f"Conexión SMTP perdida ({e}), reconectando...")
+                        
+                    except smtplib.SMTPResponseException as e:
+                        # 421: el servidor cierra la sesión (p. ej. límite de mensajes)
+                        resultados[i] = ResultadoEnvio(mensaje.to_email, False, str(e))
+                        if e.smtp_code != 421:
+                            break
+                        self._cerrar(server)
+                        server = None
+                        
+                    except smtplib.SMTPException as e:
+                        # Destinatario rechazado u otro error del mensaje: no se reintenta
+                        resultados[i] = ResultadoEnvio(mensaje.to_email, False, str(e))
+                        break
+                        
+                    except OSError as e:
+                        # Error de red: reabrir y reintentar una vez
+                        self._cerrar(server)
+                        server = None
+                        resultados[i] = ResultadoEnvio(mensaje.to_email, False, str(e))
+                        
+                    except Exception as e:
+                        resultados[i] = ResultadoEnvio(mensaje.to_email, False, str(e))
+                        break
+                
+                if not resultados[i].enviado:
+                    logger.error(f"Error al enviar email a {mensaje.to_email}: {resultados[i].error}")
+        finally:
+            self._cerrar(server)
+    
     def send_nueva_subvencion(
         self,
         to_email: str,
@@ -91,23 +278,92 @@ class EmailService:
         Returns:
             True si se envió correctamente
         """
-        subject = f"🔔 Nueva subvención: {subvencion['titulo']}"
-        
-        html_content = self._render_template_nueva_subvencion(
+        mensaje = self.build_nueva_subvencion(
+            to_email=to_email,
             nombre_usuario=nombre_usuario,
             subvencion=subvencion,
             calendar_url=calendar_url,
             unsubscribe_url=unsubscribe_url
         )
         
-        text_content = self._render_text_nueva_subvencion(
+        return self.send_email(mensaje.to_email, mensaje.subject, mensaje.html_content, mensaje.text_content)
+    
+    def build_nueva_subvencion(
+        self,
+        to_email: str,
+        nombre_usuario: str,
+        subvencion: dict,
+        calendar_url: str,
+        unsubscribe_url: str,
+        fragmento: Optional[FragmentoSubvencion] = None
+    ) -> MensajeEmail:
+        """
+        Construir el mensaje de nueva subvención (para envío en lote)
+        
+        Si se pasa el fragmento ya renderizado de la subvención solo se
+        renderizan las partes personalizadas (nombre y enlace de baja).
+        """
+        fragmento = fragmento or self.render_fragmento_subvencion(subvencion, calendar_url)
+        subject = f"🔔 Nueva subvención: {subvencion['titulo']}"
+        
+        html_content = _plantilla("nueva_subvencion.html").render(
             nombre_usuario=nombre_usuario,
-            subvencion=subvencion,
+            bloque_subvencion=fragmento.html,
             calendar_url=calendar_url,
             unsubscribe_url=unsubscribe_url
         )
         
-        return self.send_email(to_email, subject, html_content, text_content)
+        text_content = f"""Hola {nombre_usuario},
+
+Nueva subvención disponible:
+
+{fragmento.texto}
+
+---
+Para cancelar tu suscripción: {unsubscribe_url}"""
+        
+        return MensajeEmail(to_email, subject, html_content, text_content)
+    
+    def render_fragmento_subvencion(self, subvencion: dict, calendar_url: str) -> FragmentoSubvencion:
+        """Renderizar el bloque de una subvención común a todos sus destinatarios"""
+        fecha_fin = subvencion.get('fecha_fin_solicitud')
+        fecha_str = fecha_fin.strftime('%d/%m/%Y') if fecha_fin else 'Por determinar'
+        
+        html = _plantilla("subvencion.html").render(subvencion=subvencion, calendar_url=calendar_url)
+        
+        texto = f"""TÍTULO: {subvencion['titulo']}
+
+ÓRGANO CONVOCANTE: {subvencion.get('organo_convocante', 'No especificado')}
+
+REGIÓN: {subvencion.get('region_nombre', 'No especificada')}
+
+PRESUPUESTO: {subvencion.get('presupuesto_total', 'No especificado')} €
+
+⏰ FECHA LÍMITE: {fecha_str}
+
+Ver más información:
+{subvencion['url_bdns']}
+
+Ver calendario:
+{calendar_url}"""
+        
+        return FragmentoSubvencion(html, texto)
+    
+    def render_fragmento_resumen(self, subvencion: dict) -> FragmentoSubvencion:
+        """Renderizar el bloque de una subvención dentro de un resumen"""
+        fecha_fin = subvencion.get('fecha_fin_solicitud')
+        fecha_str = fecha_fin.strftime('%d/%m/%Y') if fecha_fin else 'Por determinar'
+        
+        html = _plantilla("subvencion_resumen.html").render(subvencion=subvencion)
+        
+        texto = (
+            f"TÍTULO: {subvencion['titulo']}\n"
+            f"ÓRGANO CONVOCANTE: {subvencion.get('organo_convocante', 'No especificado')}\n"
+            f"⏰ FECHA LÍMITE: {fecha_str}\n"
+            f"{subvencion['url_bdns']}"
+        )
+        
+        return FragmentoSubvencion(html, texto)
     
     def send_confirmacion_suscripcion(
         self,
@@ -128,6 +384,23 @@ class EmailService:
         Returns:
             True si se envió correctamente
         """
+        mensaje = self.build_confirmacion_suscripcion(
+            to_email=to_email,
+            nombre_usuario=nombre_usuario,
+            token_confirmacion=token_confirmacion,
+            calendar_url=calendar_url
+        )
+        
+        return self.send_email(mensaje.to_email, mensaje.subject, mensaje.html_content)
+    
+    def build_confirmacion_suscripcion(
+        self,
+        to_email: str,
+        nombre_usuario: str,
+        token_confirmacion: str,
+        calendar_url: str
+    ) -> MensajeEmail:
+        """Construir el mensaje de confirmación de suscripción (para encolar)"""
         subject = "✅ Confirma tu suscripción a Subvenciones de Investigación"
         
         confirm_url = f"{settings.frontend_url}/confirmar?token={token_confirmacion}"
@@ -138,130 +411,103 @@ class EmailService:
             calendar_url=calendar_url
         )
         
-        return self.send_email(to_email, subject, html_content)
+        return MensajeEmail(to_email, subject, html_content)
     
-    def _render_template_nueva_subvencion(
+    def build_digest(
         self,
+        to_email: str,
         nombre_usuario: str,
-        subvencion: dict,
+        subvenciones: List[dict],
+        frecuencia: str,
         calendar_url: str,
-        unsubscribe_url: str
-    ) -> str:
-        """Renderizar template HTML para nueva subvención"""
-        template = Template('''
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Nueva Subvención</title>
-    <style>
-        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px; }
-        .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
-        .content { background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }
-        .subvencion { background: white; padding: 20px; border-radius: 8px; margin: 20px 0; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
-        .fecha { color: #e74c3c; font-weight: bold; font-size: 1.1em; margin: 15px 0; }
-        .button { display: inline-block; padding: 12px 30px; background: #667eea; color: white; text-decoration: none; border-radius: 5px; margin: 10px 5px; }
-        .footer { text-align: center; margin-top: 30px; color: #777; font-size: 0.9em; }
-        .info-row { margin: 10px 0; }
-        .label { font-weight: bold; color: #555; }
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1>🔔 Nueva Subvención Disponible</h1>
-    </div>
-    <div class="content">
-        <p>Hola {{ nombre_usuario }},</p>
-        <p>Hemos detectado una nueva subvención que coincide con tus intereses:</p>
-        
-        <div class="subvencion">
-            <h2>{{ subvencion.titulo }}</h2>
-            
-            {% if subvencion.descripcion %}
-            <p>{{ subvencion.descripcion }}</p>
-            {% endif %}
-            
-            <div class="info-row">
-                <span class="label">📋 Órgano convocante:</span> {{ subvencion.organo_convocante or 'No especificado' }}
-            </div>
-            
-            {% if subvencion.region_nombre %}
-            <div class="info-row">
-                <span class="label">🌍 Región:</span> {{ subvencion.region_nombre }}
-            </div>
-            {% endif %}
-            
-            {% if subvencion.presupuesto_total %}
-            <div class="info-row">
-                <span class="label">💰 Presupuesto:</span> {{ "%.2f"|format(subvencion.presupuesto_total) }} €
-            </div>
-            {% endif %}
-            
-            <div class="fecha">
-                ⏰ Fecha límite: {{ subvencion.fecha_fin_solicitud.strftime('%d/%m/%Y') if subvencion.fecha_fin_solicitud else 'Por determinar' }}
-            </div>
-            
-            <div style="text-align: center; margin-top: 20px;">
-                <a href="{{ subvencion.url_bdns }}" class="button">📄 Ver Convocatoria en BDNS</a>
-                <a href="{{ calendar_url }}" class="button">📅 Ver en Calendario</a>
-            </div>
-        </div>
-        
-        <p>Esta subvención se ha añadido automáticamente al <a href="{{ calendar_url }}">calendario compartido</a>. Recibirás recordatorios automáticos conforme se acerque la fecha límite.</p>
-    </div>
-    
-    <div class="footer">
-        <p>Este es un mensaje automático del Sistema de Notificaciones de Subvenciones.</p>
-        <p><a href="{{ unsubscribe_url }}">Cancelar suscripción</a></p>
-    </div>
-</body>
-</html>
-        ''')
-        
-        return template.render(
+        unsubscribe_url: str,
+        fragmentos: Optional[List[FragmentoSubvencion]] = None
+    ) -> MensajeEmail:
+        """
+        Construir un resumen con varias subvenciones en un único mensaje
+        
+        Args:
+            to_email: Email del destinatario
+            nombre_usuario: Nombre del usuario
+            subvenciones: Datos de las subvenciones (mismo formato que send_nueva_subvencion)
+            frecuencia: diaria o semanal
+            calendar_url: URL del calendario
+            unsubscribe_url: URL para darse de baja
+            fragmentos: Bloques ya renderizados de cada subvención (opcional)
+        """
+        if fragmentos is None:
+            fragmentos = [self.render_fragmento_resumen(s) for s in subvenciones]
+        
+        periodo = "semanal" if frecuencia == "semanal" else "diario"
+        subject = f"🔔 Resumen {periodo}: {len(fragmentos)} nuevas subvenciones"
+        
+        html_content = _plantilla("digest.html").render(
             nombre_usuario=nombre_usuario,
-            subvencion=subvencion,
+            bloques=[f.html for f in fragmentos],
+            periodo=periodo,
             calendar_url=calendar_url,
             unsubscribe_url=unsubscribe_url
         )
+        
+        text_content = f"""Hola {nombre_usuario},
+
+Resumen {periodo}: {len(fragmentos)} nuevas subvenciones
+
+""" + "\n\n".join(f.texto for f in fragmentos) + f"""
+
+Ver calendario:
+{calendar_url}
+
+---
+Para cancelar tu suscripción: {unsubscribe_url}"""
+        
+        return MensajeEmail(to_email, subject, html_content, text_content)
     
-    def _render_text_nueva_subvencion(
+    def build_recordatorio(
         self,
+        to_email: str,
         nombre_usuario: str,
-        subvencion: dict,
+        plazos: List[tuple],
         calendar_url: str,
         unsubscribe_url: str
-    ) -> str:
-        """Renderizar versión texto plano"""
-        fecha_fin = subvencion.get('fecha_fin_solicitud')
-        fecha_str = fecha_fin.strftime('%d/%m/%Y') if fecha_fin else 'Por determinar'
+    ) -> MensajeEmail:
+        """
+        Construir un recordatorio con los plazos próximos de un usuario
         
-        text = f"""
-Hola {nombre_usuario},
-
-Nueva subvención disponible:
-
-TÍTULO: {subvencion['titulo']}
-
-ÓRGANO CONVOCANTE: {subvencion.get('organo_convocante', 'No especificado')}
-
-REGIÓN: {subvencion.get('region_nombre', 'No especificada')}
-
-PRESUPUESTO: {subvencion.get('presupuesto_total', 'No especificado')} €
+        Args:
+            to_email: Email del destinatario
+            nombre_usuario: Nombre del usuario
+            plazos: Lista de (días restantes, FragmentoSubvencion), ordenada por plazo
+            calendar_url: URL del calendario
+            unsubscribe_url: URL para darse de baja
+        """
+        if len(plazos) == 1:
+            subject = f"⏰ {_texto_plazo(plazos[0][0])} una subvención de tu interés"
+        else:
+            subject = f"⏰ {len(plazos)} subvenciones de tu interés cierran pronto"
+        
+        html_content = _plantilla("recordatorio.html").render(
+            nombre_usuario=nombre_usuario,
+            bloques=[(_texto_plazo(dias), f.html) for dias, f in plazos],
+            calendar_url=calendar_url,
+            unsubscribe_url=unsubscribe_url
+        )
+        
+        text_content = f"""Hola {nombre_usuario},
 
-⏰ FECHA LÍMITE: {fecha_str}
+Plazos de solicitud que terminan pronto:
 
-Ver más información:
-{subvencion['url_bdns']}
+""" + "\n\n".join(
+            f"{_texto_plazo(dias).upper()}\n{f.texto}" for dias, f in plazos
+        ) + f"""
 
 Ver calendario:
 {calendar_url}
 
 ---
-Para cancelar tu suscripción: {unsubscribe_url}
-        """
-        return text.strip()
+Para cancelar tu suscripción: {unsubscribe_url}"""
+        
+        return MensajeEmail(to_email, subject, html_content, text_content)
     
     def _render_template_confirmacion(
         self,
@@ -270,53 +516,7 @@ Para cancelar tu suscripción: {unsubscribe_url}
         calendar_url: str
     ) -> str:
         """Renderizar template de confirmación"""
-        template = Template('''
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <style>
-        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px; }
-        .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
-        .content { background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }
-        .button { display: inline-block; padding: 15px 40px; background: #27ae60; color: white; text-decoration: none; border-radius: 5px; margin: 20px 0; font-size: 1.1em; }
-        .info { background: #e8f5e9; padding: 15px; border-left: 4px solid #27ae60; margin: 20px 0; }
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1>✅ Confirma tu Suscripción</h1>
-    </div>
-    <div class="content">
-        <p>Hola {{ nombre_usuario }},</p>
-        <p>¡Gracias por suscribirte a nuestro sistema de notificaciones de subvenciones!</p>
-        
-        <p>Para activar tu suscripción, haz clic en el siguiente botón:</p>
-        
-        <div style="text-align: center;">
-            <a href="{{ confirm_url }}" class="button">Confirmar Suscripción</a>
-        </div>
-        
-        <div class="info">
-            <h3>📅 Acceso al Calendario</h3>
-            <p>Una vez confirmada tu suscripción, podrás acceder al calendario compartido de subvenciones:</p>
-            <p><a href="{{ calendar_url }}">Ver Calendario de Subvenciones</a></p>
-        </div>
-        
-        <h3>¿Qué recibirás?</h3>
-        <ul>
-            <li>✉️ Notificaciones por email de nuevas subvenciones que coincidan con tus filtros</li>
-            <li>📅 Eventos automáticos en el calendario compartido</li>
-            <li>🔔 Recordatorios de fechas límite</li>
-        </ul>
-        
-        <p>Si no solicitaste esta suscripción, puedes ignorar este mensaje.</p>
-    </div>
-</body>
-</html>
-        ''')
-        
-        return template.render(
+        return _plantilla("confirmacion.html").render(
             nombre_usuario=nombre_usuario,
             confirm_url=confirm_url,
             calendar_url=calendar_url
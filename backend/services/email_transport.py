@@ -0,0 +1,163 @@
+"""
+Transportes de email intercambiables (SMTP, maildir, memoria, nulo)
+"""
+import mailbox
+import smtplib
+import threading
+from abc import ABC, abstractmethod
+from email.message import Message
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+from config import get_settings
+
+settings = get_settings()
+
+
+class ConexionEmail(ABC):
+    """Conexión abierta de un transporte (misma interfaz que smtplib.SMTP)"""
+    
+    @abstractmethod
+    def send_message(self, msg: Message):
+        """Enviar un mensaje por la conexión"""
+    
+    def quit(self):
+        pass
+    
+    def close(self):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.quit()
+
+
+class TransporteEmail(ABC):
+    """Transporte base: abre conexiones por las que se envían mensajes"""
+    
+    nombre = "base"
+    
+    @abstractmethod
+    def conectar(self):
+        """Abrir una conexión (ConexionEmail o smtplib.SMTP)"""
+
+
+class TransporteSMTP(TransporteEmail):
+    """Servidor SMTP (STARTTLS y login opcionales)"""
+    
+    nombre = "smtp"
+    
+    def __init__(self, host: str, port: int, user: str = "", password: str = "", starttls: bool = True):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+    
+    def conectar(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port)
+        if self.starttls:
+            server.starttls()
+        if self.user:
+            server.login(self.user, self.password)
+        return server
+
+
+class _ConexionMaildir(ConexionEmail):
+    def __init__(self, buzon: mailbox.Maildir, lock: threading.Lock):
+        self.buzon = buzon
+        self.lock = lock
+    
+    def send_message(self, msg: Message):
+        with self.lock:
+            self.buzon.add(msg)
+
+
+class TransporteMaildir(TransporteEmail):
+    """Guarda cada mensaje como fichero en un directorio Maildir"""
+    
+    nombre = "maildir"
+    
+    def __init__(self, ruta: str):
+        for subdirectorio in ("tmp", "new", "cur"):
+            (Path(ruta) / subdirectorio).mkdir(parents=True, exist_ok=True)
+        self.buzon = mailbox.Maildir(ruta, create=False)
+        self._lock = threading.Lock()
+    
+    def conectar(self) -> ConexionEmail:
+        return _ConexionMaildir(self.buzon, self._lock)
+
+
+class _ConexionMemoria(ConexionEmail):
+    def __init__(self, transporte: "TransporteMemoria"):
+        self.transporte = transporte
+    
+    def send_message(self, msg: Message):
+        with self.transporte._lock:
+            self.transporte.mensajes.append(msg)
+
+
+class TransporteMemoria(TransporteEmail):
+    """Acumula los mensajes en memoria (pruebas y benchmarks)"""
+    
+    nombre = "memoria"
+    
+    def __init__(self):
+        self.mensajes: List[Message] = []
+        self._lock = threading.Lock()
+    
+    def conectar(self) -> ConexionEmail:
+        return _ConexionMemoria(self)
+    
+    def vaciar(self):
+        with self._lock:
+            self.mensajes.clear()
+
+
+class _ConexionNula(ConexionEmail):
+    def send_message(self, msg: Message):
+        pass
+
+
+class TransporteNulo(TransporteEmail):
+    """Descarta los mensajes"""
+    
+    nombre = "nulo"
+    
+    def conectar(self) -> ConexionEmail:
+        return _ConexionNula()
+
+
+TRANSPORTES = ("smtp", "maildir", "memoria", "nulo")
+
+
+def crear_transporte(nombre: str) -> TransporteEmail:
+    """
+    Crear un transporte a partir de la configuración
+    
+    Args:
+        nombre: smtp, maildir, memoria o nulo
+    """
+    if nombre == "smtp":
+        return TransporteSMTP(
+            settings.smtp_host,
+            settings.smtp_port,
+            settings.smtp_user,
+            settings.smtp_password,
+            settings.smtp_starttls
+        )
+    if nombre == "maildir":
+        return TransporteMaildir(settings.email_maildir)
+    if nombre == "memoria":
+        return TransporteMemoria()
+    if nombre == "nulo":
+        return TransporteNulo()
+    raise ValueError(f"Transporte de email desconocido: {nombre} (opciones: {', '.join(TRANSPORTES)})")
+
+
+@lru_cache()
+def get_transporte() -> TransporteEmail:
+    """Transporte configurado en EMAIL_TRANSPORTE (uno por proceso)"""
+    return crear_transporte(settings.email_transporte)
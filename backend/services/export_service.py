@@ -0,0 +1,237 @@
+"""
+Servicio de exportación masiva de subvenciones (CSV, NDJSON y Parquet)
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Tuple
+from sqlalchemy.orm import Query
+from models.subvencion import Subvencion
+
+# Formato -> (media type, extensión)
+FORMATOS_EXPORTACION = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+COLUMNAS_EXPORTACION = [
+    "id",
+    "id_bdns",
+    "titulo",
+    "descripcion",
+    "fecha_publicacion",
+    "fecha_inicio_solicitud",
+    "fecha_fin_solicitud",
+    "finalidad_id",
+    "finalidad_nombre",
+    "region_id",
+    "region_nombre",
+    "organo_nivel1",
+    "organo_nivel2",
+    "organo_nivel3",
+    "organo_convocante",
+    "tipo_administracion",
+    "tipo_convocatoria",
+    "instrumentos",
+    "sectores",
+    "tipos_beneficiario",
+    "presupuesto_total",
+    "url_bdns",
+    "url_convocatoria",
+    "url_bases_reguladoras",
+    "url_sede_electronica",
+    "activa",
+    "created_at",
+    "updated_at",
+]
+
+# Columnas JSON que se serializan como texto en formatos tabulares
+COLUMNAS_JSON = {"instrumentos", "sectores", "tipos_beneficiario"}
+
+# Filas leídas del cursor de servidor en cada viaje a la BD
+TAMANO_LOTE = 1000
+
+
+def parquet_disponible() -> bool:
+    """Indica si pyarrow está instalado"""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def exportar(query: Query, formato: str, tamano_lote: int = TAMANO_LOTE) -> Iterator[bytes]:
+    """
+    Exportar el resultado de una consulta de subvenciones en streaming
+
+    Args:
+        query: Consulta sobre Subvencion ya filtrada y ordenada
+        formato: csv, ndjson o parquet
+        tamano_lote: Filas por lote (cursor de servidor y bloque emitido)
+
+    Returns:
+        Iterador de bloques de bytes
+    """
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+    columnas = [getattr(Subvencion, c) for c in COLUMNAS_EXPORTACION]
+    filas = query.with_entities(*columnas).yield_per(tamano_lote)
+    lotes = _agrupar(filas, tamano_lote)
+
+    if formato == "csv":
+        return _exportar_csv(lotes)
+    if formato == "ndjson":
+        return _exportar_ndjson(lotes)
+    return _exportar_parquet(lotes)
+
+
+def _agrupar(filas, tamano_lote: int) -> Iterator[List[Tuple]]:
+    """Agrupar filas en lotes de tamaño fijo"""
+    lote = []
+    for fila in filas:
+        lote.append(tuple(fila))
+        if len(lote) >= tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _valor_json(valor: Any) -> Any:
+    """Convertir valores de BD a tipos serializables en JSON"""
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+def _valor_texto(columna: str, valor: Any) -> Any:
+    """Convertir valores de BD a texto plano (CSV/Parquet)"""
+    if valor is None:
+        return None
+    if columna in COLUMNAS_JSON:
+        return json.dumps(valor, ensure_ascii=False)
+    return _valor_json(valor)
+
+
+def _exportar_csv(lotes: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNAS_EXPORTACION)
+
+    for lote in lotes:
+        for fila in lote:
+            writer.writerow([
+                "" if valor is None else _valor_texto(columna, valor)
+                for columna, valor in zip(COLUMNAS_EXPORTACION, fila)
+            ])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Cabecera si no hubo filas
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _exportar_ndjson(lotes: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    for lote in lotes:
+        lineas = [
+            json.dumps(
+                {c: _valor_json(v) for c, v in zip(COLUMNAS_EXPORTACION, fila)},
+                ensure_ascii=False
+            )
+            for fila in lote
+        ]
+        yield ("\n".join(lineas) + "\n").encode("utf-8")
+
+
+class _SumideroBytes:
+    """
+    Salida tipo fichero para pyarrow que entrega los bytes escritos por bloques.
+
+    Lleva la cuenta de la posición absoluta para que el pie del Parquet
+    tenga offsets correctos aunque el buffer se vacíe tras cada row group.
+    """
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._partes.append(data)
+        self._posicion += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _esquema_parquet():
+    import pyarrow as pa
+
+    tipos = {
+        "id": pa.int64(),
+        "finalidad_id": pa.int64(),
+        "region_id": pa.int64(),
+        "presupuesto_total": pa.float64(),
+        "activa": pa.bool_(),
+        "fecha_publicacion": pa.timestamp("us"),
+        "fecha_inicio_solicitud": pa.timestamp("us"),
+        "fecha_fin_solicitud": pa.timestamp("us"),
+        "created_at": pa.timestamp("us"),
+        "updated_at": pa.timestamp("us"),
+    }
+    return pa.schema([(c, tipos.get(c, pa.string())) for c in COLUMNAS_EXPORTACION])
+
+
+def _exportar_parquet(lotes: Iterator[List[Tuple]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = _esquema_parquet()
+    sumidero = _SumideroBytes()
+    writer = pq.ParquetWriter(pa.PythonFile(sumidero, mode="w"), esquema)
+
+    try:
+        for lote in lotes:
+            columnas: Dict[str, list] = {c: [] for c in COLUMNAS_EXPORTACION}
+            for fila in lote:
+                for columna, valor in zip(COLUMNAS_EXPORTACION, fila):
+                    if columna in ("fecha_publicacion", "fecha_inicio_solicitud", "fecha_fin_solicitud",
+                                   "created_at", "updated_at", "activa"):
+                        columnas[columna].append(valor)
+                    else:
+                        columnas[columna].append(_valor_texto(columna, valor))
+            # Cada lote es un row group independiente
+            writer.write_table(pa.table(columnas, schema=esquema))
+            yield sumidero.vaciar()
+    finally:
+        writer.close()
+
+    yield sumidero.vaciar()
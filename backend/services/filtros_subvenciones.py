@@ -0,0 +1,80 @@
+"""
+Filtros compartidos para consultas de subvenciones
+"""
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import or_
+from sqlalchemy.orm import Query
+from models.subvencion import Subvencion
+from utils.texto import normalizar_texto
+
+
+def aplicar_filtros(
+    query: Query,
+    activa: Optional[bool] = True,
+    organo: Optional[str] = None,
+    organo_ids: Optional[List[int]] = None,
+    tipo_convocatoria: Optional[str] = None,
+    instrumento: Optional[str] = None,
+    sector: Optional[str] = None,
+    finalidad: Optional[str] = None,
+    presupuesto_min: Optional[float] = None,
+    keywords: Optional[str] = None,
+) -> Query:
+    """
+    Aplicar los filtros del listado de subvenciones a una consulta.
+    Los filtros de texto comparan contra las columnas normalizadas, así
+    que no distinguen mayúsculas ni tildes.
+
+    Args:
+        query: Consulta sobre Subvencion (o columnas de Subvencion)
+        activa: Solo convocatorias abiertas
+        organo: Texto a buscar en cualquier nivel del órgano
+        organo_ids: Nodos del árbol de órganos (el nodo y sus descendientes)
+        tipo_convocatoria: Texto a buscar en el tipo de convocatoria
+        instrumento: Texto a buscar en los instrumentos de ayuda
+        sector: Texto a buscar en los sectores económicos
+        finalidad: Texto a buscar en la finalidad
+        presupuesto_min: Presupuesto mínimo
+        keywords: Palabras clave separadas por comas (título o descripción)
+
+    Returns:
+        Consulta filtrada
+    """
+    if activa:
+        query = query.filter(
+            Subvencion.activa == True,
+            Subvencion.fecha_fin_solicitud != None,
+            Subvencion.fecha_fin_solicitud >= datetime.now()
+        )
+
+    if organo:
+        query = query.filter(Subvencion.organo_norm.like(f"%{normalizar_texto(organo)}%"))
+
+    if organo_ids is not None:
+        query = query.filter(Subvencion.organo_id.in_(organo_ids))
+
+    if tipo_convocatoria:
+        query = query.filter(
+            Subvencion.tipo_convocatoria_norm.like(f"%{normalizar_texto(tipo_convocatoria)}%")
+        )
+
+    if instrumento:
+        query = query.filter(Subvencion.instrumentos.astext.ilike(f"%{instrumento}%"))
+
+    if sector:
+        query = query.filter(Subvencion.sectores.astext.ilike(f"%{sector}%"))
+
+    if finalidad:
+        query = query.filter(Subvencion.finalidad_norm.like(f"%{normalizar_texto(finalidad)}%"))
+
+    if presupuesto_min:
+        query = query.filter(Subvencion.presupuesto_total >= presupuesto_min)
+
+    if keywords:
+        keyword_list = [normalizar_texto(kw) for kw in keywords.split(',') if kw.strip()]
+        if keyword_list:
+            filters = [Subvencion.texto_norm.like(f"%{keyword}%") for keyword in keyword_list]
+            query = query.filter(or_(*filters))
+
+    return query
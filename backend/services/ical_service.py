@@ -0,0 +1,233 @@
+"""
+Servicio de feeds iCalendar (.ics) generados desde la base de datos
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Iterator, Optional, Tuple
+from sqlalchemy import false, func
+from sqlalchemy.orm import Query, Session
+from config import get_settings
+from models.catalogo import AreaTematicaFinalidad
+from models.subvencion import Subvencion
+from models.suscripcion import Suscripcion
+from services import catalogo_service
+from services.cache_service import CacheVersionada
+from services.calendar_service import evento_subvencion
+
+settings = get_settings()
+
+# Eventos por bloque leído del cursor de servidor y emitido en la respuesta
+TAMANO_LOTE = 500
+
+# Recordatorios de cada evento (días antes del cierre), igual que en Google Calendar
+AVISOS_DIAS = (7, 3, 1)
+
+PRODID = "-//Noti Subvenciones//Feed de subvenciones//ES"
+
+_cache_feeds = CacheVersionada(max_entradas=settings.ical_cache_feeds)
+
+
+def _escapar(texto: Optional[str]) -> str:
+    """Escapar un valor de texto (RFC 5545, 3.3.11)"""
+    return (
+        (texto or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _plegar(linea: str) -> str:
+    """Partir líneas de más de 75 octetos sin cortar caracteres UTF-8"""
+    codificada = linea.encode("utf-8")
+    if len(codificada) <= 75:
+        return linea + "\r\n"
+    
+    partes = []
+    actual = ""
+    limite = 75
+    for caracter in linea:
+        if len((actual + caracter).encode("utf-8")) > limite:
+            partes.append(actual)
+            actual = ""
+            limite = 74  # La continuación empieza con un espacio
+        actual += caracter
+    partes.append(actual)
+    return "\r\n ".join(partes) + "\r\n"
+
+
+def _fecha(valor: datetime) -> str:
+    return valor.strftime("%Y%m%d")
+
+
+def _fecha_hora(valor: datetime) -> str:
+    return valor.strftime("%Y%m%dT%H%M%SZ")
+
+
+def render_evento(subvencion: Subvencion) -> str:
+    """VEVENT de día completo desde el inicio de solicitud hasta el día de cierre"""
+    evento = evento_subvencion(subvencion)
+    inicio = subvencion.fecha_inicio_solicitud or subvencion.fecha_fin_solicitud
+    if inicio > subvencion.fecha_fin_solicitud:
+        inicio = subvencion.fecha_fin_solicitud
+    
+    lineas = [
+        "BEGIN:VEVENT",
+        f"UID:subvencion-{subvencion.id_bdns}@noti-subvenciones",
+        f"DTSTAMP:{_fecha_hora(subvencion.contenido_actualizado_en or subvencion.created_at or datetime.utcnow())}",
+        f"DTSTART;VALUE=DATE:{_fecha(inicio)}",
+        # DTEND es exclusivo: el día de cierre queda incluido
+        f"DTEND;VALUE=DATE:{_fecha(subvencion.fecha_fin_solicitud + timedelta(days=1))}",
+        f"SUMMARY:{_escapar(evento['summary'])}",
+        f"DESCRIPTION:{_escapar(evento['description'])}",
+    ]
+    if subvencion.url_bdns:
+        lineas.append(f"URL:{subvencion.url_bdns}")
+    lineas.append("TRANSP:TRANSPARENT")
+    
+    for dias in AVISOS_DIAS:
+        lineas.extend([
+            "BEGIN:VALARM",
+            "ACTION:DISPLAY",
+            f"DESCRIPTION:{_escapar(evento['summary'])}",
+            f"TRIGGER;RELATED=END:-P{dias + 1}D",
+            "END:VALARM",
+        ])
+    lineas.append("END:VEVENT")
+    
+    return "".join(_plegar(linea) for linea in lineas)
+
+
+def _cabecera(nombre: str) -> str:
+    lineas = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escapar(nombre)}",
+        "X-WR-TIMEZONE:Europe/Madrid",
+        "REFRESH-INTERVAL;VALUE=DURATION:PT1H",
+        "X-PUBLISHED-TTL:PT1H",
+    ]
+    return "".join(_plegar(linea) for linea in lineas)
+
+
+def _consulta_base(db: Session) -> Query:
+    """Convocatorias activas con fecha de cierre (incluye las cerradas hace poco)"""
+    desde = datetime.now() - timedelta(days=settings.ical_dias_pasados)
+    return db.query(Subvencion).filter(
+        Subvencion.activa == True,
+        Subvencion.fecha_fin_solicitud != None,
+        Subvencion.fecha_fin_solicitud >= desde
+    )
+
+
+def _filtrar_suscripcion(db: Session, query: Query, suscripcion: Suscripcion) -> Query:
+    """Aplicar en SQL los mismos filtros que coincide_con_filtros"""
+    if suscripcion.regiones:
+        query = query.filter(Subvencion.region_id.in_(suscripcion.regiones))
+    
+    if suscripcion.presupuesto_min:
+        query = query.filter(Subvencion.presupuesto_total >= suscripcion.presupuesto_min)
+    
+    if suscripcion.presupuesto_max:
+        query = query.filter(
+            Subvencion.presupuesto_total != 0,
+            Subvencion.presupuesto_total <= suscripcion.presupuesto_max
+        )
+    
+    if suscripcion.areas_tematicas:
+        mapa_areas = catalogo_service.cargar_mapa_areas(db)
+        areas = mapa_areas.filtro(suscripcion.areas_tematicas)
+        if areas is not None:
+            finalidades = mapa_areas.finalidades(areas)
+            query = query.filter(Subvencion.finalidad_id.in_(finalidades) if finalidades else false())
+    
+    return query
+
+
+def _version_subvenciones(db: Session) -> Tuple:
+    # contenido_actualizado_en y no updated_at: la publicación en Calendar
+    # actualiza cada fila sin cambiar nada de lo que se ve en el feed
+    return tuple(db.query(func.max(Subvencion.contenido_actualizado_en), func.count(Subvencion.id)).one())
+
+
+def version_feed(db: Session, suscripcion: Optional[Suscripcion] = None) -> Tuple:
+    """
+    Versión de los datos de un feed: cambia tras cada sincronización
+    (y al modificar la suscripción o el mapeo de áreas)
+    """
+    # La fecha del día mueve la ventana de convocatorias cerradas recientes
+    version = (_version_subvenciones(db), datetime.now().date())
+    if suscripcion is None:
+        return version
+    
+    asociaciones = None
+    if suscripcion.areas_tematicas:
+        asociaciones = db.query(func.count(AreaTematicaFinalidad.finalidad_id)).scalar()
+    return version + (suscripcion.updated_at, asociaciones)
+
+
+def etag(clave: Any, version: Tuple) -> str:
+    """ETag fuerte derivada de la clave y la versión del feed"""
+    return '"' + hashlib.sha1(repr((clave, version)).encode("utf-8")).hexdigest() + '"'
+
+
+def _generar(db: Session, query: Query, nombre: str, tamano_lote: int) -> Iterator[bytes]:
+    yield _cabecera(nombre).encode("utf-8")
+    
+    bloque = []
+    for subvencion in query.order_by(Subvencion.fecha_fin_solicitud.asc(), Subvencion.id.asc()).yield_per(tamano_lote):
+        bloque.append(render_evento(subvencion))
+        if len(bloque) >= tamano_lote:
+            yield "".join(bloque).encode("utf-8")
+            bloque = []
+    
+    bloque.append("END:VCALENDAR\r\n")
+    yield "".join(bloque).encode("utf-8")
+
+
+def feed(
+    db: Session,
+    clave: Any,
+    version: Tuple,
+    suscripcion: Optional[Suscripcion] = None,
+    tamano_lote: int = TAMANO_LOTE
+) -> Iterator[bytes]:
+    """
+    Contenido de un feed en streaming
+    
+    Si el feed está en cache para la versión actual se devuelve de una
+    vez; si no, se genera por bloques con un cursor de servidor y se
+    guarda en cache al terminar (solo si se ha emitido completo).
+    
+    Args:
+        db: Sesión de BD (debe seguir abierta mientras se consume)
+        clave: Clave del feed ("global" o id de suscripción)
+        version: Versión calculada con version_feed
+        suscripcion: Suscripción cuyos filtros se aplican (None = feed global)
+        tamano_lote: Eventos por bloque
+        
+    Returns:
+        Iterador de bloques de bytes
+    """
+    contenido = _cache_feeds.consultar(clave, version)
+    if contenido is not None:
+        yield contenido
+        return
+    
+    query = _consulta_base(db)
+    nombre = "Subvenciones"
+    if suscripcion is not None:
+        query = _filtrar_suscripcion(db, query, suscripcion)
+        nombre = "Subvenciones de mi suscripción"
+    
+    bloques = []
+    for bloque in _generar(db, query, nombre, tamano_lote):
+        bloques.append(bloque)
+        yield bloque
+    
+    _cache_feeds.guardar(clave, version, b"".join(bloques))
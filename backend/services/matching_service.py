@@ -0,0 +1,193 @@
+"""
+Servicio de emparejamiento de subvenciones con suscripciones
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+SIN_LIMITE_INFERIOR = Decimal("-Infinity")
+SIN_LIMITE_SUPERIOR = Decimal("Infinity")
+
+SIN_AREAS: FrozenSet[int] = frozenset()
+SIN_INDICES: FrozenSet[int] = frozenset()
+
+
+class MapaAreas:
+    """
+    Mapeo finalidad BDNS -> áreas temáticas en memoria.
+
+    Las áreas sin ninguna finalidad asociada no se pueden evaluar: una
+    suscripción cuyas áreas no tengan mapeo no filtra por área.
+    """
+
+    def __init__(self, asociaciones: Iterable[Tuple[int, int]] = ()):
+        por_finalidad: Dict[int, Set[int]] = defaultdict(set)
+        for area_id, finalidad_id in asociaciones:
+            por_finalidad[finalidad_id].add(area_id)
+
+        self._por_finalidad: Dict[int, FrozenSet[int]] = {
+            finalidad_id: frozenset(areas) for finalidad_id, areas in por_finalidad.items()
+        }
+        self.areas_mapeadas: FrozenSet[int] = frozenset().union(*self._por_finalidad.values())
+
+    def __len__(self) -> int:
+        return len(self._por_finalidad)
+
+    def areas(self, finalidad_id: Optional[int]) -> FrozenSet[int]:
+        """Áreas temáticas de una finalidad"""
+        return self._por_finalidad.get(finalidad_id, SIN_AREAS)
+
+    def filtro(self, areas_tematicas: Optional[Iterable[int]]) -> Optional[FrozenSet[int]]:
+        """Áreas evaluables de una suscripción (None = no filtra por área)"""
+        if not areas_tematicas:
+            return None
+        areas = self.areas_mapeadas.intersection(areas_tematicas)
+        return frozenset(areas) if areas else None
+
+    def finalidades(self, areas: Iterable[int]) -> Set[int]:
+        """Finalidades asociadas a alguna de las áreas"""
+        areas = frozenset(areas)
+        return {f for f, areas_finalidad in self._por_finalidad.items() if not areas.isdisjoint(areas_finalidad)}
+
+    def acepta(self, areas_tematicas: Optional[Iterable[int]], finalidad_id: Optional[int]) -> bool:
+        """Comprobar el filtro de área temática de una suscripción"""
+        filtro = self.filtro(areas_tematicas)
+        return filtro is None or not filtro.isdisjoint(self.areas(finalidad_id))
+
+
+class IndiceSuscripciones:
+    """
+    Índice invertido de suscripciones por dimensión de filtro.
+
+    Replica exactamente coincide_con_filtros, pero en lugar de evaluar cada
+    suscripción contra cada subvención indexa cada dimensión:
+    - región: diccionario region_id -> suscripciones (más las que no
+      filtran por región),
+    - presupuesto: índices ordenados por límite inferior y por límite
+      superior; con bisect se obtienen las suscripciones con min <= importe
+      y las que tienen max >= importe,
+    - área temática: diccionario finalidad -> suscripciones cuyas áreas
+      incluyen alguna de las de esa finalidad (más las que no filtran por
+      área).
+
+    Para cada subvención se parte de los candidatos de la dimensión más
+    selectiva y se intersecan con los de las otras dos.
+
+    Se construye una vez por ejecución con las suscripciones activas.
+    """
+
+    def __init__(self, suscripciones: Iterable[Any], mapa_areas: Optional[MapaAreas] = None):
+        self.suscripciones: List[Any] = list(suscripciones)
+        self.mapa_areas = mapa_areas or MapaAreas()
+
+        self._por_region: Dict[Any, Set[int]] = defaultdict(set)
+        self._sin_region: Set[int] = set()
+        self._por_finalidad: Dict[int, Set[int]] = defaultdict(set)
+        self._sin_area: Set[int] = set()
+        self._sin_presupuesto: Set[int] = set()
+        self._minimos: List[Decimal] = []
+        self._maximos: List[Decimal] = []
+
+        for i, suscripcion in enumerate(self.suscripciones):
+            if suscripcion.regiones:
+                for region_id in suscripcion.regiones:
+                    self._por_region[region_id].add(i)
+            else:
+                self._sin_region.add(i)
+
+            # Un límite a 0/None equivale a "sin límite" (igual que coincide_con_filtros)
+            self._minimos.append(suscripcion.presupuesto_min or SIN_LIMITE_INFERIOR)
+            self._maximos.append(suscripcion.presupuesto_max or SIN_LIMITE_SUPERIOR)
+
+            if not suscripcion.presupuesto_min and not suscripcion.presupuesto_max:
+                self._sin_presupuesto.add(i)
+
+            areas = self.mapa_areas.filtro(suscripcion.areas_tematicas)
+            if areas is None:
+                self._sin_area.add(i)
+            else:
+                for finalidad_id in self.mapa_areas.finalidades(areas):
+                    self._por_finalidad[finalidad_id].add(i)
+
+        # Índices ordenados por cada límite, sus claves (para bisect) y la
+        # posición de cada suscripción en ese orden: min <= importe equivale a
+        # posición < bisect_right y max >= importe a posición >= bisect_left
+        self._orden_minimo = sorted(range(len(self.suscripciones)), key=self._minimos.__getitem__)
+        self._claves_minimo = [self._minimos[i] for i in self._orden_minimo]
+        self._orden_maximo = sorted(range(len(self.suscripciones)), key=self._maximos.__getitem__)
+        self._claves_maximo = [self._maximos[i] for i in self._orden_maximo]
+        self._posicion_minimo = [0] * len(self.suscripciones)
+        self._posicion_maximo = [0] * len(self.suscripciones)
+        for posicion, i in enumerate(self._orden_minimo):
+            self._posicion_minimo[i] = posicion
+        for posicion, i in enumerate(self._orden_maximo):
+            self._posicion_maximo[i] = posicion
+
+    def __len__(self) -> int:
+        return len(self.suscripciones)
+
+    def _por_presupuesto(self, presupuesto) -> Tuple[int, int]:
+        """
+        Límites del presupuesto en los órdenes por mínimo y por máximo
+
+        Returns:
+            (hasta, desde): aceptan el importe las suscripciones con
+            _posicion_minimo < hasta y _posicion_maximo >= desde
+        """
+        return (
+            bisect_right(self._claves_minimo, presupuesto),
+            bisect_left(self._claves_maximo, presupuesto),
+        )
+
+    def coincidentes(self, subvencion: Any) -> List[Any]:
+        """
+        Suscripciones cuyos filtros acepta la subvención
+
+        Args:
+            subvencion: Subvención (u objeto con region_id, presupuesto_total y finalidad_id)
+
+        Returns:
+            Suscripciones coincidentes, en el orden original
+        """
+        presupuesto = subvencion.presupuesto_total
+        # (sin filtro, con el valor de la subvención): conjuntos disjuntos
+        dimensiones = sorted(
+            [
+                (self._sin_region, self._por_region.get(subvencion.region_id, SIN_INDICES)),
+                (self._sin_area, self._por_finalidad.get(subvencion.finalidad_id, SIN_INDICES)),
+            ],
+            key=lambda dimension: len(dimension[0]) + len(dimension[1])
+        )
+        if presupuesto:
+            hasta, desde = self._por_presupuesto(presupuesto)
+            tamano_presupuesto = min(hasta, len(self) - desde)
+        else:
+            tamano_presupuesto = len(self._sin_presupuesto)
+
+        # Se parte de la dimensión más selectiva y se intersecan las demás
+        if tamano_presupuesto > len(dimensiones[0][0]) + len(dimensiones[0][1]):
+            sin_filtro, con_valor = dimensiones.pop(0)
+            indices = sin_filtro | con_valor
+        elif not presupuesto:
+            indices = set(self._sin_presupuesto)
+        elif hasta <= len(self) - desde:
+            indices = set(self._orden_minimo[:hasta])
+        else:
+            indices = set(self._orden_maximo[desde:])
+
+        for sin_filtro, con_valor in dimensiones:
+            indices = (indices & sin_filtro) | (indices & con_valor)
+
+        if presupuesto:
+            minimo, maximo = self._posicion_minimo, self._posicion_maximo
+            indices = [i for i in indices if minimo[i] < hasta and maximo[i] >= desde]
+        else:
+            indices &= self._sin_presupuesto
+
+        return [self.suscripciones[i] for i in sorted(indices)]
+
+    def emparejar(self, subvenciones: Iterable[Any]) -> Iterator[Tuple[Any, List[Any]]]:
+        """Suscripciones coincidentes de cada subvención"""
+        for subvencion in subvenciones:
+            yield subvencion, self.coincidentes(subvencion)
@@ -0,0 +1,144 @@
+"""
+Emparejamiento vectorizado (NumPy) de suscripciones con subvenciones
+
+Para cargas iniciales y resincronizaciones completas, donde el producto
+suscripciones × subvenciones llega a millones de pares.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from services.matching_service import MapaAreas
+
+# Celdas (suscripciones × subvenciones) evaluadas por bloque
+CELDAS_POR_BLOQUE = 2_000_000
+
+
+class MatrizSuscripciones:
+    """
+    Suscripciones codificadas en columnas NumPy.
+
+    - Región: matriz booleana suscripción × región (vocabulario de las
+      regiones usadas en las suscripciones) y vector "sin región".
+    - Presupuesto: límites [min, max] en float64 (-inf/+inf sin límite).
+      Numeric(15, 2) tiene como máximo 15 cifras significativas, que
+      float64 representa sin alterar el orden ni la igualdad.
+    - Área temática: máscara de bits (palabras uint64) sobre las áreas con
+      finalidades asociadas; la subvención aporta la máscara de su finalidad.
+
+    Evalúa la matriz de coincidencias completa por bloques de subvenciones
+    y produce exactamente los mismos pares que coincide_con_filtros.
+    """
+
+    def __init__(self, suscripciones: Iterable[Any], mapa_areas: Optional[MapaAreas] = None):
+        self.suscripciones: List[Any] = list(suscripciones)
+        self.mapa_areas = mapa_areas or MapaAreas()
+        n = len(self.suscripciones)
+
+        self._columna_region: Dict[Any, int] = {}
+        for suscripcion in self.suscripciones:
+            for region_id in suscripcion.regiones or ():
+                self._columna_region.setdefault(region_id, len(self._columna_region))
+
+        self._bit_area: Dict[int, int] = {
+            area_id: bit for bit, area_id in enumerate(sorted(self.mapa_areas.areas_mapeadas))
+        }
+        self._palabras = max(1, (len(self._bit_area) + 63) // 64)
+
+        self._regiones = np.zeros((n, len(self._columna_region)), dtype=bool)
+        self._sin_region = np.zeros(n, dtype=bool)
+        self._con_limite = np.zeros(n, dtype=bool)
+        self._minimos = np.full(n, -np.inf)
+        self._maximos = np.full(n, np.inf)
+        self._areas = np.zeros((n, self._palabras), dtype=np.uint64)
+
+        for i, suscripcion in enumerate(self.suscripciones):
+            if suscripcion.regiones:
+                for region_id in suscripcion.regiones:
+                    self._regiones[i, self._columna_region[region_id]] = True
+            else:
+                self._sin_region[i] = True
+
+            # Un límite a 0/None equivale a "sin límite" (igual que coincide_con_filtros)
+            if suscripcion.presupuesto_min:
+                self._con_limite[i] = True
+                self._minimos[i] = float(suscripcion.presupuesto_min)
+            if suscripcion.presupuesto_max:
+                self._con_limite[i] = True
+                self._maximos[i] = float(suscripcion.presupuesto_max)
+
+            filtro = self.mapa_areas.filtro(suscripcion.areas_tematicas)
+            if filtro:
+                self._areas[i] = self._mascara(filtro)
+
+        self._sin_area = ~self._areas.any(axis=1)
+
+    def __len__(self) -> int:
+        return len(self.suscripciones)
+
+    def _mascara(self, areas: Iterable[int]) -> np.ndarray:
+        mascara = np.zeros(self._palabras, dtype=np.uint64)
+        for area_id in areas:
+            bit = self._bit_area.get(area_id)
+            if bit is not None:
+                mascara[bit // 64] |= np.uint64(1) << np.uint64(bit % 64)
+        return mascara
+
+    def matriz(self, subvenciones: List[Any]) -> np.ndarray:
+        """
+        Matriz booleana de coincidencias
+
+        Args:
+            subvenciones: Subvenciones (region_id, presupuesto_total, finalidad_id)
+
+        Returns:
+            Array (suscripciones × subvenciones)
+        """
+        n, m = len(self.suscripciones), len(subvenciones)
+
+        # Región: columna de la región de cada subvención (-1 = ninguna suscripción la pide)
+        columnas = np.array([self._columna_region.get(s.region_id, -1) for s in subvenciones], dtype=np.intp)
+        region = np.zeros((n, m), dtype=bool)
+        conocidas = columnas >= 0
+        region[:, conocidas] = self._regiones[:, columnas[conocidas]]
+        region |= self._sin_region[:, None]
+
+        # Presupuesto: sin presupuesto (None/0) -> NaN, que no cumple ningún límite
+        presupuestos = np.array(
+            [float(s.presupuesto_total) if s.presupuesto_total else np.nan for s in subvenciones],
+            dtype=np.float64
+        )
+        dentro = (self._minimos[:, None] <= presupuestos[None, :]) & (presupuestos[None, :] <= self._maximos[:, None])
+        presupuesto = ~self._con_limite[:, None] | dentro
+
+        # Área temática: intersección de máscaras de bits
+        mascaras = np.stack([self._mascara(self.mapa_areas.areas(s.finalidad_id)) for s in subvenciones])
+        if self._palabras == 1:
+            comunes = (self._areas[:, 0, None] & mascaras[None, :, 0]) != 0
+        else:
+            comunes = ((self._areas[:, None, :] & mascaras[None, :, :]) != 0).any(axis=2)
+        area = self._sin_area[:, None] | comunes
+
+        return region & presupuesto & area
+
+    def emparejar(self, subvenciones: List[Any]) -> Iterator[Tuple[Any, List[Any]]]:
+        """
+        Suscripciones coincidentes de cada subvención, evaluadas por bloques
+
+        Args:
+            subvenciones: Subvenciones a emparejar
+
+        Returns:
+            Iterador de (subvención, suscripciones coincidentes en el orden original)
+        """
+        if not self.suscripciones:
+            for subvencion in subvenciones:
+                yield subvencion, []
+            return
+
+        tamano = max(1, CELDAS_POR_BLOQUE // len(self.suscripciones))
+
+        for inicio in range(0, len(subvenciones), tamano):
+            bloque = subvenciones[inicio:inicio + tamano]
+            coincidencias = np.ascontiguousarray(self.matriz(bloque).T)
+
+            for j, subvencion in enumerate(bloque):
+                yield subvencion, [self.suscripciones[i] for i in np.flatnonzero(coincidencias[j])]
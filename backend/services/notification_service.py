@@ -0,0 +1,253 @@
+"""
+Servicio de registro de notificaciones (deduplicación en bloque)
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from sqlalchemy import String, and_, cast, false, or_, tuple_, update
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.orm import Session
+from config import get_settings
+from models.notificacion_enviada import NotificacionEnviada
+from models.suscripcion import Suscripcion
+from models.usuario import Usuario
+
+settings = get_settings()
+
+# Filas por sentencia en inserciones/consultas masivas
+TAMANO_LOTE = 1000
+
+Par = Tuple[int, int]  # (usuario_id, subvencion_id)
+
+
+def _lotes(elementos: List, tamano: int = TAMANO_LOTE) -> Iterable[List]:
+    for i in range(0, len(elementos), tamano):
+        yield elementos[i:i + tamano]
+
+
+def _filtro_region(region_ids: Set[int]):
+    """Suscripciones sin filtro de región o que incluyen alguna región del lote"""
+    sin_region = or_(
+        Suscripcion.regiones == None,
+        cast(Suscripcion.regiones, String).in_(["null", "[]"])
+    )
+    if not region_ids:
+        return sin_region
+    return or_(sin_region, *[
+        cast(Suscripcion.regiones, JSONB).contains([region_id])
+        for region_id in sorted(region_ids)
+    ])
+
+
+def _filtro_presupuesto(presupuestos: List[Any], hay_sin_presupuesto: bool):
+    """
+    Suscripciones cuyo intervalo [min, max] puede aceptar algún presupuesto del lote
+
+    Es un prefiltro (intersección con [mínimo, máximo] del lote): la
+    comprobación exacta la hace después el índice de suscripciones.
+    """
+    sin_minimo = or_(Suscripcion.presupuesto_min == None, Suscripcion.presupuesto_min == 0)
+    sin_maximo = or_(Suscripcion.presupuesto_max == None, Suscripcion.presupuesto_max == 0)
+
+    condiciones = []
+    if hay_sin_presupuesto:
+        condiciones.append(and_(sin_minimo, sin_maximo))
+    if presupuestos:
+        condiciones.append(and_(
+            or_(sin_minimo, Suscripcion.presupuesto_min <= max(presupuestos)),
+            or_(sin_maximo, Suscripcion.presupuesto_max >= min(presupuestos))
+        ))
+
+    return or_(*condiciones) if condiciones else false()
+
+
+def cargar_destinatarios(db: Session, subvenciones: List[Any], tamano_lote: int = TAMANO_LOTE) -> Iterator[List[Any]]:
+    """
+    Suscripciones que pueden recibir alguna subvención del lote, por bloques
+
+    Una sola consulta con JOIN a usuarios (sin N+1): filtra en SQL
+    usuarios confirmados y activos, suscripciones activas con email y
+    los filtros de región y presupuesto expresables en SQL, y carga solo
+    las columnas necesarias para el emparejamiento y el envío.
+
+    Args:
+        db: Sesión de BD
+        subvenciones: Subvenciones del lote (region_id, presupuesto_total)
+        tamano_lote: Filas por bloque
+
+    Returns:
+        Iterador de listas de filas (id, usuario_id, filtros, frecuencia_email, email, nombre)
+    """
+    if not subvenciones:
+        return
+
+    region_ids = {s.region_id for s in subvenciones if s.region_id is not None}
+    presupuestos = [s.presupuesto_total for s in subvenciones if s.presupuesto_total]
+    hay_sin_presupuesto = len(presupuestos) < len(subvenciones)
+
+    query = db.query(
+        Suscripcion.id,
+        Suscripcion.usuario_id,
+        Suscripcion.regiones,
+        Suscripcion.areas_tematicas,
+        Suscripcion.presupuesto_min,
+        Suscripcion.presupuesto_max,
+        Suscripcion.tipos_beneficiario,
+        Suscripcion.frecuencia_email,
+        Usuario.email,
+        Usuario.nombre
+    ).join(
+        Usuario, Usuario.id == Suscripcion.usuario_id
+    ).filter(
+        Suscripcion.activa == True,
+        Suscripcion.notificar_email == True,
+        Usuario.confirmado == True,
+        Usuario.activo == True,
+        _filtro_region(region_ids),
+        _filtro_presupuesto(presupuestos, hay_sin_presupuesto)
+    ).order_by(Suscripcion.id)
+
+    lote = []
+    for fila in query.yield_per(tamano_lote):
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def cargar_notificadas(db: Session, subvencion_ids: List[int], tipo: str = "email") -> Set[Par]:
+    """
+    Pares (usuario, subvención) ya notificados para un lote de subvenciones
+
+    Args:
+        db: Sesión de BD
+        subvencion_ids: IDs de las subvenciones del lote
+        tipo: Tipo de notificación
+
+    Returns:
+        Conjunto de pares (usuario_id, subvencion_id) con envío correcto
+    """
+    notificadas: Set[Par] = set()
+
+    for lote in _lotes(list(set(subvencion_ids))):
+        filas = db.query(NotificacionEnviada.usuario_id, NotificacionEnviada.subvencion_id).filter(
+            NotificacionEnviada.subvencion_id.in_(lote),
+            NotificacionEnviada.tipo == tipo,
+            NotificacionEnviada.enviada == True
+        ).all()
+        notificadas.update((u, s) for u, s in filas)
+
+    return notificadas
+
+
+def reservar_notificaciones(db: Session, pares: List[Par], tipo: str = "email") -> Dict[Par, int]:
+    """
+    Reservar pares (usuario, subvención) antes de enviar.
+
+    Inserta los registros en bloque con ON CONFLICT DO NOTHING sobre la
+    restricción única (usuario_id, subvencion_id, tipo): si otra
+    sincronización ya ha reservado un par, no se devuelve y no se envía
+    dos veces. Se vuelven a reservar, para reintentarlos:
+    - los pares que fallaron definitivamente en una ejecución anterior
+      (enviada = false con error y sin email en la bandeja de salida),
+    - las reservas abandonadas: más antiguas que
+      NOTIFICACIONES_RESERVA_MINUTOS sin email ni entrega programada (el
+      proceso que las hizo murió antes de encolar el mensaje).
+
+    Args:
+        db: Sesión de BD
+        pares: Pares (usuario_id, subvencion_id) a notificar
+        tipo: Tipo de notificación
+
+    Returns:
+        Diccionario par -> id de NotificacionEnviada reservado
+    """
+    reservadas: Dict[Par, int] = {}
+    pares = list(dict.fromkeys(pares))
+    ahora = datetime.utcnow()
+    caducidad = ahora - timedelta(minutes=settings.notificaciones_reserva_minutos)
+
+    for lote in _lotes(pares):
+        stmt = insert(NotificacionEnviada).values([
+            {"usuario_id": u, "subvencion_id": s, "tipo": tipo, "enviada": False, "reservada_en": ahora}
+            for u, s in lote
+        ]).on_conflict_do_nothing(
+            constraint="uq_notificaciones_usuario_subvencion_tipo"
+        ).returning(
+            NotificacionEnviada.id,
+            NotificacionEnviada.usuario_id,
+            NotificacionEnviada.subvencion_id
+        )
+        reservadas.update({(u, s): i for i, u, s in db.execute(stmt)})
+
+    restantes = [par for par in pares if par not in reservadas]
+    for lote in _lotes(restantes):
+        stmt = update(NotificacionEnviada).where(
+            tuple_(NotificacionEnviada.usuario_id, NotificacionEnviada.subvencion_id).in_(lote),
+            NotificacionEnviada.tipo == tipo,
+            NotificacionEnviada.enviada == False,
+            NotificacionEnviada.email_id == None,
+            or_(
+                NotificacionEnviada.error != None,
+                and_(
+                    NotificacionEnviada.programada_para == None,
+                    or_(NotificacionEnviada.reservada_en == None, NotificacionEnviada.reservada_en < caducidad)
+                )
+            )
+        ).values(error=None, programada_para=None, reservada_en=ahora).returning(
+            NotificacionEnviada.id,
+            NotificacionEnviada.usuario_id,
+            NotificacionEnviada.subvencion_id
+        ).execution_options(synchronize_session=False)
+        reservadas.update({(u, s): i for i, u, s in db.execute(stmt)})
+
+    # Confirmar ya para que otras ejecuciones vean la reserva
+    db.commit()
+    return reservadas
+
+
+def registrar_resultados(db: Session, resultados: List[Dict]):
+    """
+    Guardar en bloque el resultado de los envíos reservados
+
+    Args:
+        db: Sesión de BD
+        resultados: Diccionarios con id, enviada, fecha_envio y error
+    """
+    for lote in _lotes(resultados):
+        db.execute(update(NotificacionEnviada), lote)
+    db.commit()
+
+
+def vincular_emails(db: Session, emails: Dict[int, int]):
+    """
+    Asociar notificaciones reservadas con su email en la bandeja de salida
+
+    Args:
+        db: Sesión de BD
+        emails: Diccionario id de notificación -> id de EmailPendiente
+    """
+    asignaciones = [{"id": n, "email_id": e} for n, e in emails.items()]
+    for lote in _lotes(asignaciones):
+        db.execute(update(NotificacionEnviada), lote)
+    db.commit()
+
+
+def programar(db: Session, entregas: Dict[int, datetime], suscripciones: Optional[Dict[int, int]] = None):
+    """
+    Aplazar notificaciones reservadas hasta el próximo resumen del usuario
+
+    Args:
+        db: Sesión de BD
+        entregas: Diccionario id de notificación -> fecha de entrega
+        suscripciones: Diccionario id de notificación -> id de la suscripción que pidió el resumen
+    """
+    suscripciones = suscripciones or {}
+    asignaciones = [
+        {"id": n, "programada_para": f, "suscripcion_id": suscripciones.get(n)}
+        for n, f in entregas.items()
+    ]
+    for lote in _lotes(asignaciones):
+        db.execute(update(NotificacionEnviada), lote)
+    db.commit()
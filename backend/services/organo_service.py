@@ -0,0 +1,206 @@
+"""
+Servicio del árbol de órganos convocantes
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from loguru import logger
+from sqlalchemy import distinct, func
+from sqlalchemy.orm import Session
+from models.organo import Organo
+from models.subvencion import Subvencion
+from services.cache_service import CacheVersionada
+from utils.texto import normalizar_texto
+
+_cache_arbol = CacheVersionada(max_entradas=1)
+
+
+def niveles_organo(subvencion: Subvencion) -> List[str]:
+    """Niveles jerárquicos de una subvención (o el órgano convocante si no los tiene)"""
+    niveles = [
+        n.strip() for n in (subvencion.organo_nivel1, subvencion.organo_nivel2, subvencion.organo_nivel3)
+        if n and n.strip()
+    ]
+    if not niveles and subvencion.organo_convocante:
+        niveles = [subvencion.organo_convocante.strip()]
+    return niveles
+
+
+def clave_organo(niveles: List[str]) -> str:
+    """Clave normalizada de un nodo a partir de su ruta de niveles"""
+    return "/".join(normalizar_texto(n) for n in niveles)
+
+
+def esta_abierta(subvencion: Subvencion, ahora: Optional[datetime] = None) -> bool:
+    """Convocatoria activa con plazo de solicitud abierto"""
+    ahora = ahora or datetime.now()
+    return bool(
+        subvencion.activa is not False
+        and subvencion.fecha_fin_solicitud
+        and subvencion.fecha_fin_solicitud >= ahora
+    )
+
+
+def registrar_organo(db: Session, subvencion: Subvencion) -> Optional[Organo]:
+    """
+    Enlazar una subvención nueva con su nodo del árbol de órganos.
+    Crea los nodos que falten y actualiza los conteos de la rama.
+
+    Args:
+        db: Sesión de BD
+        subvencion: Subvención recién insertada
+
+    Returns:
+        Nodo más específico o None si la subvención no tiene órgano
+    """
+    niveles = niveles_organo(subvencion)
+    if not niveles:
+        return None
+
+    abierta = esta_abierta(subvencion)
+    padre = None
+
+    for i, nombre in enumerate(niveles):
+        clave = clave_organo(niveles[:i + 1])
+        nodo = db.query(Organo).filter(Organo.clave == clave).first()
+
+        if not nodo:
+            nodo = Organo(
+                clave=clave,
+                nombre=nombre,
+                nivel=i + 1,
+                padre_id=padre.id if padre else None,
+                num_convocatorias=0,
+                num_abiertas=0
+            )
+            db.add(nodo)
+            db.flush()
+
+        nodo.num_convocatorias = (nodo.num_convocatorias or 0) + 1
+        if abierta:
+            nodo.num_abiertas = (nodo.num_abiertas or 0) + 1
+        padre = nodo
+
+    subvencion.organo_id = padre.id
+    return padre
+
+
+def recalcular_conteos(db: Session):
+    """
+    Recalcular los conteos de todos los nodos con una única agregación.
+    Necesario para descontar las convocatorias cuyo plazo ha vencido.
+    """
+    ahora = datetime.now()
+    filas = db.query(
+        Subvencion.organo_id,
+        func.count(Subvencion.id),
+        func.count(Subvencion.id).filter(
+            Subvencion.activa == True,
+            Subvencion.fecha_fin_solicitud >= ahora
+        )
+    ).filter(Subvencion.organo_id != None).group_by(Subvencion.organo_id).all()
+
+    nodos = {n.id: n for n in db.query(Organo).all()}
+    totales = {nodo_id: [0, 0] for nodo_id in nodos}
+
+    for organo_id, total, abiertas in filas:
+        nodo_id = organo_id
+        while nodo_id is not None and nodo_id in nodos:
+            totales[nodo_id][0] += total
+            totales[nodo_id][1] += abiertas
+            nodo_id = nodos[nodo_id].padre_id
+
+    for nodo_id, (total, abiertas) in totales.items():
+        nodo = nodos[nodo_id]
+        if nodo.num_convocatorias != total or nodo.num_abiertas != abiertas:
+            nodo.num_convocatorias = total
+            nodo.num_abiertas = abiertas
+
+    db.commit()
+
+
+def reconstruir_arbol(db: Session) -> int:
+    """
+    Enlazar con el árbol todas las subvenciones sin nodo y recalcular conteos
+
+    Returns:
+        Número de subvenciones enlazadas
+    """
+    enlazadas = 0
+    pendientes = db.query(Subvencion).filter(Subvencion.organo_id == None).all()
+
+    for subvencion in pendientes:
+        if registrar_organo(db, subvencion):
+            enlazadas += 1
+
+    db.commit()
+    recalcular_conteos(db)
+    logger.info(f"✓ Árbol de órganos reconstruido ({enlazadas} subvenciones enlazadas)")
+    return enlazadas
+
+
+def _version_arbol(db: Session):
+    return tuple(db.query(func.max(Organo.updated_at), func.count(Organo.id)).one())
+
+
+def _construir_arbol(db: Session) -> Dict[str, Any]:
+    nodos = db.query(Organo).order_by(Organo.nivel, Organo.nombre).all()
+
+    por_id: Dict[int, Dict[str, Any]] = {}
+    raices: List[Dict[str, Any]] = []
+    descendientes: Dict[int, Set[int]] = {}
+
+    for nodo in nodos:
+        por_id[nodo.id] = {
+            "id": nodo.id,
+            "clave": nodo.clave,
+            "nombre": nodo.nombre,
+            "nivel": nodo.nivel,
+            "num_convocatorias": nodo.num_convocatorias or 0,
+            "num_abiertas": nodo.num_abiertas or 0,
+            "hijos": [],
+        }
+        descendientes[nodo.id] = {nodo.id}
+
+    for nodo in nodos:
+        if nodo.padre_id in por_id:
+            por_id[nodo.padre_id]["hijos"].append(por_id[nodo.id])
+        else:
+            raices.append(por_id[nodo.id])
+
+    # Los nodos vienen ordenados por nivel: recorrer de hojas a raíces
+    for nodo in reversed(nodos):
+        if nodo.padre_id in descendientes:
+            descendientes[nodo.padre_id] |= descendientes[nodo.id]
+
+    return {
+        "raices": raices,
+        "descendientes": descendientes,
+        "nombres": sorted({n.nombre for n in nodos}),
+    }
+
+
+def obtener_arbol(db: Session) -> Dict[str, Any]:
+    """Árbol de órganos cacheado hasta que cambie la tabla de órganos"""
+    return _cache_arbol.obtener("arbol", _version_arbol(db), lambda: _construir_arbol(db))
+
+
+def nombres_organos(db: Session) -> List[str]:
+    """
+    Nombres de órganos convocantes para los filtros (nivel 1, 2, 3 y el más específico)
+
+    Se leen del árbol cacheado. Mientras el árbol está vacío (recién migrado,
+    antes de reconstruir_arbol) se calculan con DISTINCT sobre subvenciones.
+    """
+    nombres = obtener_arbol(db)["nombres"]
+    if nombres:
+        return nombres
+
+    valores = set()
+    for columna in (Subvencion.organo_nivel1, Subvencion.organo_nivel2, Subvencion.organo_nivel3, Subvencion.organo_convocante):
+        valores.update(v for (v,) in db.query(distinct(columna)).filter(columna != None, columna != '').all())
+    return sorted(valores)
+
+
+def ids_descendientes(db: Session, organo_id: int) -> List[int]:
+    """IDs del nodo y todos sus descendientes (vacío si no existe)"""
+    return sorted(obtener_arbol(db)["descendientes"].get(organo_id, set()))
@@ -0,0 +1,229 @@
+"""
+Servicio de bandeja de salida de emails (envío asíncrono con reintentos)
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from loguru import logger
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from config import get_settings
+from database import SessionLocal
+from models.email_pendiente import EmailPendiente
+from models.notificacion_enviada import NotificacionEnviada
+from services.email_service import EmailService, MensajeEmail
+from tasks.leader import sigue_siendo_lider
+
+settings = get_settings()
+
+# Tiempo que un worker retiene un email reclamado; si muere, otro lo retoma al expirar
+DURACION_RESERVA = timedelta(minutes=10)
+
+# Espera máxima entre reintentos
+BACKOFF_MAXIMO = timedelta(hours=6)
+
+
+class LimitadorTasa:
+    """Cubo de fichas compartido por todos los hilos que envían a un proveedor"""
+    
+    def __init__(self, por_segundo: float, rafaga: Optional[float] = None):
+        self.por_segundo = por_segundo
+        self.capacidad = rafaga or max(1.0, por_segundo)
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def esperar(self):
+        """Bloquear hasta que haya una ficha disponible"""
+        if self.por_segundo <= 0:
+            return
+        
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.por_segundo)
+                self._ultimo = ahora
+                
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                
+                espera = (1 - self._fichas) / self.por_segundo
+            
+            time.sleep(espera)
+
+
+_limitadores: Dict[str, LimitadorTasa] = {}
+_limitadores_lock = threading.Lock()
+
+
+def limitador_proveedor(proveedor: str) -> LimitadorTasa:
+    """Limitador de tasa del proveedor SMTP (uno por proceso)"""
+    with _limitadores_lock:
+        if proveedor not in _limitadores:
+            _limitadores[proveedor] = LimitadorTasa(settings.outbox_max_por_segundo)
+        return _limitadores[proveedor]
+
+
+def encolar(db: Session, mensajes: List[MensajeEmail], tipo: Optional[str] = None) -> List[int]:
+    """
+    Añadir mensajes a la bandeja de salida (no confirma la transacción)
+    
+    Args:
+        db: Sesión de BD
+        mensajes: Mensajes a enviar
+        tipo: Tipo de email (para estadísticas)
+        
+    Returns:
+        IDs de los emails encolados, en el mismo orden
+    """
+    emails = [
+        EmailPendiente(
+            tipo=tipo,
+            destinatario=m.to_email,
+            asunto=m.subject,
+            html=m.html_content,
+            texto=m.text_content,
+            estado="pendiente",
+            intentos=0,
+            proximo_intento=datetime.utcnow()
+        )
+        for m in mensajes
+    ]
+    db.add_all(emails)
+    db.flush()
+    return [e.id for e in emails]
+
+
+def _reclamar(db: Session, limite: int) -> List[EmailPendiente]:
+    """
+    Reclamar emails listos para enviar sin bloquear a otros workers
+    
+    La sesión debe tener expire_on_commit=False: las instancias devueltas
+    conservan los valores leídos y no se recargan una a una tras el commit.
+    """
+    ahora = datetime.utcnow()
+    
+    emails = db.query(EmailPendiente).filter(
+        EmailPendiente.estado.in_(["pendiente", "enviando"]),
+        EmailPendiente.proximo_intento <= ahora
+    ).order_by(
+        EmailPendiente.proximo_intento
+    ).limit(limite).with_for_update(skip_locked=True).populate_existing().all()
+    
+    for email in emails:
+        email.estado = "enviando"
+        email.proximo_intento = ahora + DURACION_RESERVA
+    
+    db.commit()
+    return emails
+
+
+def _backoff(intentos: int) -> timedelta:
+    return min(BACKOFF_MAXIMO, timedelta(seconds=settings.outbox_backoff_segundos * 2 ** (intentos - 1)))
+
+
+def _registrar_envios(db: Session, emails: List[EmailPendiente], envios):
+    """Guardar el resultado de un lote en la bandeja y en sus notificaciones"""
+    ahora = datetime.utcnow()
+    enviados = []
+    
+    for email, envio in zip(emails, envios):
+        email.intentos = (email.intentos or 0) + 1
+        
+        if envio.enviado:
+            email.estado = "enviado"
+            email.fecha_envio = ahora
+            email.error = None
+            enviados.append(email.id)
+            continue
+        
+        error = (envio.error or "Error al enviar email")[:500]
+        email.error = error
+        
+        if email.intentos >= settings.outbox_max_intentos:
+            # Fallo definitivo: se desvincula para que la próxima sincronización lo reintente
+            email.estado = "error"
+            db.execute(
+                update(NotificacionEnviada)
+                .where(NotificacionEnviada.email_id == email.id)
+                .values(error=error, email_id=None)
+                .execution_options(synchronize_session=False)
+            )
+            logger.error(f"✗ Email {email.id} a {email.destinatario} descartado tras {email.intentos} intentos: {error}")
+        else:
+            email.estado = "pendiente"
+            email.proximo_intento = ahora + _backoff(email.intentos)
+            db.execute(
+                update(NotificacionEnviada)
+                .where(NotificacionEnviada.email_id == email.id)
+                .values(error=error)
+                .execution_options(synchronize_session=False)
+            )
+    
+    if enviados:
+        db.execute(
+            update(NotificacionEnviada)
+            .where(NotificacionEnviada.email_id.in_(enviados))
+            .values(enviada=True, fecha_envio=ahora, error=None)
+            .execution_options(synchronize_session=False)
+        )
+    
+    db.commit()
+    return len(enviados)
+
+
+def procesar_outbox(max_lotes: Optional[int] = None) -> Dict[str, int]:
+    """
+    Vaciar la bandeja de salida
+    
+    Reclama lotes con SELECT ... FOR UPDATE SKIP LOCKED (varias réplicas
+    pueden procesar la bandeja a la vez), los envía con un pool de
+    conexiones SMTP limitado por el cubo de fichas del proveedor y
+    reprograma los fallos con espera exponencial.
+    
+    Args:
+        max_lotes: Número máximo de lotes a procesar (None = hasta vaciar)
+        
+    Returns:
+        Estadísticas {procesados, enviados, fallidos}
+    """
+    db = SessionLocal(expire_on_commit=False)
+    email_service = EmailService()
+    limitador = limitador_proveedor(settings.smtp_host)
+    procesados = enviados = lotes = 0
+    
+    try:
+        while (max_lotes is None or lotes < max_lotes) and sigue_siendo_lider():
+            emails = _reclamar(db, settings.outbox_tamano_lote)
+            if not emails:
+                break
+            
+            mensajes = [MensajeEmail(e.destinatario, e.asunto, e.html, e.texto) for e in emails]
+            envios = email_service.send_batch(
+                mensajes,
+                conexiones=settings.outbox_workers,
+                antes_de_enviar=limitador.esperar
+            )
+            
+            enviados += _registrar_envios(db, emails, envios)
+            db.expunge_all()
+            procesados += len(emails)
+            lotes += 1
+        
+        if procesados:
+            logger.info(f"📤 Bandeja de salida: {enviados}/{procesados} emails enviados")
+        
+    except Exception as e:
+        logger.error(f"Error al procesar la bandeja de salida: {e}")
+        db.rollback()
+    finally:
+        db.close()
+    
+    return {"procesados": procesados, "enviados": enviados, "fallidos": procesados - enviados}
+
+
+def estadisticas(db: Session) -> Dict[str, int]:
+    """Número de emails por estado"""
+    return dict(db.query(EmailPendiente.estado, func.count(EmailPendiente.id)).group_by(EmailPendiente.estado).all())
@@ -0,0 +1,250 @@
+"""
+Servicio de recordatorios de fecha límite (7, 3 y 1 días antes del cierre)
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from sqlalchemy import event, inspect, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from config import get_settings
+from database import SessionLocal
+from models.recordatorio import Recordatorio
+from models.subvencion import Subvencion
+from models.suscripcion import Suscripcion
+from models.usuario import Usuario
+from services import outbox_service
+from services.calendar_service import get_calendar_url
+from services.digest_service import datos_subvencion
+from services.email_service import EmailService
+from tasks.leader import sigue_siendo_lider
+
+settings = get_settings()
+
+TAMANO_LOTE_INSERCION = 1000
+
+
+def fechas_recordatorio(fecha_fin: Optional[datetime], ahora: Optional[datetime] = None) -> List[Tuple[int, datetime]]:
+    """
+    Recordatorios futuros de un plazo
+    
+    Args:
+        fecha_fin: Fecha fin de solicitud
+        ahora: Momento de referencia (por defecto ahora, UTC)
+        
+    Returns:
+        Lista de (días antes, fecha programada)
+    """
+    if not fecha_fin:
+        return []
+    
+    ahora = ahora or datetime.utcnow()
+    hora = time(hour=settings.recordatorios_hora)
+    
+    fechas = []
+    for dias in sorted(set(settings.recordatorios_dias), reverse=True):
+        programada = datetime.combine(fecha_fin.date() - timedelta(days=dias), hora)
+        if programada > ahora:
+            fechas.append((dias, programada))
+    return fechas
+
+
+def crear_recordatorios(db: Session, pares: Iterable[Tuple[int, Subvencion]]) -> int:
+    """
+    Programar los recordatorios de los pares (usuario, subvención) emparejados
+    
+    Inserta en bloque con ON CONFLICT sobre (usuario_id, subvencion_id,
+    dias_antes): reprogramar un par ya existente no duplica recordatorios,
+    pero actualiza la fecha de los que siguen pendientes (el plazo puede
+    haber cambiado desde que se crearon).
+    
+    Args:
+        db: Sesión de BD
+        pares: Pares (usuario_id, subvención)
+        
+    Returns:
+        Número de recordatorios solicitados
+    """
+    ahora = datetime.utcnow()
+    filas = [
+        {"usuario_id": usuario_id, "subvencion_id": subvencion.id, "dias_antes": dias,
+         "fecha_programada": programada, "estado": "pendiente"}
+        for usuario_id, subvencion in pares
+        for dias, programada in fechas_recordatorio(subvencion.fecha_fin_solicitud, ahora)
+    ]
+    
+    for i in range(0, len(filas), TAMANO_LOTE_INSERCION):
+        stmt = insert(Recordatorio).values(filas[i:i + TAMANO_LOTE_INSERCION])
+        db.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_recordatorios_usuario_subvencion_dias",
+                set_={"fecha_programada": stmt.excluded.fecha_programada},
+                where=Recordatorio.estado == "pendiente"
+            )
+        )
+    db.commit()
+    return len(filas)
+
+
+def reprogramar_recordatorios(conexion: Connection, subvencion_id: int, fecha_fin: Optional[datetime]):
+    """
+    Mover los recordatorios pendientes de una subvención a su nuevo plazo
+    
+    Si la subvención se queda sin fecha de cierre se descartan.
+    
+    Args:
+        conexion: Conexión de la transacción en curso
+        subvencion_id: ID de la subvención
+        fecha_fin: Nueva fecha fin de solicitud
+    """
+    pendientes = (Recordatorio.subvencion_id == subvencion_id, Recordatorio.estado == "pendiente")
+    
+    if not fecha_fin:
+        conexion.execute(update(Recordatorio).where(*pendientes).values(estado="descartado"))
+        return
+    
+    hora = time(hour=settings.recordatorios_hora)
+    for dias in set(settings.recordatorios_dias):
+        conexion.execute(
+            update(Recordatorio).where(*pendientes, Recordatorio.dias_antes == dias).values(
+                fecha_programada=datetime.combine(fecha_fin.date() - timedelta(days=dias), hora)
+            )
+        )
+
+
+@event.listens_for(Subvencion, "after_update")
+def _reprogramar_si_cambia_plazo(mapper, connection, target):
+    """Cualquier cambio de fecha_fin_solicitud (sincronización, admin...) mueve los recordatorios"""
+    if inspect(target).attrs.fecha_fin_solicitud.history.has_changes():
+        reprogramar_recordatorios(connection, target.id, target.fecha_fin_solicitud)
+
+
+def _reclamar(db: Session, limite: int) -> List[Recordatorio]:
+    """Recordatorios vencidos, por el índice (estado, fecha_programada)"""
+    return db.query(Recordatorio).filter(
+        Recordatorio.estado == "pendiente",
+        Recordatorio.fecha_programada <= datetime.utcnow()
+    ).order_by(
+        Recordatorio.fecha_programada
+    ).limit(limite).with_for_update(skip_locked=True).all()
+
+
+def procesar_recordatorios(max_lotes: Optional[int] = None) -> Dict[str, int]:
+    """
+    Encolar los recordatorios vencidos: un email por usuario con todos sus plazos
+    
+    Se descartan los recordatorios de subvenciones cerradas o inactivas,
+    de usuarios sin suscripción activa y los atrasados de un plazo que ya
+    tiene un recordatorio más próximo en el mismo lote.
+    
+    Args:
+        max_lotes: Número máximo de lotes a procesar (None = todos los vencidos)
+        
+    Returns:
+        Estadísticas {emails, recordatorios, descartados}
+    """
+    db = SessionLocal()
+    email_service = EmailService()
+    calendar_url = get_calendar_url()
+    ahora = datetime.utcnow()
+    total_emails = total_recordatorios = total_descartados = lotes = 0
+    fragmentos = {}
+    
+    try:
+        while (max_lotes is None or lotes < max_lotes) and sigue_siendo_lider():
+            recordatorios = _reclamar(db, settings.recordatorios_tamano_lote)
+            if not recordatorios:
+                break
+            lotes += 1
+            
+            usuario_ids = {r.usuario_id for r in recordatorios}
+            subvenciones = {s.id: s for s in db.query(Subvencion).filter(
+                Subvencion.id.in_({r.subvencion_id for r in recordatorios})
+            ).all()}
+            usuarios = {u.id: u for u in db.query(Usuario).filter(
+                Usuario.id.in_(usuario_ids),
+                Usuario.confirmado == True,
+                Usuario.activo == True
+            ).all()}
+            # Suscripción activa más antigua de cada usuario (para el enlace de baja)
+            suscripcion_usuario = dict(db.query(Suscripcion.usuario_id, Suscripcion.id).filter(
+                Suscripcion.usuario_id.in_(usuario_ids),
+                Suscripcion.activa == True,
+                Suscripcion.notificar_email == True
+            ).order_by(Suscripcion.id.desc()).all())
+            
+            # Usuario -> subvención -> recordatorios (puede haber varios atrasados del mismo plazo)
+            por_usuario = defaultdict(lambda: defaultdict(list))
+            descartados = []
+            
+            for recordatorio in recordatorios:
+                subvencion = subvenciones.get(recordatorio.subvencion_id)
+                vigente = (
+                    subvencion is not None
+                    and subvencion.activa
+                    and subvencion.fecha_fin_solicitud
+                    and subvencion.fecha_fin_solicitud.date() >= ahora.date()
+                )
+                if not vigente or recordatorio.usuario_id not in usuarios or recordatorio.usuario_id not in suscripcion_usuario:
+                    descartados.append(recordatorio)
+                    continue
+                por_usuario[recordatorio.usuario_id][recordatorio.subvencion_id].append(recordatorio)
+            
+            mensajes = []
+            grupos = []
+            
+            for usuario_id, por_subvencion in por_usuario.items():
+                usuario = usuarios[usuario_id]
+                plazos = []
+                enviados = []
+                
+                for subvencion_id, pendientes in por_subvencion.items():
+                    # Solo el recordatorio más próximo al cierre; los atrasados se descartan
+                    pendientes.sort(key=lambda r: r.dias_antes)
+                    enviados.append(pendientes[0])
+                    descartados.extend(pendientes[1:])
+                    
+                    subvencion = subvenciones[subvencion_id]
+                    if subvencion_id not in fragmentos:
+                        fragmentos[subvencion_id] = email_service.render_fragmento_resumen(datos_subvencion(subvencion))
+                    plazos.append(((subvencion.fecha_fin_solicitud.date() - ahora.date()).days, fragmentos[subvencion_id]))
+                
+                plazos.sort(key=lambda p: p[0])
+                mensajes.append(email_service.build_recordatorio(
+                    to_email=usuario.email,
+                    nombre_usuario=usuario.nombre,
+                    plazos=plazos,
+                    calendar_url=calendar_url,
+                    unsubscribe_url=f"{calendar_url}?unsubscribe={suscripcion_usuario[usuario_id]}"
+                ))
+                grupos.append(enviados)
+            
+            email_ids = outbox_service.encolar(db, mensajes, tipo="recordatorio")
+            for enviados, email_id in zip(grupos, email_ids):
+                for recordatorio in enviados:
+                    recordatorio.estado = "encolado"
+                    recordatorio.email_id = email_id
+            for recordatorio in descartados:
+                recordatorio.estado = "descartado"
+            
+            db.commit()
+            
+            total_emails += len(mensajes)
+            total_recordatorios += sum(len(enviados) for enviados in grupos)
+            total_descartados += len(descartados)
+        
+        if total_emails or total_descartados:
+            logger.success(
+                f"✓ {total_emails} emails de recordatorio encolados "
+                f"({total_recordatorios} plazos, {total_descartados} descartados)"
+            )
+        
+    except Exception as e:
+        logger.error(f"Error al procesar recordatorios: {e}")
+        db.rollback()
+    finally:
+        db.close()
+    
+    return {"emails": total_emails, "recordatorios": total_recordatorios, "descartados": total_descartados}
@@ -0,0 +1,289 @@
+"""
+Elección de líder para el scheduler (advisory lock de PostgreSQL)
+
+Cada proceso que arranca el scheduler intenta coger un advisory lock de
+sesión con una conexión dedicada. El que lo consigue es el líder y
+ejecuta los jobs; el resto los tiene en pausa y reintenta cada
+SCHEDULER_LIDER_INTERVALO_SEGUNDOS. Si el líder muere, PostgreSQL libera
+el lock al cerrarse su conexión y otra réplica toma el relevo en el
+siguiente intento.
+
+Pausar el scheduler no para un job que ya está en marcha, así que cada
+job se envuelve con solo_lider(): no arranca si el proceso no es el
+líder, mantiene mientras dura un lock propio del job (dos réplicas no
+ejecutan nunca el mismo job a la vez, aunque coincidan durante el
+relevo) y los bucles por lotes consultan sigue_siendo_lider() antes de
+reclamar el siguiente lote.
+"""
+import os
+import socket
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from config import get_settings
+from database import engine
+
+settings = get_settings()
+
+# Clave del advisory lock (cabe en 32 bits: classid = 0, objid = clave)
+CLAVE_LOCK = 727301
+
+# Prefijo del application_name de la conexión que mantiene el lock
+PREFIJO_APLICACION = "noti-subvenciones-lider"
+
+# Job del scheduler en ejecución en este hilo (lo marca solo_lider)
+_contexto = threading.local()
+
+
+def identidad_proceso() -> str:
+    """Host y PID del proceso (visible en pg_stat_activity)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ElectorLider:
+    """Mantiene (o intenta conseguir) el liderazgo en un hilo de fondo"""
+    
+    def __init__(self, clave: int = CLAVE_LOCK):
+        self.clave = clave
+        self.identidad = identidad_proceso()
+        self.es_lider = False
+        self.lider_desde: Optional[datetime] = None
+        self._conexion: Optional[Connection] = None
+        self._al_ganar: Optional[Callable[[], None]] = None
+        self._al_perder: Optional[Callable[[], None]] = None
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+    
+    def iniciar(self, al_ganar: Callable[[], None], al_perder: Callable[[], None]):
+        """Arrancar el hilo de elección"""
+        self._al_ganar = al_ganar
+        self._al_perder = al_perder
+        
+        # Sin PostgreSQL no hay advisory locks: un solo proceso, siempre líder
+        if engine.dialect.name != "postgresql":
+            logger.warning("⚠️ Elección de líder no disponible sin PostgreSQL: este proceso ejecuta los jobs")
+            self._ganar()
+            return
+        
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="eleccion-lider", daemon=True)
+        self._hilo.start()
+    
+    def detener(self):
+        """Parar el hilo y liberar el lock (cerrar la conexión lo suelta)"""
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=settings.scheduler_lider_intervalo_segundos + 5)
+            self._hilo = None
+        self._perder()
+    
+    def _bucle(self):
+        while not self._parar.is_set():
+            try:
+                if self.es_lider:
+                    self._comprobar()
+                else:
+                    self._intentar()
+            except Exception as e:
+                logger.error(f"Error en la elección de líder: {e}")
+                self._perder()
+            self._parar.wait(settings.scheduler_lider_intervalo_segundos)
+    
+    def _intentar(self):
+        if self._conexion is None:
+            self._conexion = engine.connect()
+            self._conexion.execute(
+                text("SELECT set_config('application_name', :nombre, false)"),
+                {"nombre": f"{PREFIJO_APLICACION}:{self.identidad}"[:63]}
+            )
+            self._conexion.commit()
+        
+        conseguido = self._conexion.execute(
+            text("SELECT pg_try_advisory_lock(:clave)"), {"clave": self.clave}
+        ).scalar()
+        self._conexion.commit()
+        
+        if conseguido:
+            self._ganar()
+    
+    def _comprobar(self):
+        """El lock vive mientras viva la conexión: si se cae, se pierde el liderazgo"""
+        sigue = self._conexion.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' "
+                "AND classid = 0 AND objid = :clave AND objsubid = 1 "
+                "AND pid = pg_backend_pid() AND granted)"
+            ),
+            {"clave": self.clave}
+        ).scalar()
+        self._conexion.commit()
+        
+        if not sigue:
+            logger.warning("⚠️ Lock de líder perdido")
+            self._perder()
+    
+    def _ganar(self):
+        self.es_lider = True
+        self.lider_desde = datetime.utcnow()
+        logger.info(f"👑 Este proceso es el líder del scheduler ({self.identidad})")
+        if self._al_ganar:
+            self._al_ganar()
+    
+    def _perder(self):
+        era_lider = self.es_lider
+        self.es_lider = False
+        self.lider_desde = None
+        
+        if self._conexion is not None:
+            try:
+                self._conexion.invalidate()
+                self._conexion.close()
+            except Exception:
+                pass
+            self._conexion = None
+        
+        if era_lider:
+            logger.info(f"Este proceso deja de ser el líder del scheduler ({self.identidad})")
+            if self._al_perder:
+                self._al_perder()
+    
+    def estado(self) -> Dict[str, Any]:
+        """Estado de este proceso"""
+        return {
+            "identidad": self.identidad,
+            "es_lider": self.es_lider,
+            "lider_desde": self.lider_desde.isoformat() if self.lider_desde else None,
+        }
+
+
+elector = ElectorLider()
+
+
+def sigue_siendo_lider() -> bool:
+    """
+    ¿Puede el job en curso seguir con el siguiente lote?
+    
+    Fuera de un job envuelto con solo_lider() (endpoints de admin, scripts)
+    siempre es True.
+    """
+    if not getattr(_contexto, "requiere_lider", False):
+        return True
+    if not elector.es_lider:
+        logger.warning(f"⚠️ Liderazgo perdido: se interrumpe el job {_contexto.job}")
+        return False
+    return True
+
+
+def clave_job(nombre: str) -> int:
+    """Clave del advisory lock de un job (objid de 31 bits a partir del nombre)"""
+    return zlib.crc32(nombre.encode()) & 0x7FFFFFFF
+
+
+@contextmanager
+def lock_job(nombre: str) -> Iterator[bool]:
+    """
+    Lock exclusivo de un job mientras se ejecuta
+    
+    Es un advisory lock de sesión (classid = CLAVE_LOCK, objid = clave del
+    job) en una conexión dedicada: los jobs hacen commit tras cada lote,
+    así que un lock de transacción se soltaría en el primer commit. Si el
+    proceso muere, PostgreSQL lo libera al cerrarse la conexión.
+    
+    Args:
+        nombre: Identificador del job
+        
+    Yields:
+        True si se consiguió el lock (False: otra réplica lo está ejecutando)
+    """
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    
+    parametros = {"clase": CLAVE_LOCK, "clave": clave_job(nombre)}
+    conexion = engine.connect()
+    try:
+        conseguido = conexion.execute(
+            text("SELECT pg_try_advisory_lock(:clase, :clave)"), parametros
+        ).scalar()
+        conexion.commit()
+        try:
+            yield bool(conseguido)
+        finally:
+            if conseguido:
+                try:
+                    conexion.execute(text("SELECT pg_advisory_unlock(:clase, :clave)"), parametros)
+                    conexion.commit()
+                except Exception:
+                    pass  # Conexión caída: el lock ya se soltó con ella
+    finally:
+        conexion.close()
+
+
+def solo_lider(nombre: str, funcion: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Envolver un job del scheduler para que solo lo ejecute el líder
+    
+    El job se salta si el proceso no es el líder o si otra réplica todavía
+    tiene su lock (p. ej. el líder anterior terminando su último lote).
+    
+    Args:
+        nombre: Identificador del job (el id del scheduler)
+        funcion: Job a envolver
+    """
+    @wraps(funcion)
+    def job(*args, **kwargs):
+        if settings.scheduler_eleccion_lider and not elector.es_lider:
+            logger.info(f"Job {nombre} omitido: este proceso no es el líder")
+            return None
+        
+        with lock_job(nombre) as conseguido:
+            if not conseguido:
+                logger.warning(f"⚠️ Job {nombre} omitido: otra réplica lo está ejecutando")
+                return None
+            
+            _contexto.job = nombre
+            _contexto.requiere_lider = settings.scheduler_eleccion_lider
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                _contexto.requiere_lider = False
+                _contexto.job = None
+    
+    return job
+
+
+def lider_actual(db) -> Optional[Dict[str, Any]]:
+    """
+    Proceso que tiene el lock según PostgreSQL (None si no hay líder)
+    
+    Args:
+        db: Sesión de BD
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return elector.estado() if elector.es_lider else None
+    
+    fila = db.execute(
+        text(
+            "SELECT a.pid, a.application_name, a.client_addr, a.backend_start "
+            "FROM pg_locks l JOIN pg_stat_activity a ON a.pid = l.pid "
+            "WHERE l.locktype = 'advisory' AND l.classid = 0 AND l.objid = :clave "
+            "AND l.objsubid = 1 AND l.granted"
+        ),
+        {"clave": CLAVE_LOCK}
+    ).first()
+    
+    if fila is None:
+        return None
+    
+    return {
+        "identidad": fila.application_name.removeprefix(f"{PREFIJO_APLICACION}:"),
+        "pid_postgres": fila.pid,
+        "client_addr": str(fila.client_addr) if fila.client_addr else None,
+        "conectado_desde": fila.backend_start.isoformat() if fila.backend_start else None,
+    }
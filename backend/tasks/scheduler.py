@@ -3,9 +3,15 @@ Scheduler de tareas programadas
 """
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from loguru import logger
 from config import get_settings
 from tasks.sync_subvenciones import sync_subvenciones_task
+from services.outbox_service import procesar_outbox
+from services.digest_service import procesar_digests
+from services.recordatorio_service import procesar_recordatorios
+from services.calendar_publicacion_service import procesar_calendar, reconciliar_calendar
+from tasks.leader import elector, solo_lider
 
 settings = get_settings()
 
@@ -17,7 +23,7 @@ def start_scheduler():
     if not scheduler.running:
         # Tarea diaria de sincronización
         scheduler.add_job(
-            sync_subvenciones_task,
+            solo_lider("sync_subvenciones", sync_subvenciones_task),
             trigger=CronTrigger(
                 hour=settings.scheduler_hour,
                 minute=settings.scheduler_minute
@@ -27,17 +33,91 @@ def start_scheduler():
             replace_existing=True
         )
         
-        scheduler.start()
+        # Workers de la bandeja de salida de emails
+        scheduler.add_job(
+            solo_lider("procesar_outbox", procesar_outbox),
+            trigger=IntervalTrigger(seconds=settings.outbox_intervalo_segundos),
+            id="procesar_outbox",
+            name="Enviar emails de la bandeja de salida",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
+        # Publicación en Google Calendar (independiente de la sincronización)
+        scheduler.add_job(
+            solo_lider("procesar_calendar", procesar_calendar),
+            trigger=IntervalTrigger(seconds=settings.calendar_intervalo_segundos),
+            id="procesar_calendar",
+            name="Publicar subvenciones en Google Calendar",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
+        # Reconciliación completa con Calendar (red de seguridad de la cola)
+        scheduler.add_job(
+            solo_lider("reconciliar_calendar", reconciliar_calendar),
+            trigger=CronTrigger(hour=settings.calendar_reconciliacion_hora, minute=30),
+            id="reconciliar_calendar",
+            name="Reconciliar eventos de Google Calendar",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
+        # Resúmenes diarios/semanales (cada hora se encolan los que han vencido)
+        scheduler.add_job(
+            solo_lider("procesar_digests", procesar_digests),
+            trigger=CronTrigger(minute=5),
+            id="procesar_digests",
+            name="Encolar resúmenes de notificaciones",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
+        # Recordatorios de fecha límite (cada hora se encolan los vencidos)
+        scheduler.add_job(
+            solo_lider("procesar_recordatorios", procesar_recordatorios),
+            trigger=CronTrigger(minute=15),
+            id="procesar_recordatorios",
+            name="Encolar recordatorios de fecha límite",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        
+        if settings.scheduler_eleccion_lider:
+            # Jobs en pausa hasta que este proceso gane la elección de líder
+            scheduler.start(paused=True)
+            elector.iniciar(al_ganar=scheduler.resume, al_perder=scheduler.pause)
+        else:
+            scheduler.start()
         logger.info(f"✓ Scheduler iniciado - Tarea diaria a las {settings.scheduler_hour:02d}:{settings.scheduler_minute:02d}")
 
 
 def stop_scheduler():
-    """Detener scheduler"""
+    """Detener scheduler (y ceder el liderazgo)"""
     if scheduler.running:
+        if settings.scheduler_eleccion_lider:
+            elector.detener()
         scheduler.shutdown()
         logger.info("✓ Scheduler detenido")
 
 
+def estado_jobs():
+    """Próxima ejecución de cada job en este proceso"""
+    return [
+        {
+            "id": job.id,
+            "nombre": job.name,
+            "proxima_ejecucion": job.next_run_time.isoformat() if job.next_run_time else None
+        }
+        for job in scheduler.get_jobs()
+    ]
+
+
 def run_task_now():
     """Ejecutar tarea inmediatamente (para testing)"""
     logger.info("Ejecutando tarea manualmente...")
@@ -0,0 +1,423 @@
+"""
+Sincronización de subvenciones por etapas (productor/consumidor)
+
+    listar páginas → obtener detalles → filtrar → persistir → notificar
+
+Cada etapa es un grupo de tareas asyncio conectado a la siguiente por una
+cola acotada (SYNC_TAMANO_COLA), así que las etapas se solapan: mientras
+se descargan los detalles de una página ya se está pidiendo la siguiente,
+y las primeras subvenciones se guardan y notifican antes de terminar el
+listado. Si una etapa va lenta, la cola se llena y frena a la anterior.
+
+El trabajo de base de datos (síncrono) se ejecuta con asyncio.to_thread y
+sesiones propias para no bloquear el bucle de eventos.
+"""
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from loguru import logger
+
+from config import get_settings
+from database import SessionLocal
+from models.subvencion import Subvencion
+from services.bdns_service import BDNSService
+from tasks.leader import sigue_siendo_lider
+from utils.memoria import MedidorRSS
+from tasks.sync_subvenciones import (
+    FECHA_DESDE,
+    FECHA_HASTA,
+    FINALIDAD_IDI,
+    enviar_notificaciones,
+    filtrar_convocatoria,
+    guardar_subvenciones,
+)
+
+settings = get_settings()
+
+# Tamaño de página del listado de BDNS
+TAMANO_PAGINA = 100
+
+# Marca de fin de datos en las colas
+FIN = object()
+
+
+@dataclass
+class EstadisticasEtapa:
+    """Contadores de una etapa del pipeline"""
+    nombre: str
+    concurrencia: int = 1
+    entradas: int = 0
+    salidas: int = 0
+    errores: int = 0
+    ocupado: float = 0.0  # Segundos de trabajo sumando todos los workers
+    inicio: Optional[float] = None
+    fin: Optional[float] = None
+
+    @property
+    def duracion(self) -> float:
+        if self.inicio is None:
+            return 0.0
+        return (self.fin or time.perf_counter()) - self.inicio
+
+    @property
+    def por_segundo(self) -> float:
+        """Elementos de salida por segundo de vida de la etapa"""
+        return self.salidas / self.duracion if self.duracion else 0.0
+
+    @property
+    def utilizacion(self) -> float:
+        """Fracción del tiempo en que los workers estuvieron trabajando (no esperando a la cola)"""
+        disponible = self.duracion * self.concurrencia
+        return self.ocupado / disponible if disponible else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "concurrencia": self.concurrencia,
+            "entradas": self.entradas,
+            "salidas": self.salidas,
+            "errores": self.errores,
+            "segundos": round(self.duracion, 3),
+            "por_segundo": round(self.por_segundo, 2),
+            "utilizacion": round(self.utilizacion, 3),
+        }
+
+
+@dataclass
+class ResultadoPipeline:
+    """Resultado de una ejecución del pipeline"""
+    etapas: Dict[str, EstadisticasEtapa]
+    guardadas: List[int] = field(default_factory=list)  # IDs de las subvenciones guardadas
+    segundos: float = 0.0
+    rss_inicio_mb: Optional[float] = None
+    rss_pico_mb: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "guardadas": len(self.guardadas),
+            "segundos": round(self.segundos, 3),
+            "rss_inicio_mb": self.rss_inicio_mb,
+            "rss_pico_mb": self.rss_pico_mb,
+            "etapas": {nombre: e.to_dict() for nombre, e in self.etapas.items()},
+        }
+
+
+def _tamano(elemento: Any) -> int:
+    """Los lotes cuentan por el número de subvenciones que llevan"""
+    return len(elemento) if isinstance(elemento, list) else 1
+
+
+async def _etapa(
+    stats: EstadisticasEtapa,
+    entrada: asyncio.Queue,
+    salida: Optional[asyncio.Queue],
+    procesar: Callable[[Any], Awaitable[Any]],
+):
+    """
+    Ejecutar `stats.concurrencia` workers que consumen de `entrada` y
+    publican en `salida` lo que devuelva `procesar` (None = descartado).
+    Al terminar todos los workers se propaga FIN a la siguiente etapa.
+    """
+    async def worker():
+        while True:
+            elemento = await entrada.get()
+            if elemento is FIN:
+                # Devolverlo para que lo vean el resto de workers
+                entrada.put_nowait(FIN)
+                return
+
+            stats.entradas += _tamano(elemento)
+            t0 = time.perf_counter()
+            try:
+                resultado = await procesar(elemento)
+            except Exception as e:
+                stats.errores += 1
+                logger.error(f"Error en la etapa {stats.nombre}: {e}")
+                continue
+            finally:
+                stats.ocupado += time.perf_counter() - t0
+
+            if resultado is not None:
+                stats.salidas += _tamano(resultado)
+                if salida is not None:
+                    await salida.put(resultado)
+
+    stats.inicio = time.perf_counter()
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(stats.concurrencia):
+                tg.create_task(worker())
+    finally:
+        stats.fin = time.perf_counter()
+
+    if salida is not None:
+        await salida.put(FIN)
+
+
+def _ids_existentes(ids: List[str]) -> Set[str]:
+    """IDs BDNS que ya están en la BD (una consulta por página)"""
+    db = SessionLocal()
+    try:
+        filas = db.query(Subvencion.id_bdns).filter(Subvencion.id_bdns.in_(ids)).all()
+        return {id_bdns for (id_bdns,) in filas}
+    finally:
+        db.close()
+
+
+def _guardar_lote(lote: List[Dict[str, Any]]) -> List[int]:
+    """
+    Guardar un lote con su propia sesión y devolver los IDs
+
+    La sesión se abre y se cierra en el mismo hilo: si se cancela la etapa
+    mientras el hilo guarda, nadie la cierra por debajo.
+    """
+    db = SessionLocal()
+    try:
+        return [s.id for s in guardar_subvenciones(db, lote)]
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _notificar_lote(ids: List[int]):
+    """Cargar un lote de subvenciones recién guardadas y notificarlo"""
+    db = SessionLocal()
+    try:
+        subvenciones = db.query(Subvencion).filter(Subvencion.id.in_(ids)).all()
+        enviar_notificaciones(db, subvenciones)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class PipelineSync:
+    """Pipeline de sincronización con BDNS; una instancia por ejecución"""
+
+    def __init__(self, bdns: Optional[BDNSService] = None, notificar: bool = True):
+        self.bdns = bdns or BDNSService()
+        self.notificar = notificar
+        self.vistos: Set[str] = set()
+        self.guardadas: List[int] = []
+        self.etapas = {
+            "listar": EstadisticasEtapa("listar", settings.sync_concurrencia_listado),
+            "detalles": EstadisticasEtapa("detalles", settings.sync_concurrencia_detalles),
+            "filtrar": EstadisticasEtapa("filtrar", 1),
+            "persistir": EstadisticasEtapa("persistir", 1),
+            "notificar": EstadisticasEtapa("notificar", settings.sync_concurrencia_notificacion),
+        }
+
+    async def _pedir_pagina(self, page: int) -> Dict[str, Any]:
+        return await self.bdns.get_convocatorias(
+            finalidad=FINALIDAD_IDI,
+            fecha_desde=FECHA_DESDE.date(),
+            fecha_hasta=FECHA_HASTA.date(),
+            page=page,
+            page_size=TAMANO_PAGINA
+        )
+
+    async def _nuevas_de_pagina(self, page: int, resultado: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Convocatorias de la página que no están en la BD ni se han visto en esta ejecución"""
+        convocatorias = resultado.get("convocatorias", [])
+        logger.info(f"📦 Página {page}: {len(convocatorias)} convocatorias")
+
+        candidatas = {}
+        for conv in convocatorias:
+            id_bdns = str(conv.get("numeroConvocatoria") or "")
+            if id_bdns and id_bdns not in self.vistos:
+                self.vistos.add(id_bdns)
+                candidatas[id_bdns] = conv
+
+        if not candidatas:
+            return []
+        existentes = await asyncio.to_thread(_ids_existentes, list(candidatas))
+        return [conv for id_bdns, conv in candidatas.items() if id_bdns not in existentes]
+
+    async def _listar(self, salida: asyncio.Queue):
+        """
+        Etapa 1: la primera página da el total y el resto se piden en paralelo.
+        Si BDNS no informa del total se sigue página a página.
+        """
+        stats = self.etapas["listar"]
+
+        async def publicar(page: int, resultado: Dict[str, Any]):
+            stats.entradas += 1
+            nuevas = await self._nuevas_de_pagina(page, resultado)
+            stats.salidas += len(nuevas)
+            for conv in nuevas:
+                await salida.put(conv)
+
+        async def pedir(page: int) -> Optional[Dict[str, Any]]:
+            """Pedir y publicar una página (None si falla: se registra y se sigue)"""
+            t0 = time.perf_counter()
+            try:
+                resultado = await self._pedir_pagina(page)
+            except Exception as e:
+                stats.errores += 1
+                logger.error(f"Error al obtener la página {page} de BDNS: {e}")
+                return None
+            finally:
+                stats.ocupado += time.perf_counter() - t0
+            try:
+                await publicar(page, resultado)
+            except Exception as e:
+                stats.errores += 1
+                logger.error(f"Error al procesar la página {page} de BDNS: {e}")
+            return resultado
+
+        def recibidas(resultado: Optional[Dict[str, Any]]) -> int:
+            return len(resultado.get("convocatorias", [])) if resultado else 0
+
+        stats.inicio = time.perf_counter()
+        try:
+            primera = await pedir(0)
+            total = (primera or {}).get("totalElementos", (primera or {}).get("totalElements", 0)) or 0
+            logger.info(f"📚 BDNS: {total} convocatorias disponibles")
+
+            if total:
+                paginas = asyncio.Queue()
+                for page in range(1, math.ceil(total / TAMANO_PAGINA)):
+                    paginas.put_nowait(page)
+                paginas.put_nowait(FIN)
+
+                async def worker():
+                    while sigue_siendo_lider() and (page := paginas.get_nowait()) is not FIN:
+                        await pedir(page)
+                    paginas.put_nowait(FIN)
+
+                async with asyncio.TaskGroup() as tg:
+                    for _ in range(stats.concurrencia):
+                        tg.create_task(worker())
+            else:
+                # Sin total no se sabe si hay más páginas: una página fallida corta el listado
+                page = 0
+                resultado = primera
+                while recibidas(resultado) == TAMANO_PAGINA and sigue_siendo_lider():
+                    page += 1
+                    resultado = await pedir(page)
+        finally:
+            stats.fin = time.perf_counter()
+        await salida.put(FIN)
+
+    async def _detalle(self, conv: Dict[str, Any]):
+        """Etapa 2: descargar el detalle de una convocatoria"""
+        id_bdns = str(conv.get("numeroConvocatoria"))
+        detalle = await self.bdns.get_convocatoria_detalle(id_bdns)
+        return conv, detalle
+
+    async def _filtrar(self, elemento):
+        """Etapa 3: parsear y aplicar los filtros de órgano, fechas y región"""
+        conv, detalle = elemento
+        return filtrar_convocatoria(self.bdns, conv, detalle)
+
+    async def _persistir(self, entrada: asyncio.Queue, salida: asyncio.Queue):
+        """
+        Etapa 4: guardar en lotes de SYNC_TAMANO_LOTE_GUARDADO, o antes si
+        pasan SYNC_ESPERA_LOTE_SEGUNDOS sin completarse, y pasar los IDs
+        guardados a la etapa de notificación.
+        """
+        stats = self.etapas["persistir"]
+        loop = asyncio.get_running_loop()
+        lote: List[Dict[str, Any]] = []
+        limite = 0.0
+
+        async def guardar():
+            stats.entradas += len(lote)
+            t0 = time.perf_counter()
+            try:
+                ids = await asyncio.to_thread(_guardar_lote, list(lote))
+            except Exception as e:
+                stats.errores += 1
+                logger.error(f"Error al guardar un lote de {len(lote)} subvenciones: {e}")
+                return
+            finally:
+                stats.ocupado += time.perf_counter() - t0
+                lote.clear()
+
+            stats.salidas += len(ids)
+            self.guardadas.extend(ids)
+            if ids:
+                await salida.put(ids)
+
+        stats.inicio = time.perf_counter()
+        try:
+            while True:
+                espera = max(0.0, limite - loop.time()) if lote else None
+                try:
+                    elemento = await asyncio.wait_for(entrada.get(), espera)
+                except TimeoutError:
+                    await guardar()
+                    continue
+
+                if elemento is FIN:
+                    break
+                if not lote:
+                    limite = loop.time() + settings.sync_espera_lote_segundos
+                lote.append(elemento)
+                if len(lote) >= settings.sync_tamano_lote_guardado:
+                    await guardar()
+
+            if lote:
+                await guardar()
+        finally:
+            stats.fin = time.perf_counter()
+        await salida.put(FIN)
+
+    async def _notificar(self, ids: List[int]):
+        """Etapa 5: emparejar con las suscripciones y encolar los emails"""
+        if self.notificar:
+            await asyncio.to_thread(_notificar_lote, ids)
+        return ids
+
+    async def ejecutar(self) -> ResultadoPipeline:
+        """Ejecutar todas las etapas a la vez hasta vaciar el listado"""
+        tamano_cola = settings.sync_tamano_cola
+        convocatorias = asyncio.Queue(maxsize=tamano_cola)
+        detalles = asyncio.Queue(maxsize=tamano_cola)
+        filtradas = asyncio.Queue(maxsize=tamano_cola)
+        lotes = asyncio.Queue(maxsize=tamano_cola)
+
+        logger.info(
+            f"📅 Buscando subvenciones desde {FECHA_DESDE.strftime('%d/%m/%Y')} hasta {FECHA_HASTA.strftime('%d/%m/%Y')}"
+        )
+        logger.info(f"🔎 Finalidad: INVESTIGACIÓN, DESARROLLO E INNOVACIÓN ({FINALIDAD_IDI})")
+
+        inicio = time.perf_counter()
+        with MedidorRSS() as memoria:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self._listar(convocatorias))
+                tg.create_task(_etapa(self.etapas["detalles"], convocatorias, detalles, self._detalle))
+                tg.create_task(_etapa(self.etapas["filtrar"], detalles, filtradas, self._filtrar))
+                tg.create_task(self._persistir(filtradas, lotes))
+                tg.create_task(_etapa(self.etapas["notificar"], lotes, None, self._notificar))
+
+        resultado = ResultadoPipeline(
+            self.etapas, self.guardadas, time.perf_counter() - inicio, memoria.inicio, memoria.pico
+        )
+        registrar_estadisticas(resultado)
+        return resultado
+
+
+def registrar_estadisticas(resultado: ResultadoPipeline):
+    """Tabla de rendimiento por etapa en el log"""
+    logger.info(f"📊 Pipeline de sincronización: {len(resultado.guardadas)} guardadas en {resultado.segundos:.2f}s")
+    if resultado.rss_pico_mb is not None:
+        logger.info(
+            f"🧠 Pico RSS {resultado.rss_pico_mb:.1f} MB "
+            f"(+{resultado.rss_pico_mb - resultado.rss_inicio_mb:.1f} MB durante la ejecución)"
+        )
+    logger.info(f"   {'etapa':<10} {'workers':>7} {'entradas':>8} {'salidas':>8} {'errores':>7} {'seg':>8} {'elem/s':>8} {'uso':>6}")
+    for nombre, e in resultado.etapas.items():
+        logger.info(
+            f"   {nombre:<10} {e.concurrencia:>7} {e.entradas:>8} {e.salidas:>8} {e.errores:>7} "
+            f"{e.duracion:>8.2f} {e.por_segundo:>8.1f} {e.utilizacion:>6.0%}"
+        )
+
+
+async def ejecutar_pipeline(bdns: Optional[BDNSService] = None, notificar: bool = True) -> ResultadoPipeline:
+    """Atajo: sincronizar con BDNS usando el pipeline por etapas"""
+    return await PipelineSync(bdns, notificar).ejecutar()
@@ -2,34 +2,70 @@
 Tarea de sincronización de subvenciones
 """
 import asyncio
+import time
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from loguru import logger
 from sqlalchemy.orm import Session
 
+from config import get_settings
 from database import SessionLocal
 from models.subvencion import Subvencion
 from models.usuario import Usuario
 from models.suscripcion import Suscripcion
-from models.notificacion_enviada import NotificacionEnviada
 from services.bdns_service import BDNSService
-from services.calendar_service import CalendarService
+from services.calendar_service import get_calendar_url
 from services.email_service import EmailService
+from services import (
+    autocompletar_service,
+    catalogo_service,
+    digest_service,
+    notification_service,
+    organo_service,
+    outbox_service,
+    recordatorio_service,
+)
+from services.matching_service import IndiceSuscripciones, MapaAreas
+from services.matching_vectorizado import MatrizSuscripciones
+from tasks.leader import sigue_siendo_lider
+from utils.memoria import MedidorRSS
+from utils.texto import normalizar_texto
+
+settings = get_settings()
 
 # Filtros configurados
 ALLOWED_REGIONES = {
     "ESPAÑA", "ES - ESPAÑA", "CANARIAS", "ISLAS CANARIAS",
     "COMUNIDAD AUTONOMA DE CANARIAS", "COMUNIDAD AUTÓNOMA DE CANARIAS",
 }
+# Palabras clave del órgano (texto normalizado: minúsculas y sin tildes)
+PALABRAS_CLAVE_ORGANO = ["ciencia", "innovacion", "investigacion", "i+d"]
+
+# Ventana de búsqueda y finalidad consultadas en BDNS
+FECHA_DESDE = datetime(2025, 1, 1)
+FECHA_HASTA = datetime(2026, 12, 31)
+FINALIDAD_IDI = 17  # Investigación, desarrollo e innovación
 
 def sync_subvenciones_task():
     """
     Tarea principal de sincronización:
-    1. Consultar API de BDNS
-    2. Guardar nuevas subvenciones
-    3. Crear eventos en Calendar
-    4. Enviar notificaciones
+    1. Consultar API de BDNS (listado y detalles)
+    2. Guardar nuevas subvenciones (quedan pendientes de publicar en Calendar)
+    3. Enviar notificaciones
+    
+    SYNC_MODO elige cómo:
+    - "pipeline": etapas solapadas con colas acotadas (tasks/sync_pipeline.py);
+      cada lote guardado se notifica mientras se siguen descargando convocatorias.
+    - "paginas": página a página, guardando y liberando cada una antes de pedir
+      la siguiente; memoria constante aunque BDNS devuelva muchas páginas.
+    
+    La publicación en Google Calendar la hace su propio job
+    (calendar_publicacion_service.procesar_calendar), así que un Calendar
+    lento o caído no retrasa los emails.
     """
+    from tasks.sync_pipeline import ejecutar_pipeline
+    
     logger.info("=" * 80)
     logger.info("🔄 Iniciando sincronización de subvenciones...")
     logger.info("=" * 80)
@@ -37,24 +73,22 @@ def sync_subvenciones_task():
     db = SessionLocal()
     
     try:
-        # 1. Obtener subvenciones de BDNS
-        nuevas_subvenciones = asyncio.run(fetch_subvenciones_bdns(db))
+        # Actualizar conteos del árbol de órganos (plazos vencidos)
+        organo_service.recalcular_conteos(db)
+        
+        if settings.sync_modo == "paginas":
+            guardadas = asyncio.run(sincronizar_por_paginas(db)).guardadas
+        else:
+            guardadas = len(asyncio.run(ejecutar_pipeline()).guardadas)
         
-        if not nuevas_subvenciones:
+        if not guardadas:
             logger.info("ℹ️  No se encontraron nuevas subvenciones")
             return
         
-        logger.success(f"✓ {len(nuevas_subvenciones)} nuevas subvenciones obtenidas")
+        logger.success(f"✓ {guardadas} subvenciones guardadas en BD")
         
-        # 2. Guardar en base de datos
-        subvenciones_guardadas = guardar_subvenciones(db, nuevas_subvenciones)
-        logger.success(f"✓ {len(subvenciones_guardadas)} subvenciones guardadas en BD")
-        
-        # 3. Crear eventos en Google Calendar
-        crear_eventos_calendar(subvenciones_guardadas)
-        
-        # 4. Enviar notificaciones a usuarios
-        enviar_notificaciones(db, subvenciones_guardadas)
+        # Refrescar índice de autocompletado
+        autocompletar_service.reconstruir_indice(db)
         
         logger.success("=" * 80)
         logger.success("✅ Sincronización completada exitosamente")
@@ -68,87 +102,189 @@ def sync_subvenciones_task():
         db.close()
 
 
-async def fetch_subvenciones_bdns(db: Session) -> List[Dict[str, Any]]:
-    """Obtener subvenciones de BDNS API (listado + detalle)"""
-    bdns = BDNSService()
+@dataclass
+class ResumenSincronizacion:
+    """Resultado de una sincronización página a página"""
+    paginas: int = 0
+    convocatorias: int = 0
+    guardadas: int = 0
+    errores: int = 0
+    segundos: float = 0.0
+    rss_inicio_mb: Optional[float] = None
+    rss_pico_mb: Optional[float] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+async def sincronizar_por_paginas(
+    db: Session,
+    bdns: Optional[BDNSService] = None,
+    notificar: bool = True
+) -> ResumenSincronizacion:
+    """
+    Obtener, filtrar, guardar y notificar las subvenciones de BDNS página a página
+    
+    Cada página se procesa entera y se libera antes de pedir la siguiente,
+    así que la memoria no crece con el número de páginas (una resincronización
+    completa de la ventana FECHA_DESDE-FECHA_HASTA cabe en lo mismo que una
+    sincronización diaria). Se registra el pico de RSS de la ejecución,
+    muestreando la RSS actual mientras dura.
     
-    fecha_desde = datetime(2025, 1, 1)
-    fecha_hasta = datetime(2026, 12, 31)
+    El trabajo de base de datos se hace con asyncio.to_thread para no
+    bloquear el bucle de eventos (el endpoint de sincronización manual lo
+    ejecuta dentro de FastAPI). La sesión se usa desde un hilo cada vez.
+    """
+    bdns = bdns or BDNSService()
+    resumen = ResumenSincronizacion()
+    limite = asyncio.Semaphore(settings.sync_concurrencia_detalles)
+    inicio = time.perf_counter()
     
     logger.info(
-        f"📅 Buscando subvenciones desde {fecha_desde.strftime('%d/%m/%Y')} hasta {fecha_hasta.strftime('%d/%m/%Y')}"
+        f"📅 Buscando subvenciones desde {FECHA_DESDE.strftime('%d/%m/%Y')} hasta {FECHA_HASTA.strftime('%d/%m/%Y')}"
     )
     logger.info("🔎 Finalidad: INVESTIGACIÓN, DESARROLLO E INNOVACIÓN (17)")
     
-    nuevas_subvenciones = []
     page = 0
     page_size = 100
     
-    while True:
-        resultado = await bdns.get_convocatorias(
-            finalidad=17,
-            fecha_desde=fecha_desde.date(),
-            fecha_hasta=fecha_hasta.date(),
-            page=page,
-            page_size=page_size
-        )
-        
-        convocatorias = resultado.get("convocatorias", [])
-        total_elementos = resultado.get("totalElementos", 0)
-        
-        logger.info(f"📦 Página {page}: {len(convocatorias)} convocatorias (total disponibles: {total_elementos})")
-        
-        if not convocatorias:
-            break
-        
-        for conv in convocatorias:
-            id_bdns = str(conv.get("numeroConvocatoria"))
-            if not id_bdns:
-                continue
+    with MedidorRSS() as memoria:
+        while True:
+            resultado = await bdns.get_convocatorias(
+                finalidad=FINALIDAD_IDI,
+                fecha_desde=FECHA_DESDE.date(),
+                fecha_hasta=FECHA_HASTA.date(),
+                page=page,
+                page_size=page_size
+            )
+            
+            convocatorias = resultado.get("convocatorias", [])
+            total_elementos = resultado.get("totalElementos", 0)
+            
+            logger.info(f"📦 Página {page}: {len(convocatorias)} convocatorias (total disponibles: {total_elementos})")
+            
+            if not convocatorias:
+                break
             
-            existe = db.query(Subvencion).filter(Subvencion.id_bdns == id_bdns).first()
-            if existe:
-                continue
+            resumen.paginas += 1
+            resumen.convocatorias += len(convocatorias)
+            await procesar_pagina(db, bdns, convocatorias, limite, resumen, notificar)
             
+            actual = memoria.muestrear()
+            if actual is not None:
+                logger.debug(f"🧠 Tras la página {page}: RSS {actual:.1f} MB (pico {memoria.pico:.1f} MB)")
+            
+            if len(convocatorias) < page_size or not sigue_siendo_lider():
+                break
+            page += 1
+    
+    resumen.segundos = time.perf_counter() - inicio
+    resumen.rss_inicio_mb = memoria.inicio
+    resumen.rss_pico_mb = memoria.pico
+    
+    if memoria.pico is not None:
+        logger.info(
+            f"🧠 Sincronización: {resumen.paginas} páginas, {resumen.guardadas} guardadas en {resumen.segundos:.1f}s, "
+            f"pico RSS {memoria.pico:.1f} MB (+{memoria.aumento:.1f} MB durante la ejecución)"
+        )
+    
+    return resumen
+
+
+async def procesar_pagina(
+    db: Session,
+    bdns: BDNSService,
+    convocatorias: List[Dict[str, Any]],
+    limite: asyncio.Semaphore,
+    resumen: ResumenSincronizacion,
+    notificar: bool = True
+):
+    """Filtrar, guardar y notificar las convocatorias nuevas de una página del listado"""
+    por_id = {}
+    for conv in convocatorias:
+        if conv.get("numeroConvocatoria"):
+            por_id[str(conv["numeroConvocatoria"])] = conv
+    
+    # Las que ya están en BD, con una consulta para toda la página
+    existentes = await asyncio.to_thread(_ids_existentes, db, list(por_id))
+    
+    async def preparar(id_bdns: str, conv: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # El JSON del detalle solo vive mientras se filtra
+        # Un detalle mal formado descarta solo su convocatoria, no la página
+        async with limite:
             try:
                 detalle = await bdns.get_convocatoria_detalle(id_bdns)
-                parsed_base = bdns.parse_convocatoria(conv)
-                parsed_detalle = bdns.parse_convocatoria_detalle(detalle)
-                
-                subvencion_data = {**parsed_base, **parsed_detalle}
-                
-                # FILTRO 1: Debe tener fechas de solicitud
-                if not subvencion_data.get("fecha_fin_solicitud"):
-                    logger.debug(f"  ⏭️ {id_bdns}: Sin fecha fin de solicitud")
-                    continue
-                
-                # FILTRO 2: Órgano del ámbito de Ciencia e Innovación (flexible)
-                organo = subvencion_data.get("organo_convocante", "").upper()
-                palabras_clave = ["CIENCIA", "INNOVACI", "INVESTIGACI", "I+D"]
-                tiene_palabras_clave = any(palabra in organo for palabra in palabras_clave)
-                
-                if not tiene_palabras_clave:
-                    logger.debug(f"  ⏭️ {id_bdns}: Órgano sin palabras clave I+D+i ({organo[:50]})")
-                    continue
-                
-                # FILTRO 3: Regiones España/Canarias (si está especificada)
-                regiones_detalle = [r.get('descripcion', '').upper() for r in detalle.get('regiones', [])]
-                if regiones_detalle:  # Si hay regiones especificadas
-                    if not any(r in ALLOWED_REGIONES or "ESPAÑA" in r or "CANARIAS" in r for r in regiones_detalle):
-                        logger.debug(f"  ⏭️ {id_bdns}: Región no permitida ({regiones_detalle})")
-                        continue
-                
-                logger.info(f"  ✅ {id_bdns}: {subvencion_data.get('titulo', '')[:60]}")
-                nuevas_subvenciones.append(subvencion_data)
+                return filtrar_convocatoria(bdns, conv, detalle)
             except Exception as e:
-                logger.error(f"Error al obtener detalle de convocatoria {id_bdns}: {e}")
-                continue
-        
-        if len(convocatorias) < page_size:
-            break
-        page += 1
+                logger.error(f"Error al procesar la convocatoria {id_bdns}: {e}")
+                resumen.errores += 1
+                return None
+    
+    datos = await asyncio.gather(*(
+        preparar(id_bdns, conv) for id_bdns, conv in por_id.items() if id_bdns not in existentes
+    ))
+    nuevas = [d for d in datos if d]
+    if not nuevas:
+        return
     
-    return nuevas_subvenciones
+    resumen.guardadas += await asyncio.to_thread(_guardar_pagina, db, nuevas, notificar)
+
+
+def _ids_existentes(db: Session, ids: List[str]) -> set:
+    """IDs BDNS de la lista que ya están en la BD"""
+    return {
+        id_bdns for (id_bdns,) in
+        db.query(Subvencion.id_bdns).filter(Subvencion.id_bdns.in_(ids)).all()
+    }
+
+
+def _guardar_pagina(db: Session, nuevas: List[Dict[str, Any]], notificar: bool) -> int:
+    """Guardar y notificar una página (síncrono: se ejecuta fuera del bucle de eventos)"""
+    guardadas = guardar_subvenciones(db, nuevas)
+    
+    if guardadas and notificar:
+        enviar_notificaciones(db, guardadas)
+    
+    # Soltar las instancias de la página: la sesión no debe acumularlas entre páginas
+    db.expunge_all()
+    return len(guardadas)
+
+
+def filtrar_convocatoria(bdns: BDNSService, conv: Dict[str, Any], detalle: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Combinar listado y detalle de una convocatoria y aplicar los filtros
+    
+    Returns:
+        Datos de la subvención, o None si se descarta
+    """
+    id_bdns = str(conv.get("numeroConvocatoria"))
+    parsed_base = bdns.parse_convocatoria(conv)
+    parsed_detalle = bdns.parse_convocatoria_detalle(detalle)
+    
+    subvencion_data = {**parsed_base, **parsed_detalle}
+    
+    # FILTRO 1: Debe tener fechas de solicitud
+    if not subvencion_data.get("fecha_fin_solicitud"):
+        logger.debug(f"  ⏭️ {id_bdns}: Sin fecha fin de solicitud")
+        return None
+    
+    # FILTRO 2: Órgano del ámbito de Ciencia e Innovación (flexible)
+    organo = normalizar_texto(subvencion_data.get("organo_convocante"))
+    tiene_palabras_clave = any(palabra in organo for palabra in PALABRAS_CLAVE_ORGANO)
+    
+    if not tiene_palabras_clave:
+        logger.debug(f"  ⏭️ {id_bdns}: Órgano sin palabras clave I+D+i ({organo[:50]})")
+        return None
+    
+    # FILTRO 3: Regiones España/Canarias (si está especificada)
+    regiones_detalle = [r.get('descripcion', '').upper() for r in detalle.get('regiones', [])]
+    if regiones_detalle:  # Si hay regiones especificadas
+        if not any(r in ALLOWED_REGIONES or "ESPAÑA" in r or "CANARIAS" in r for r in regiones_detalle):
+            logger.debug(f"  ⏭️ {id_bdns}: Región no permitida ({regiones_detalle})")
+            return None
+    
+    logger.info(f"  ✅ {id_bdns}: {subvencion_data.get('titulo', '')[:60]}")
+    return subvencion_data
 
 
 def guardar_subvenciones(db: Session, subvenciones: List[Dict[str, Any]]) -> List[Subvencion]:
@@ -157,9 +293,12 @@ def guardar_subvenciones(db: Session, subvenciones: List[Dict[str, Any]]) -> Lis
     
     for sub_data in subvenciones:
         try:
-            subvencion = Subvencion(**sub_data)
+            # "documentos" viene del detalle de BDNS pero no es una columna de Subvencion
+            campos = {k: v for k, v in sub_data.items() if k != "documentos"}
+            subvencion = Subvencion(**campos)
             db.add(subvencion)
             db.flush()
+            organo_service.registrar_organo(db, subvencion)
             subvenciones_guardadas.append(subvencion)
             
             logger.debug(f"  ✓ Guardada: {subvencion.titulo[:50]}...")
@@ -172,84 +311,69 @@ def guardar_subvenciones(db: Session, subvenciones: List[Dict[str, Any]]) -> Lis
     return subvenciones_guardadas
 
 
-def crear_eventos_calendar(subvenciones: List[Subvencion]):
-    """Crear eventos en Google Calendar"""
-    try:
-        calendar_service = CalendarService()
-        
-        for subvencion in subvenciones:
-            try:
-                # Solo crear evento si tiene fecha de fin
-                if not subvencion.fecha_fin_solicitud:
-                    continue
-                
-                event_id = calendar_service.create_event(
-                    titulo=subvencion.titulo,
-                    descripcion=subvencion.descripcion or "",
-                    fecha_inicio=subvencion.fecha_inicio_solicitud or subvencion.fecha_fin_solicitud,
-                    fecha_fin=subvencion.fecha_fin_solicitud,
-                    url_bdns=subvencion.url_bdns,
-                    presupuesto=float(subvencion.presupuesto_total) if subvencion.presupuesto_total else None,
-                    region=subvencion.region_nombre,
-                    organo=subvencion.organo_convocante
-                )
-                
-                # Guardar ID del evento
-                subvencion.calendar_event_id = event_id
-                
-                logger.debug(f"  ✓ Evento creado para: {subvencion.titulo[:50]}...")
-                
-            except Exception as e:
-                logger.error(f"Error al crear evento para {subvencion.id_bdns}: {e}")
-                continue
-        
-        logger.success(f"✓ {len([s for s in subvenciones if s.calendar_event_id])} eventos creados en Calendar")
-        
-    except Exception as e:
-        logger.error(f"Error al crear eventos en Calendar: {e}")
-
-
 def enviar_notificaciones(db: Session, subvenciones: List[Subvencion]):
     """Enviar notificaciones a usuarios suscritos"""
     email_service = EmailService()
-    calendar_service = CalendarService()
-    calendar_url = calendar_service.get_calendar_url()
+    calendar_url = get_calendar_url()
+    
+    # Mapeo finalidad -> áreas temáticas, una vez por sincronización
+    mapa_areas = catalogo_service.cargar_mapa_areas(db)
+    
+    # Destinatarios en bloques: una consulta con JOIN y los filtros expresables en SQL
+    pares = {}
+    candidatas = 0
+    
+    for lote in notification_service.cargar_destinatarios(db, subvenciones):
+        candidatas += len(lote)
+        
+        # Cargas grandes: matriz NumPy; si no, índice invertido por subvención
+        if len(lote) * len(subvenciones) >= settings.matching_vectorizado_umbral:
+            emparejador = MatrizSuscripciones(lote, mapa_areas)
+        else:
+            emparejador = IndiceSuscripciones(lote, mapa_areas)
+        
+        for subvencion, coincidentes in emparejador.emparejar(subvenciones):
+            for suscripcion in coincidentes:
+                par = (suscripcion.usuario_id, subvencion.id)
+                actual = pares.get(par)
+                if actual is None or digest_service.prioridad(suscripcion) < digest_service.prioridad(actual[0]):
+                    pares[par] = (suscripcion, subvencion)
+    
+    logger.info(f"📧 {candidatas} suscripciones candidatas, {len(pares)} notificaciones coincidentes")
+    
+    # Descartar pares ya notificados (una consulta para todo el lote)
+    ya_enviadas = notification_service.cargar_notificadas(db, [s.id for s in subvenciones])
+    pendientes = {par: datos for par, datos in pares.items() if par not in ya_enviadas}
     
-    # Obtener usuarios con suscripciones activas
-    suscripciones = db.query(Suscripcion).filter(
-        Suscripcion.activa == True,
-        Suscripcion.notificar_email == True
-    ).all()
+    # Reservar antes de enviar para no duplicar si dos sincronizaciones se solapan
+    reservadas = notification_service.reservar_notificaciones(db, list(pendientes))
     
-    logger.info(f"📧 Enviando notificaciones a {len(suscripciones)} usuarios...")
+    # Recordatorios de fecha límite para los pares emparejados
+    recordatorio_service.crear_recordatorios(db, [(par[0], pendientes[par][1]) for par in reservadas])
     
-    notificaciones_enviadas = 0
+    # Construir los mensajes y encolarlos: el envío lo hacen los workers de la bandeja de salida
+    ids_notificaciones = []
+    mensajes = []
+    fallidas = []
+    programadas = {}
+    origen_resumen = {}
+    fragmentos = {}
     
-    for suscripcion in suscripciones:
-        usuario = suscripcion.usuario
+    for par, notificacion_id in reservadas.items():
+        suscripcion, subvencion = pendientes[par]
         
-        if not usuario.confirmado:
+        # Frecuencia diaria/semanal: se acumula para el próximo resumen
+        entrega = digest_service.proxima_entrega(suscripcion.frecuencia_email)
+        if entrega:
+            programadas[notificacion_id] = entrega
+            origen_resumen[notificacion_id] = suscripcion.id
             continue
         
-        for subvencion in subvenciones:
-            # Verificar si la subvención coincide con los filtros
-            if not coincide_con_filtros(subvencion, suscripcion):
-                continue
-            
-            # Verificar si ya se envió notificación
-            ya_enviada = db.query(NotificacionEnviada).filter(
-                NotificacionEnviada.usuario_id == usuario.id,
-                NotificacionEnviada.subvencion_id == subvencion.id,
-                NotificacionEnviada.enviada == True
-            ).first()
-            
-            if ya_enviada:
-                continue
+        try:
+            unsubscribe_url = f"{calendar_url}?unsubscribe={suscripcion.id}"
             
-            # Enviar email
-            try:
-                unsubscribe_url = f"{calendar_url}?unsubscribe={suscripcion.id}"
-                
+            # El bloque de la subvención se renderiza una vez y se comparte entre destinatarios
+            if subvencion.id not in fragmentos:
                 subvencion_dict = {
                     "titulo": subvencion.titulo,
                     "descripcion": subvencion.descripcion,
@@ -259,37 +383,59 @@ def enviar_notificaciones(db: Session, subvenciones: List[Subvencion]):
                     "fecha_fin_solicitud": subvencion.fecha_fin_solicitud,
                     "url_bdns": subvencion.url_bdns
                 }
-                
-                enviado = email_service.send_nueva_subvencion(
-                    to_email=usuario.email,
-                    nombre_usuario=usuario.nombre,
-                    subvencion=subvencion_dict,
-                    calendar_url=calendar_url,
-                    unsubscribe_url=unsubscribe_url
-                )
-                
-                # Registrar notificación
-                notif = NotificacionEnviada(
-                    usuario_id=usuario.id,
-                    subvencion_id=subvencion.id,
-                    tipo="email",
-                    enviada=enviado,
-                    fecha_envio=datetime.utcnow() if enviado else None
+                fragmentos[subvencion.id] = (
+                    subvencion_dict,
+                    email_service.render_fragmento_subvencion(subvencion_dict, calendar_url)
                 )
-                db.add(notif)
-                
-                if enviado:
-                    notificaciones_enviadas += 1
-                
-            except Exception as e:
-                logger.error(f"Error al enviar notificación a {usuario.email}: {e}")
-                continue
+            subvencion_dict, fragmento = fragmentos[subvencion.id]
+            
+            mensajes.append(email_service.build_nueva_subvencion(
+                to_email=suscripcion.email,
+                nombre_usuario=suscripcion.nombre,
+                subvencion=subvencion_dict,
+                calendar_url=calendar_url,
+                unsubscribe_url=unsubscribe_url,
+                fragmento=fragmento
+            ))
+            ids_notificaciones.append(notificacion_id)
+            
+        except Exception as e:
+            logger.error(f"Error al preparar notificación para {suscripcion.email}: {e}")
+            fallidas.append({
+                "id": notificacion_id,
+                "enviada": False,
+                "fecha_envio": None,
+                "error": str(e)[:500]
+            })
     
-    db.commit()
-    logger.success(f"✓ {notificaciones_enviadas} notificaciones enviadas")
+    try:
+        email_ids = outbox_service.encolar(db, mensajes, tipo="nueva_subvencion")
+        notification_service.vincular_emails(db, dict(zip(ids_notificaciones, email_ids)))
+    except Exception as e:
+        # Las reservas ya están confirmadas: marcarlas como fallidas para que la
+        # próxima sincronización las reintente en lugar de dejarlas abandonadas
+        logger.error(f"Error al encolar las notificaciones: {e}")
+        db.rollback()
+        email_ids = []
+        fallidas.extend(
+            {"id": n, "enviada": False, "fecha_envio": None, "error": f"Error al encolar: {e}"[:500]}
+            for n in ids_notificaciones
+        )
+    
+    if programadas:
+        notification_service.programar(db, programadas, origen_resumen)
+    
+    if fallidas:
+        notification_service.registrar_resultados(db, fallidas)
+    
+    logger.success(f"✓ {len(email_ids)} notificaciones encoladas, {len(programadas)} aplazadas al resumen")
 
 
-def coincide_con_filtros(subvencion: Subvencion, suscripcion: Suscripcion) -> bool:
+def coincide_con_filtros(
+    subvencion: Subvencion,
+    suscripcion: Suscripcion,
+    mapa_areas: Optional[MapaAreas] = None
+) -> bool:
     """Verificar si una subvención coincide con los filtros de una suscripción"""
     
     # Filtro por región
@@ -307,8 +453,8 @@ def coincide_con_filtros(subvencion: Subvencion, suscripcion: Suscripcion) -> bo
             return False
     
     # Filtro por área temática (mapear finalidad)
-    if suscripcion.areas_tematicas:
-        # TODO: Implementar mapeo de finalidades a áreas temáticas
-        pass
+    if suscripcion.areas_tematicas and mapa_areas is not None:
+        if not mapa_areas.acepta(suscripcion.areas_tematicas, subvencion.finalidad_id):
+            return False
     
     return True
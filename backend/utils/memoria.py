@@ -0,0 +1,91 @@
+"""
+Utilidades de medición de memoria del proceso
+"""
+import os
+import sys
+import threading
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def rss_actual_mb() -> Optional[float]:
+    """
+    Memoria residente (RSS) actual del proceso, en MB
+
+    En Linux se lee de /proc/self/statm. En otras plataformas se usa
+    ru_maxrss de getrusage, que es el pico desde que arrancó el proceso
+    (aproximación: no baja nunca).
+
+    Returns:
+        MB, o None si la plataforma no permite medirla
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            paginas_residentes = int(f.read().split()[1])
+        return paginas_residentes * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+
+    if resource is None:
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    if sys.platform == "darwin":
+        return maximo / (1024 * 1024)
+    return maximo / 1024
+
+
+class MedidorRSS:
+    """
+    Pico de RSS durante un intervalo (una ejecución), no desde el arranque
+
+    Un hilo muestrea la RSS actual cada `intervalo` segundos mientras dura
+    el bloque `with`; muestrear() permite además tomar muestras en puntos
+    concretos (p. ej. tras cada página).
+
+    Uso:
+        with MedidorRSS() as memoria:
+            ...
+        memoria.inicio, memoria.pico
+    """
+
+    def __init__(self, intervalo: float = 0.05):
+        self.intervalo = intervalo
+        self.inicio: Optional[float] = None
+        self.pico: Optional[float] = None
+        self._parar = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def muestrear(self) -> Optional[float]:
+        """Tomar una muestra de la RSS actual y actualizar el pico"""
+        actual = rss_actual_mb()
+        if actual is not None and (self.pico is None or actual > self.pico):
+            self.pico = actual
+        return actual
+
+    @property
+    def aumento(self) -> Optional[float]:
+        """MB que subió el pico respecto al inicio del intervalo"""
+        if self.inicio is None or self.pico is None:
+            return None
+        return self.pico - self.inicio
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            self.muestrear()
+
+    def __enter__(self) -> "MedidorRSS":
+        self.inicio = self.muestrear()
+        self._hilo = threading.Thread(target=self._bucle, name="medidor-rss", daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._hilo.join()
+        self.muestrear()
+        return False
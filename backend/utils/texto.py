@@ -0,0 +1,25 @@
+"""
+Utilidades de normalización de texto
+"""
+import re
+import unicodedata
+from typing import Optional
+
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar_texto(texto: Optional[str]) -> str:
+    """
+    Normalizar texto para búsquedas: minúsculas, sin tildes y espacios colapsados
+
+    Args:
+        texto: Texto original
+
+    Returns:
+        Texto normalizado ("" si es None)
+    """
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return _ESPACIOS.sub(" ", sin_tildes).strip().lower()